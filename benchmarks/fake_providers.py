@@ -0,0 +1,350 @@
+"""
+Simulated upstream providers for offline benchmarks.
+
+Each fake answers at the HTTP level (or, for DuckDuckGo, at the DDGS level)
+so the real clients, parsers, retries and scheduler all run as in
+production. Latency follows a log-normal distribution around a median and
+a share of requests fail with a retryable upstream error.
+"""
+
+import ast
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from typing import Optional
+
+import httpx
+
+from generation.generation_models import Theme
+from generation.tokens import count_tokens
+from tests.fakes import FakeForecastAPI
+
+
+class LatencyModel:
+    """
+    Latency and failure behaviour of one simulated provider.
+
+    Args:
+        median: Median latency in seconds
+        sigma: Log-normal shape, 0 for a constant latency
+        error_rate: Probability that a request fails
+        time_scale: Multiplier applied to every latency, to run faster than real time
+        seed: Seed for a private random generator, so runs are repeatable
+    """
+
+    def __init__(
+        self,
+        median: float,
+        sigma: float = 0.4,
+        error_rate: float = 0.0,
+        time_scale: float = 1.0,
+        seed: Optional[int] = None,
+    ):
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.time_scale = time_scale
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, time_scale: float = 1.0, seed: Optional[int] = None):
+        """Build from "median[:sigma[:error_rate]]", e.g. "0.8:0.5:0.02" """
+        parts = [float(part) for part in spec.split(":")]
+        return cls(*parts, time_scale=time_scale, seed=seed)
+
+    def sample(self, extra: float = 0.0) -> float:
+        """Seconds to wait for one request, `extra` is added before jitter"""
+        with self._lock:
+            jitter = self.random.lognormvariate(0, self.sigma) if self.sigma else 1.0
+        return (self.median + extra) * jitter * self.time_scale
+
+    def fails(self) -> bool:
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+
+def _item(item_id: int, title: str, start: str = "10:00", end: str = "11:00"):
+    return {
+        "title": title,
+        "transport": False,
+        "start": start,
+        "end": end,
+        "description": f"{title}, a casual and well loved stop with plenty to see and do.",
+        "price": 12.5,
+        "theme": Theme.CULTURE.value,
+        "transportMode": "N/A",
+        "requires_booking": False,
+        "booking_url": None,
+        "weather": "sunny",
+        "temperature": 18,
+        "image_link": [],
+        "duration": 60,
+        "id": item_id,
+        "latitude": 51.5,
+        "longitude": -0.12,
+    }
+
+
+def _summary(num_items: int):
+    items = []
+    for i in range(num_items):
+        hour = 9 + i
+        transport = i % 3 == 2
+        title = f"Tube to venue {i + 1}" if transport else f"Visit venue {i}"
+        items.append(
+            {
+                "title": title,
+                "imageTag": f"venue {i}",
+                "start": f"{hour:02d}:00",
+                "end": f"{hour:02d}:45",
+                "id": i,
+                "transport": transport,
+                "transportMode": "Tube" if transport else "N/A",
+            }
+        )
+    return {"itinerary": items}
+
+
+def structured_arguments(schema: str, prompt: str, itinerary_items: int = 8) -> dict:
+    """Plausible tool-call arguments for each structured output schema"""
+    if schema == "ActivityTitles":
+        return {
+            "activities": [{"title": f"Activity {i}", "id": i} for i in range(6)]
+        }
+    if schema == "ActivityList":
+        ids = re.findall(r"id: (\d+), title: ([^\n,]+)", prompt)
+        return {
+            "activities": [
+                {
+                    "id": int(i),
+                    "title": title.strip(),
+                    "description": "A casual stroll round one of the city's best loved spots.",
+                    "image_link": [],
+                    "price": 10.0,
+                    "theme": Theme.CULTURE.value,
+                }
+                for i, title in ids
+            ]
+        }
+    if schema == "ItinerarySummary":
+        return _summary(itinerary_items)
+    if schema == "ItineraryItemBatch":
+        ids = re.findall(r"id: (\d+), title: ([^,]+)", prompt)
+        return {"items": [_item(int(i), title.strip()) for i, title in ids]}
+    if schema == "ItineraryItem":
+        # item details name the id, swaps include the replaced activity's fields
+        match = re.search(r"has id (\d+)", prompt) or re.search(
+            r"activity to replace.*?\bid: (\d+)", prompt, re.S
+        )
+        return _item(int(match.group(1)) if match else 0, "Alternative venue")
+    if schema == "Facts":
+        match = re.search(r"Generate (\d+) interesting facts", prompt)
+        return {"facts": [f"Fact {i}" for i in range(int(match.group(1) if match else 1))]}
+    raise ValueError(f"No fake output for schema {schema}")
+
+
+class FakeOpenAI:
+    """
+    Chat completions endpoint answering structured output requests for the
+    repo's schemas, either as a JSON schema response format or as tool calls.
+
+    Latency is time-to-first-token from `latency` plus completion tokens over
+    `tokens_per_second`. Streaming requests get the arguments split over
+    server-sent event chunks at the same pace.
+    """
+
+    def __init__(
+        self,
+        latency: LatencyModel,
+        tokens_per_second: float = 90,
+        itinerary_items: int = 8,
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.itinerary_items = itinerary_items
+        self.calls = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        body = json.loads(request.content)
+        # with_structured_output sends a json_schema response format, bind_tools sends tools
+        if body.get("tools"):
+            schema = body["tools"][0]["function"]["name"]
+        else:
+            schema = body["response_format"]["json_schema"]["name"]
+        prompt = "\n".join(str(message.get("content")) for message in body["messages"])
+        arguments = json.dumps(
+            structured_arguments(schema, prompt, self.itinerary_items)
+        )
+        prompt_tokens = count_tokens(prompt)
+        completion_tokens = count_tokens(arguments)
+        decode = completion_tokens / self.tokens_per_second
+
+        if self.latency.fails():
+            await asyncio.sleep(self.latency.sample())
+            return httpx.Response(
+                503, json={"error": {"message": "simulated overload", "type": "server_error"}}
+            )
+
+        if body.get("stream"):
+            return httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                content=self.stream(body["model"], schema, arguments, decode),
+            )
+
+        await asyncio.sleep(self.latency.sample(decode))
+        if body.get("tools"):
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": f"call_{self.calls}",
+                        "type": "function",
+                        "function": {"name": schema, "arguments": arguments},
+                    }
+                ],
+            }
+            finish_reason = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": arguments, "refusal": None}
+            finish_reason = "stop"
+        return httpx.Response(
+            200,
+            json={
+                "id": f"chatcmpl-{self.calls}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {"index": 0, "message": message, "finish_reason": finish_reason}
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        )
+
+    async def stream(self, model: str, schema: str, arguments: str, decode: float):
+        def chunk(delta, finish_reason=None):
+            payload = {
+                "id": f"chatcmpl-{self.calls}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            return f"data: {json.dumps(payload)}\n\n".encode()
+
+        await asyncio.sleep(self.latency.sample())
+        yield chunk(
+            {
+                "role": "assistant",
+                "tool_calls": [
+                    {
+                        "index": 0,
+                        "id": f"call_{self.calls}",
+                        "type": "function",
+                        "function": {"name": schema, "arguments": ""},
+                    }
+                ],
+            }
+        )
+        pieces = [arguments[i : i + 40] for i in range(0, len(arguments), 40)]
+        for piece in pieces:
+            await asyncio.sleep(decode * self.latency.time_scale / len(pieces))
+            yield chunk({"tool_calls": [{"index": 0, "function": {"arguments": piece}}]})
+        yield chunk({}, finish_reason="tool_calls")
+        yield b"data: [DONE]\n\n"
+
+
+class FakePerplexity:
+    """
+    Sync chat completions endpoint returning a links dictionary for the
+    titles dictionary in the prompt, as the Perplexity prompt asks for.
+    ChatPerplexity is synchronous, so the latency blocks a worker thread.
+    """
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        if self.latency.fails():
+            return httpx.Response(
+                500, json={"error": {"message": "simulated failure", "type": "server_error"}}
+            )
+
+        body = json.loads(request.content)
+        titles = ast.literal_eval(
+            re.search(r"\{.*\}", body["messages"][-1]["content"], re.S).group(0)
+        )
+        links = {
+            key: f"https://example.com/{re.sub(r'[^a-z0-9]+', '-', title.lower())}"
+            for key, title in titles.items()
+        }
+        return httpx.Response(
+            200,
+            json={
+                "id": f"pplx-{self.calls}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "citations": [],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": str(links)},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            },
+        )
+
+
+class FakeDDGS:
+    """Stands in for a duckduckgo_search.DDGS session, called from worker threads"""
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.calls = 0
+
+    def images(self, query: str, max_results: int = 2):
+        self.calls += 1
+        time.sleep(self.latency.sample())
+        if self.latency.fails():
+            raise RuntimeError("simulated rate limit")
+        slug = re.sub(r"[^a-z0-9]+", "-", query.lower())
+        return [
+            {"image": f"https://images.example.com/{slug}/{i}.jpg"}
+            for i in range(max_results)
+        ]
+
+
+class FakeWeatherAPI(FakeForecastAPI):
+    """WeatherAPI forecast endpoint with sampled latency and failures"""
+
+    def __init__(self, latency: LatencyModel):
+        super().__init__()
+        self.model = latency
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(dict(request.url.params))
+        await asyncio.sleep(self.model.sample())
+        if self.model.fails():
+            return httpx.Response(503, json={"error": {"message": "simulated failure"}})
+        return httpx.Response(
+            200, json=self.forecast(int(request.url.params.get("days", 1)))
+        )
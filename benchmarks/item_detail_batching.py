@@ -0,0 +1,179 @@
+"""
+Item-detail batching benchmark.
+
+Runs Generator.generate_itinerary_details against a simulated OpenAI model for
+several batch sizes and reports LLM requests and tokens per itinerary, the
+rate-limit headroom those imply, and p50/p95 latency. Model latency is
+time-to-first-token plus output tokens over a decode rate, both with
+log-normal jitter, so larger batches trade fewer requests for longer calls.
+Calls are admitted without RPM and TPM budgets: those run in real time while
+model time is scaled, and the headroom columns account for the limits instead.
+
+Usage:
+    python -m benchmarks.item_detail_batching --itineraries 20 --items 12
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import time
+from unittest.mock import patch
+
+# the generator's client reads it at import time, no call reaches OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+
+from generation.generation import Generator  # noqa: E402
+from generation.generation_models import (  # noqa: E402
+    ItineraryItem,
+    ItineraryItemBatch,
+    ItinerarySummary,
+    SimpleItineraryItem,
+)
+from generation.scheduler import ProviderLimiter, Scheduler  # noqa: E402
+from generation.tokens import count_message_tokens, count_tokens  # noqa: E402
+
+
+def sample_item(item_id: int) -> ItineraryItem:
+    return ItineraryItem(
+        title=f"Visit venue {item_id}",
+        transport=False,
+        start="10:00",
+        end="11:00",
+        description="A casual stroll around one of the city's best loved spots, with plenty to see.",
+        price=12.5,
+        theme="Culture",
+        transportMode="N/A",
+        requires_booking=False,
+        booking_url=None,
+        weather="sunny",
+        temperature=18,
+        image_link=[],
+        duration=60,
+        id=item_id,
+        latitude=51.5,
+        longitude=-0.12,
+    )
+
+
+class SimulatedLLM:
+    """Stands in for a with_structured_output runnable and records usage"""
+
+    def __init__(self, schema, stats, args):
+        self.schema = schema
+        self.stats = stats
+        self.args = args
+
+    async def ainvoke(self, messages):
+        prompt = messages[-1].content
+        if self.schema is ItineraryItemBatch:
+            ids = [int(i) for i in re.findall(r"id: (\d+)", prompt)]
+            response = ItineraryItemBatch(items=[sample_item(i) for i in ids])
+        else:
+            ids = [int(re.search(r"has id (\d+)", prompt).group(1))]
+            response = sample_item(ids[0])
+
+        prompt_tokens = count_message_tokens(messages)
+        completion_tokens = count_tokens(response.model_dump_json())
+        self.stats["requests"] += 1
+        self.stats["prompt_tokens"] += prompt_tokens
+        self.stats["completion_tokens"] += completion_tokens
+        self.stats["in_flight"] += 1
+        self.stats["peak_in_flight"] = max(
+            self.stats["peak_in_flight"], self.stats["in_flight"]
+        )
+
+        ttft = random.lognormvariate(0, 0.5) * self.args.ttft
+        decode = completion_tokens / self.args.tokens_per_second
+        decode *= random.lognormvariate(0, 0.25)
+        await asyncio.sleep((ttft + decode) * self.args.time_scale)
+
+        self.stats["in_flight"] -= 1
+        return response
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+async def run(batch_size: int, args) -> dict:
+    generator = Generator()
+    generator.cache = None
+    stats = {
+        "requests": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "in_flight": 0,
+        "peak_in_flight": 0,
+    }
+    summary = ItinerarySummary(
+        itinerary=[
+            SimpleItineraryItem(
+                title=f"Visit venue {i}",
+                imageTag=f"venue {i}",
+                start="10:00",
+                end="11:00",
+                id=i,
+            )
+            for i in range(args.items)
+        ]
+    )
+    weather = " ".join(f"{hour:02d}:00: Sunny 18°C" for hour in range(7, 24))
+
+    def structured_output(schema, **kwargs):
+        return SimulatedLLM(schema, stats, args)
+
+    scheduler = Scheduler()
+    scheduler.providers["openai"] = ProviderLimiter(
+        "openai", concurrency=args.items, queue_size=args.items
+    )
+
+    latencies = []
+    with patch.object(
+        type(generator.llm), "with_structured_output", side_effect=structured_output
+    ), patch("generation.generation.get_scheduler", return_value=scheduler):
+        for _ in range(args.itineraries):
+            start = time.perf_counter()
+            await generator.generate_itinerary_details(
+                summary, "London", "friends", weather, batch_size=batch_size
+            )
+            latencies.append((time.perf_counter() - start) / args.time_scale)
+
+    requests = stats["requests"] / args.itineraries
+    tokens = (stats["prompt_tokens"] + stats["completion_tokens"]) / args.itineraries
+    return {
+        "batch": batch_size,
+        "req/itin": round(requests, 1),
+        "prompt_tok/itin": round(stats["prompt_tokens"] / args.itineraries),
+        "total_tok/itin": round(tokens),
+        "peak_concurrency": stats["peak_in_flight"],
+        "itin/min@RPM": round(args.rpm / requests, 1),
+        "itin/min@TPM": round(args.tpm / tokens, 1),
+        "p50_s": round(statistics.median(latencies), 2),
+        "p95_s": round(percentile(latencies, 95), 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--itineraries", type=int, default=20)
+    parser.add_argument("--items", type=int, default=12)
+    parser.add_argument("--batch-sizes", default="1,2,3,4,6,12")
+    parser.add_argument("--ttft", type=float, default=0.5, help="median seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=90)
+    parser.add_argument("--rpm", type=int, default=500, help="requests/min limit")
+    parser.add_argument("--tpm", type=int, default=200_000, help="tokens/min limit")
+    parser.add_argument("--time-scale", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+        print(await run(batch_size, args))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
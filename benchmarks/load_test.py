@@ -0,0 +1,408 @@
+"""
+Offline load test of the full API.
+
+Runs the real FastAPI app in-process with the OpenAI, Perplexity,
+DuckDuckGo and WeatherAPI backends replaced by the simulated providers in
+benchmarks.fake_providers, so routing, caching, scheduling, retries and
+deadlines all behave as in production without network access or API keys.
+
+The workload is either a scripted mix of /activities, /itinerary, /swap and
+/facts requests, or a JSONL file replayed as-is, one request per line:
+
+    {"method": "POST", "path": "/activities", "json": {...}, "headers": {...}}
+
+Reports throughput, per-endpoint p50/p95/p99 latency and status codes,
+event-loop lag and peak memory. With --baseline the run fails (exit code 1)
+when throughput drops or p95 latency grows by more than --tolerance.
+
+Usage:
+    python -m benchmarks.load_test --requests 200 --concurrency 16 --time-scale 0.1
+    python -m benchmarks.load_test --openai 1.2:0.6:0.05 --json > run.json
+    python -m benchmarks.load_test --workload workload.jsonl --baseline run.json
+    python -m benchmarks.load_test --workload workload.jsonl --replay cassette.jsonl
+
+--replay serves upstream calls from a cassette recorded in production with
+CASSETTE_MODE=record (see generation.cassette), at the recorded latencies.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from unittest.mock import patch
+
+# the app reads these at import time, none of them reach a real service
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+os.environ.setdefault("PERPLEXITY_API_KEY", "offline")
+os.environ.setdefault("WEATHER_API_KEY", "offline")
+
+import httpx  # noqa: E402
+
+from benchmarks.fake_providers import (  # noqa: E402
+    FakeDDGS,
+    FakeOpenAI,
+    FakePerplexity,
+    FakeWeatherAPI,
+    LatencyModel,
+    _item,
+)
+from generation.scheduler import PROVIDER_DEFAULTS  # noqa: E402
+
+CITIES = ["London", "Paris", "Rome", "Berlin", "Madrid", "Lisbon", "Vienna", "Prague"]
+DEFAULT_MIX = "activities=4,itinerary=3,swap=2,facts=1"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def search_config(rng: random.Random) -> str:
+    config = {
+        "date": str(date.today() + timedelta(days=rng.randrange(7))),
+        "group": rng.choice(["friends", "family", "couples", "solo"]),
+        "timeOfDay": ["morning", "afternoon", "evening"],
+        "uniqueness": rng.randint(0, 4),
+    }
+    return json.dumps(config, separators=(",", ":"))
+
+
+def scripted_request(endpoint: str, rng: random.Random) -> dict:
+    """One request for an endpoint, with a city drawn from a small pool so caches see repeats"""
+    city = rng.choice(CITIES)
+    headers = {"cookie": f"searchConfig={search_config(rng)}"}
+    if endpoint == "activities":
+        body = {
+            "city": city,
+            "timeOfDay": ["morning", "afternoon"],
+            "group": "friends",
+            "uniqueness": rng.randint(0, 4),
+        }
+        return {"method": "POST", "path": "/activities", "json": body, "headers": headers}
+    if endpoint == "itinerary":
+        body = {"city": city, "preferences": {"liked": ["Culture"], "disliked": []}}
+        return {"method": "POST", "path": "/itinerary", "json": body, "headers": headers}
+    if endpoint == "swap":
+        itinerary = [_item(i, f"Visit venue {i}") for i in range(6)]
+        body = {"city": city, "activityId": rng.randrange(6), "itinerary": {"itinerary": itinerary}}
+        return {"method": "POST", "path": "/swap", "json": body, "headers": headers}
+    if endpoint == "facts":
+        return {
+            "method": "GET",
+            "path": "/facts",
+            "params": {"location": city, "num": 5},
+            "headers": {},
+        }
+    raise ValueError(f"Unknown endpoint {endpoint}")
+
+
+def scripted_workload(mix: str, requests: int, seed: int) -> list:
+    weights = {}
+    for part in mix.split(","):
+        endpoint, weight = part.split("=")
+        weights[endpoint.strip()] = float(weight)
+    rng = random.Random(seed)
+    endpoints = rng.choices(list(weights), weights=list(weights.values()), k=requests)
+    return [scripted_request(endpoint, rng) for endpoint in endpoints]
+
+
+def load_workload(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires, a proxy for blocking work on the event loop"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def scale_limits(time_scale: float):
+    """
+    Compress rate limits, queue timeouts and retry backoff by the same factor
+    as provider latency, so a run at --time-scale 0.1 sees the same contention
+    as one in real time. Explicit environment settings are scaled too.
+    """
+    for name, (_, rpm, tpm, _, queue_timeout) in PROVIDER_DEFAULTS.items():
+        prefix = name.upper()
+        for setting, default in (("RPM", rpm), ("TPM", tpm)):
+            value = float(os.getenv(f"{prefix}_{setting}", default))
+            os.environ[f"{prefix}_{setting}"] = str(value / time_scale)
+        timeout = float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", queue_timeout))
+        os.environ[f"{prefix}_QUEUE_TIMEOUT"] = str(timeout * time_scale)
+    for setting, default in (("RETRY_BASE_DELAY", 0.5), ("RETRY_MAX_DELAY", 8.0)):
+        value = float(os.getenv(f"LLM_{setting}", default))
+        os.environ[f"LLM_{setting}"] = str(value * time_scale)
+
+
+def build_app(args):
+    """
+    Import the app and give it clients backed by the simulated providers, or
+    by a recorded cassette with --replay. With --record the simulated
+    exchanges are also written to a cassette.
+
+    Returns the app, its clients, the simulated providers (empty on replay)
+    and the DDGS session image searches use.
+    """
+    from generation.cassette import Cassette
+    from generation.clients import ClientRegistry
+    from generation.generation import Generator
+    from main import app
+
+    if args.replay:
+        cassette = Cassette(args.replay, "replay", time_scale=args.time_scale)
+        clients = ClientRegistry(cassette=cassette)
+        app.state.clients = clients
+        app.state.generator = Generator(clients)
+        return app, clients, {}, cassette.ddgs()
+
+    def model(spec, offset):
+        return LatencyModel.parse(spec, args.time_scale, args.seed + offset)
+
+    providers = {
+        "openai": FakeOpenAI(
+            model(args.openai, 1), args.tokens_per_second, args.itinerary_items
+        ),
+        "perplexity": FakePerplexity(model(args.perplexity, 2)),
+        "duckduckgo": FakeDDGS(model(args.duckduckgo, 3)),
+        "weatherapi": FakeWeatherAPI(model(args.weatherapi, 4)),
+    }
+    transports = {
+        "openai": httpx.MockTransport(providers["openai"]),
+        "weatherapi": httpx.MockTransport(providers["weatherapi"]),
+        "perplexity": httpx.MockTransport(providers["perplexity"]),
+    }
+    ddgs = providers["duckduckgo"]
+    if args.record:
+        cassette = Cassette(args.record, "record", time_scale=args.time_scale)
+        transports = {
+            "openai": cassette.async_transport("openai", transports["openai"]),
+            "weatherapi": cassette.async_transport("weatherapi", transports["weatherapi"]),
+            "perplexity": cassette.sync_transport("perplexity", transports["perplexity"]),
+        }
+        ddgs = cassette.ddgs(ddgs)
+
+    clients = ClientRegistry(
+        openai_http=httpx.AsyncClient(transport=transports["openai"]),
+        weather_http=httpx.AsyncClient(transport=transports["weatherapi"]),
+        perplexity_http=httpx.Client(transport=transports["perplexity"]),
+    )
+    app.state.clients = clients
+    app.state.generator = Generator(clients)
+    return app, clients, providers, ddgs
+
+
+async def send(client, request, results, deadline_header):
+    headers = dict(request.get("headers") or {})
+    if deadline_header:
+        headers.setdefault("X-Request-Deadline", deadline_header)
+    start = time.perf_counter()
+    try:
+        response = await client.request(
+            request["method"],
+            request["path"],
+            json=request.get("json"),
+            params=request.get("params"),
+            headers=headers,
+        )
+        status = response.status_code
+    except Exception as e:
+        status = type(e).__name__
+    results.append((request["path"], status, time.perf_counter() - start))
+
+
+async def run(args) -> dict:
+    if args.workload:
+        workload = load_workload(args.workload)
+    else:
+        workload = scripted_workload(args.mix, args.requests, args.seed)
+
+    app, clients, providers, ddgs = build_app(args)
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    results = []
+    queue = asyncio.Queue()
+    for request in workload:
+        queue.put_nowait(request)
+
+    async def worker(client):
+        while not queue.empty():
+            await send(client, queue.get_nowait(), results, args.deadline)
+
+    monitor = LoopLagMonitor()
+    # DDGS sessions are per thread, so patch the lookup rather than the class
+    with patch("generation.image_searcher.get_ddgs", return_value=ddgs):
+        # unhandled errors come back as 500s instead of raising in the client
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://loadtest", timeout=None
+        ) as client:
+            monitor.start()
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+            await monitor.stop()
+    await clients.aclose()
+
+    # times are reported in simulated seconds so runs at any time scale compare
+    scale = args.time_scale
+    endpoints = {}
+    by_path = defaultdict(list)
+    for path, status, seconds in results:
+        by_path[path].append((status, seconds / scale))
+    for path, samples in sorted(by_path.items()):
+        latencies = [seconds for _, seconds in samples]
+        endpoints[path] = {
+            "requests": len(samples),
+            "status": dict(Counter(str(status) for status, _ in samples)),
+            "p50_s": round(percentile(latencies, 50), 3),
+            "p95_s": round(percentile(latencies, 95), 3),
+            "p99_s": round(percentile(latencies, 99), 3),
+        }
+
+    lags = monitor.lags or [0.0]
+    report = {
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed / scale, 2),
+        "throughput_rps": round(len(results) / (elapsed / scale), 2),
+        "endpoints": endpoints,
+        # loop lag is real time, blocking work does not shrink with the time scale
+        "loop_lag_ms": {
+            "p50": round(percentile(lags, 50) * 1000, 2),
+            "p99": round(percentile(lags, 99) * 1000, 2),
+            "max": round(max(lags) * 1000, 2),
+        },
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if providers:
+        report["upstream_calls"] = {
+            "openai": providers["openai"].calls,
+            "perplexity": providers["perplexity"].calls,
+            "duckduckgo": providers["duckduckgo"].calls,
+            "weatherapi": len(providers["weatherapi"].calls),
+        }
+    if args.tracemalloc:
+        report["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+        tracemalloc.stop()
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of the report against a baseline, as human readable lines"""
+    failures = []
+    if report["throughput_rps"] < baseline["throughput_rps"] * (1 - tolerance):
+        failures.append(
+            f"throughput {report['throughput_rps']} < baseline {baseline['throughput_rps']}"
+        )
+    for path, stats in report["endpoints"].items():
+        before = baseline["endpoints"].get(path)
+        if before and stats["p95_s"] > before["p95_s"] * (1 + tolerance):
+            failures.append(f"{path} p95 {stats['p95_s']}s > baseline {before['p95_s']}s")
+    return failures
+
+
+def print_report(report: dict):
+    print(
+        f"{report['requests']} requests at concurrency {report['concurrency']} in "
+        f"{report['elapsed_s']}s: {report['throughput_rps']} req/s"
+    )
+    for path, stats in report["endpoints"].items():
+        print(
+            f"  {path:<12} n={stats['requests']:<5} p50={stats['p50_s']}s "
+            f"p95={stats['p95_s']}s p99={stats['p99_s']}s status={stats['status']}"
+        )
+    print(f"event loop lag ms: {report['loop_lag_ms']}")
+    print(f"max rss: {report['max_rss_mb']} MB", end="")
+    if "tracemalloc_peak_mb" in report:
+        print(f", traced peak: {report['tracemalloc_peak_mb']} MB", end="")
+    print()
+    if "upstream_calls" in report:
+        print(f"upstream calls: {report['upstream_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight,...")
+    parser.add_argument("--workload", help="JSONL file of requests to replay")
+    parser.add_argument(
+        "--cache",
+        default="none",
+        help="backend for the LLM, image and link caches: none, memory or sqlite",
+    )
+    parser.add_argument("--record", help="also write simulated exchanges to this cassette")
+    parser.add_argument(
+        "--replay", help="serve upstream calls from this cassette instead of simulating them"
+    )
+    parser.add_argument("--deadline", help="X-Request-Deadline sent with every request")
+    # median seconds : log-normal sigma : error rate
+    parser.add_argument("--openai", default="0.6:0.5:0.01")
+    parser.add_argument("--perplexity", default="1.5:0.5:0.02")
+    parser.add_argument("--duckduckgo", default="0.4:0.6:0.02")
+    parser.add_argument("--weatherapi", default="0.15:0.3:0.01")
+    parser.add_argument("--tokens-per-second", type=float, default=90)
+    parser.add_argument("--itinerary-items", type=int, default=8)
+    parser.add_argument("--time-scale", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    # caches are built when the generation modules are first imported
+    for prefix in ("LLM", "IMAGE", "LINK"):
+        os.environ[f"{prefix}_CACHE_BACKEND"] = args.cache
+
+    scale_limits(args.time_scale)
+
+    # the app logs with print, keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr if args.json else sys.stdout):
+        report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare(report, json.load(f), args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION: {failure}", file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
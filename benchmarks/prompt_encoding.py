@@ -0,0 +1,160 @@
+"""
+Prompt encoding benchmark.
+
+Builds the real prompts of the endpoints that embed itinerary items or
+weather (itinerary feedback rounds, swap, item details) for a realistic
+itinerary, once with the original field-by-field encoding and hourly
+weather and once with the compact encoding, and reports prompt tokens and
+the share saved per endpoint.
+
+Usage:
+    python -m benchmarks.prompt_encoding --items 12
+"""
+
+import argparse
+import asyncio
+import os
+from unittest.mock import patch
+
+# the generator's client reads it at import time, no call reaches OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "offline")
+
+from generation.generation import Generator  # noqa: E402
+from generation.generation_models import (  # noqa: E402
+    FullItinerary,
+    ItineraryItem,
+    SimpleItineraryItem,
+)
+from generation.tokens import count_message_tokens  # noqa: E402
+from generation.utils import weather_to_str  # noqa: E402
+from routes.request_models import Preferences  # noqa: E402
+
+
+class Captured(Exception):
+    """Stops a generator method once its prompt has been built"""
+
+
+def sample_itinerary(num_items: int) -> FullItinerary:
+    items = []
+    for i in range(num_items):
+        transport = i % 3 == 2
+        hour = 9 + i
+        items.append(
+            ItineraryItem(
+                title=(
+                    f"Take the tube from stop {i} to stop {i + 1}"
+                    if transport
+                    else f"Explore venue number {i} in the old town"
+                ),
+                transport=transport,
+                start=f"2025-06-14 {hour:02d}:00",
+                end=f"2025-06-14 {hour:02d}:45",
+                description=(
+                    "Hop on the Jubilee line for a quick ride between neighbourhoods."
+                    if transport
+                    else "Wander the galleries and grab a flat white in the courtyard cafe, "
+                    "a local favourite that gets busy around lunchtime."
+                ),
+                price=2.8 if transport else 18.5,
+                theme="Culture",
+                transportMode="Tube" if transport else "N/A",
+                requires_booking=not transport,
+                booking_url=None if transport else f"https://tickets.example.com/venue-{i}",
+                weather="Partly cloudy",
+                temperature=19,
+                image_link=[
+                    f"https://images.example.com/venue-{i}/photo-{n}.jpg" for n in range(2)
+                ],
+                duration=45,
+                id=i,
+                latitude=51.5 + i / 1000,
+                longitude=-0.12 - i / 1000,
+            )
+        )
+    return FullItinerary(itinerary=items)
+
+
+def sample_weather():
+    conditions = ["Sunny"] * 5 + ["Partly cloudy"] * 6 + ["Light rain"] * 3 + ["Clear"] * 3
+    return [
+        {"time": f"{hour:02d}:00", "weather": condition, "temperature": 12 + hour // 3}
+        for hour, condition in zip(range(7, 24), conditions)
+    ]
+
+
+async def capture(method, **kwargs):
+    """Return the messages a generator method would send to the LLM"""
+    messages = []
+
+    async def invoke(structured_model, prompt, *args, **kw):
+        messages.extend(prompt)
+        raise Captured()
+
+    generator = method.__self__
+    with patch.object(generator, "invoke_with_retries", side_effect=invoke):
+        try:
+            await method(**kwargs)
+        except Captured:
+            pass
+    return messages
+
+
+async def prompts(generator: Generator, itinerary: FullItinerary, weather) -> dict:
+    weather_string = weather_to_str(weather)
+    item = itinerary.itinerary[0]
+    return {
+        "itinerary (feedback)": await capture(
+            generator.generate_itinerary,
+            location="London",
+            group="friends",
+            preferences=Preferences(liked=["Museums"], disliked=["Clubs"]),
+            prior_itinerary=itinerary,
+            feedback="more food please",
+            weather=weather_string,
+        ),
+        "swap": await capture(
+            generator.swap_activity,
+            activity=item,
+            location="London",
+            group="friends",
+            uniqueness=2,
+            itinerary=itinerary,
+            feedback="somewhere outdoors",
+            weather=weather_string,
+        ),
+        "item details": await capture(
+            generator.generate_item_details,
+            itineraryItem=SimpleItineraryItem(
+                title=item.title, imageTag="venue", start=item.start, end=item.end, id=item.id
+            ),
+            location="London",
+            group="friends",
+            weather=weather_string,
+        ),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=12)
+    args = parser.parse_args()
+
+    generator = Generator()
+    itinerary = sample_itinerary(args.items)
+    weather = sample_weather()
+
+    os.environ["PROMPT_ENCODING"] = "full"
+    full = await prompts(generator, itinerary, weather)
+    os.environ["PROMPT_ENCODING"] = "compact"
+    compact = await prompts(generator, itinerary, weather)
+
+    print(f"{'endpoint':<22}{'full':>8}{'compact':>9}{'saved':>8}{'saved %':>9}")
+    for endpoint, messages in full.items():
+        before = count_message_tokens(messages)
+        after = count_message_tokens(compact[endpoint])
+        saved = before - after
+        print(f"{endpoint:<22}{before:>8}{after:>9}{saved:>8}{saved / before:>9.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
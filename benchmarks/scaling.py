@@ -0,0 +1,224 @@
+"""
+Multi-worker scaling benchmark.
+
+Starts the API under uvicorn with 1, 2, ... N worker processes, backed by
+the simulated providers of benchmarks.load_test, and drives the same
+scripted workload over real HTTP against each. All runs use the shared
+cache tier (CACHE_SHARED=true) in a fresh directory, so only the number of
+workers changes. Provider rate limits are lifted unless --keep-limits is
+given: they are account-wide and split between workers, which would cap
+throughput regardless of cores.
+
+Reports wall clock throughput, speedup over the first run and p50/p95
+latency per run. The load is generated by --client-processes processes so
+the client does not become the bottleneck before the server does.
+
+Usage:
+    python -m benchmarks.scaling --workers 1,2,4 --requests 400 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+import httpx
+
+from benchmarks.load_test import DEFAULT_MIX, percentile, scripted_workload, send
+
+# simulated provider settings passed to the server's worker processes
+ARGS_ENV = "SCALING_PROVIDER_ARGS"
+
+
+def create_app():
+    """uvicorn app factory run in every worker: the API on simulated providers"""
+    from benchmarks.load_test import build_app, scale_limits
+
+    args = argparse.Namespace(**json.loads(os.environ[ARGS_ENV]))
+    scale_limits(args.time_scale)
+    app, clients, _, ddgs = build_app(args)
+
+    # replace the production lifespan, which would swap in real clients
+    @asynccontextmanager
+    async def lifespan(app):
+        # DDGS sessions are per thread, so patch the lookup rather than the class
+        with patch("generation.image_searcher.get_ddgs", return_value=ddgs):
+            yield
+        await clients.aclose()
+
+    app.router.lifespan_context = lifespan
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, args, cache_dir: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update(
+        {
+            ARGS_ENV: json.dumps(
+                {
+                    "openai": args.openai,
+                    "perplexity": args.perplexity,
+                    "duckduckgo": args.duckduckgo,
+                    "weatherapi": args.weatherapi,
+                    "tokens_per_second": args.tokens_per_second,
+                    "itinerary_items": args.itinerary_items,
+                    "time_scale": args.time_scale,
+                    "seed": args.seed,
+                    "replay": None,
+                    "record": None,
+                }
+            ),
+            "WEB_CONCURRENCY": str(workers),
+            "CACHE_SHARED": "true",
+            "OPENAI_API_KEY": "offline",
+            "PERPLEXITY_API_KEY": "offline",
+            "WEATHER_API_KEY": "offline",
+        }
+    )
+    for prefix in ("LLM", "IMAGE", "LINK", "WEATHER", "SWAP_POOL", "CATALOG"):
+        env[f"{prefix}_CACHE_PATH"] = os.path.join(cache_dir, f"{prefix.lower()}.sqlite3")
+    if not args.keep_limits:
+        for provider in ("OPENAI", "PERPLEXITY", "DUCKDUCKGO", "WEATHERAPI"):
+            env[f"{provider}_RPM"] = env[f"{provider}_TPM"] = "0"
+            env[f"{provider}_CONCURRENCY"] = str(1024 * workers)
+
+    command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "benchmarks.scaling:create_app",
+        "--factory",
+        "--port",
+        str(port),
+        "--workers",
+        str(workers),
+        "--log-level",
+        "warning",
+    ]
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+
+
+def wait_ready(base_url: str, timeout: float = 60):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            if httpx.get(f"{base_url}/metrics").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+
+async def drive(base_url: str, workload: list, concurrency: int) -> list:
+    results = []
+    queue = asyncio.Queue()
+    for request in workload:
+        queue.put_nowait(request)
+
+    async def worker(client):
+        while not queue.empty():
+            await send(client, queue.get_nowait(), results, None)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return results
+
+
+def drive_process(base_url: str, workload: list, concurrency: int) -> list:
+    return asyncio.run(drive(base_url, workload, concurrency))
+
+
+def run(workers: int, args) -> dict:
+    workload = scripted_workload(args.mix, args.requests, args.seed)
+    processes = args.client_processes
+    chunks = [workload[i::processes] for i in range(processes)]
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as cache_dir:
+        server = start_server(workers, port, args, cache_dir)
+        try:
+            wait_ready(base_url)
+            with ProcessPoolExecutor(processes) as pool:
+                start = time.perf_counter()
+                per_process = max(1, args.concurrency // processes)
+                futures = [
+                    pool.submit(drive_process, base_url, chunk, per_process) for chunk in chunks
+                ]
+                results = [result for future in futures for result in future.result()]
+                elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+
+    # wall clock: CPU-bound work does not shrink with the time scale
+    latencies = [seconds * 1000 for _, _, seconds in results]
+    errors = sum(1 for _, status, _ in results if status != 200)
+    return {
+        "workers": workers,
+        "requests": len(results),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(results) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers", default=f"1,2,{os.cpu_count() or 1}", help="comma separated worker counts"
+    )
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--client-processes", type=int, default=2)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight,...")
+    parser.add_argument("--keep-limits", action="store_true", help="keep provider rate limits")
+    # median seconds : log-normal sigma : error rate
+    parser.add_argument("--openai", default="0.6:0.5:0.0")
+    parser.add_argument("--perplexity", default="1.5:0.5:0.0")
+    parser.add_argument("--duckduckgo", default="0.4:0.6:0.0")
+    parser.add_argument("--weatherapi", default="0.15:0.3:0.0")
+    parser.add_argument("--tokens-per-second", type=float, default=90)
+    parser.add_argument("--itinerary-items", type=int, default=8)
+    parser.add_argument("--time-scale", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    counts = sorted({int(n) for n in args.workers.split(",")})
+    reports = [run(workers, args) for workers in counts]
+    base = reports[0]["throughput_rps"]
+    for report in reports:
+        report["speedup"] = round(report["throughput_rps"] / base, 2) if base else 0.0
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+    print(f"{'workers':>8}{'req/s':>10}{'speedup':>9}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}")
+    for report in reports:
+        print(
+            f"{report['workers']:>8}{report['throughput_rps']:>10}{report['speedup']:>9}"
+            f"{report['p50_ms']:>9}{report['p95_ms']:>9}{report['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
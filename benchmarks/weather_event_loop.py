@@ -0,0 +1,130 @@
+"""
+Event-loop stall benchmark for weather lookups.
+
+Serves a fake WeatherAPI forecast from a local HTTP server with artificial
+latency, then compares the old blocking `requests.get` lookup against the
+async cached WeatherService while a ticker task measures how long the event
+loop was unable to run.
+
+Usage:
+    python -m benchmarks.weather_event_loop --latency 0.2 --lookups 20
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from generation.cache import MemoryCache
+from generation.weather import WeatherService, filter_hours
+from tests.fakes import FakeForecastAPI
+
+
+def start_server(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            params = parse_qs(urlparse(self.path).query)
+            time.sleep(latency)
+            body = json.dumps(FakeForecastAPI.forecast(int(params["days"][0])))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def measure_stall(workload) -> dict:
+    """Run a workload while a 1ms ticker records event-loop lag"""
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        interval = 0.001
+        while not stop.is_set():
+            before = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - before - interval)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)  # let the ticker start before the workload runs
+    start = time.perf_counter()
+    await workload()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await task
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "max_stall_ms": round(max(lags) * 1000, 1) if lags else 0.0,
+        "total_stall_ms": round(sum(lag for lag in lags if lag > 0.005) * 1000, 1),
+    }
+
+
+def blocking_lookup(url: str, location: str, date: str):
+    """The pre-WeatherService implementation: a synchronous request per lookup"""
+    days_diff = (
+        datetime.strptime(date, "%Y-%m-%d").date() - datetime.now().date()
+    ).days
+    params = {"key": "bench", "q": location, "days": days_diff + 1, "hour": "0-23"}
+    data = requests.get(url, params=params).json()
+    for day in data["forecast"]["forecastday"]:
+        if day["date"] == date:
+            return filter_hours(day["hour"])
+    return None
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--lookups", type=int, default=20)
+    parser.add_argument("--locations", type=int, default=4)
+    args = parser.parse_args()
+
+    server = start_server(args.latency)
+    url = f"http://127.0.0.1:{server.server_port}/v1/forecast.json"
+    lookups = [
+        (
+            f"City {i % args.locations}",
+            (datetime.now() + timedelta(days=i % 7)).strftime("%Y-%m-%d"),
+        )
+        for i in range(args.lookups)
+    ]
+
+    async def before():
+        # the async handlers awaited nothing here, so lookups ran back to back
+        for location, date in lookups:
+            blocking_lookup(url, location, date)
+
+    service = WeatherService(api_key="bench", cache=MemoryCache(), url=url)
+    service.client  # build the pooled client outside the measured window
+
+    async def after():
+        await asyncio.gather(
+            *(service.get_weather(location, date) for location, date in lookups)
+        )
+
+    results = {
+        "before (requests.get)": await measure_stall(before),
+        "after (WeatherService)": await measure_stall(after),
+    }
+    await service.client.aclose()
+    server.shutdown()
+
+    for name, result in results.items():
+        print(f"{name:24} {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
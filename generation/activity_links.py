@@ -3,16 +3,68 @@ from langchain_community.chat_models import ChatPerplexity
 from langchain.schema import HumanMessage, SystemMessage
 from dotenv import load_dotenv
 import ast
+import openai
+import time
+from functools import lru_cache
+from .cache import build_cache, cache_key
+from .deadline import Deadline
+from .metrics import STAGE_LATENCY
+from .scheduler import get_scheduler
+from .singleflight import SingleFlight
+from .utils import normalize_text
 
 
 # Load environment variables from .env file (if you have one)
 load_dotenv()
 
+_flights = SingleFlight()
 
-def setup_perplexity_chain():
+LINK_CACHE_TTL = 7 * 24 * 3600
+NEGATIVE_CACHE_TTL = float(os.getenv("LINK_NEGATIVE_CACHE_TTL", 24 * 3600))
+
+_SKIPPED = object()
+
+# counters behind link_cache_stats
+_stats = {"queries": 0, "query_seconds": 0.0, "skipped_queries": 0}
+
+
+@lru_cache(maxsize=None)
+def get_link_cache():
+    """(venue, city) to booking URL cache, persisted in SQLite unless configured otherwise"""
+    return build_cache("LINK", ttl=LINK_CACHE_TTL, maxsize=8192, backend="sqlite")
+
+
+def link_cache_key(title, location) -> str:
+    return cache_key("link", normalize_text(location), normalize_text(title))
+
+
+def link_cache_stats() -> dict:
+    """
+    Hit ratio of the booking-link cache and the Perplexity time it saved.
+
+    Saved time counts calls answered entirely from the cache, priced at the
+    average latency of the Perplexity queries that did run.
+    """
+    cache = get_link_cache()
+    stats = cache.stats() if cache is not None else {"backend": None}
+    queries = _stats["queries"]
+    average = _stats["query_seconds"] / queries if queries else 0.0
+    stats.update(
+        perplexity_queries=queries,
+        avg_query_seconds=average,
+        skipped_queries=_stats["skipped_queries"],
+        saved_seconds=_stats["skipped_queries"] * average,
+    )
+    return stats
+
+
+def setup_perplexity_chain(http_client=None):
     """
     Set up and return a Perplexity chat model using the API key.
 
+    Args:
+        http_client (httpx.Client, optional): Pooled client to send requests through
+
     Returns:
         ChatPerplexity: A configured Perplexity chat model instance
     """
@@ -28,9 +80,22 @@ def setup_perplexity_chain():
         temperature=0.7,
     )
 
+    if http_client is not None:
+        chat_model.client = openai.OpenAI(
+            api_key=api_key,
+            base_url="https://api.perplexity.ai",
+            http_client=http_client,
+        )
+
     return chat_model
 
 
+@lru_cache(maxsize=None)
+def get_perplexity_chain():
+    """Shared Perplexity model for callers that do not pass their own"""
+    return setup_perplexity_chain()
+
+
 async def run_perplexity_query(perplexity_chain, query):
     """
     Send a query to the Perplexity API and return the response.
@@ -50,25 +115,108 @@ async def run_perplexity_query(perplexity_chain, query):
     human_message = HumanMessage(content=query)
 
     # Get response from Perplexity
-    response = await perplexity_chain.ainvoke([system_message, human_message])
+    async with get_scheduler().slot("perplexity"):
+        response = await perplexity_chain.ainvoke([system_message, human_message])
 
     # Return the content of the response
     return response.content
 
 
-async def get_activity_links(titles_set, location, try_again=True):
+async def get_activity_links(
+    titles_set,
+    location,
+    try_again=True,
+    perplexity_chain=None,
+    deadline: Deadline = None,
+):
     """
     Get links to the relevant website for each of these activities using Perplexity API.
     Returns results as a dictionary where each activity is a key and its link is the value.
 
+    Links are cached per venue and city, so only venues missing from the cache
+    are sent to Perplexity and their links are written back. Concurrent calls
+    for the same missing titles and location share one Perplexity query.
+
     Args:
         titles_set (set): A set containing activity descriptions
+        location (str): The location of the trip
+        perplexity_chain (ChatPerplexity, optional): Model to query, defaults to a shared one
+        deadline (Deadline, optional): Request deadline, cached links are returned
+            without the missing ones if Perplexity does not answer in time
 
     Returns:
         dict: Dictionary with activities as keys and their booking links as values
     """
-    perplexity_chain = setup_perplexity_chain()
+    with STAGE_LATENCY.time(stage="links"):
+        return await _cached_activity_links(
+            titles_set, location, try_again, perplexity_chain, deadline
+        )
+
+
+async def _cached_activity_links(
+    titles_set, location, try_again, perplexity_chain, deadline
+):
+    cache = get_link_cache()
+    links = {}
+    missing = dict(titles_set)
+    if cache is not None:
+        for k, title in titles_set.items():
+            cached = await cache.get(link_cache_key(title, location))
+            if cached is not None:
+                links[k] = cached["url"]
+                del missing[k]
+
+    if not missing:
+        _stats["skipped_queries"] += 1
+        return links
+
+    key = cache_key(
+        normalize_text(location),
+        sorted((str(k), normalize_text(v)) for k, v in missing.items()),
+        try_again,
+    )
+    query = _flights.do(
+        key,
+        _query_activity_links,
+        missing,
+        location,
+        try_again,
+        perplexity_chain or get_perplexity_chain(),
+    )
+    if deadline is not None:
+        # booking links are optional, keep what the cache had if time runs out
+        result = await deadline.optional("links", query, _SKIPPED)
+        if result is _SKIPPED:
+            return links or None
+    else:
+        result = await query
+
+    if result is None:
+        return links or None
+
+    for k, title in missing.items():
+        # Perplexity may echo the keys back as strings
+        url = result.get(k, result.get(str(k)))
+        links[k] = url
+        if cache is not None:
+            await cache.set(
+                link_cache_key(title, location),
+                {"url": url},
+                ttl=None if url else NEGATIVE_CACHE_TTL,
+            )
+    return links
+
+
+async def _query_activity_links(titles_set, location, try_again, perplexity_chain):
+    # runs once per single-flight key, so callers that joined it are not counted
+    start = time.perf_counter()
+    result = await _get_activity_links(titles_set, location, try_again, perplexity_chain)
+    _stats["queries"] += 1
+    _stats["query_seconds"] += time.perf_counter() - start
+    return result
+
 
+async def _get_activity_links(titles_set, location, try_again, perplexity_chain):
     user_input = (
         f"The user is planning an itinerary for a trip to {location}."
         "Replace each value in this dictionary with a website link for the given venue if you can find it, and return only the dictionary with no other text as a string. "
@@ -87,14 +235,18 @@ async def get_activity_links(titles_set, location, try_again=True):
         else:
             if try_again:
                 # If it fails the first time, try again
-                return await get_activity_links(titles_set, location, try_again=False)
+                return await _get_activity_links(
+                    titles_set, location, False, perplexity_chain
+                )
             else:
                 return None
     except (ValueError, SyntaxError):
         # If there's an error during evaluation, return None
         if try_again:
             # If it fails the first time, try again
-            return await get_activity_links(titles_set, location, try_again=False)
+            return await _get_activity_links(
+                titles_set, location, False, perplexity_chain
+            )
         return None
 
 
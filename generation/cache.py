@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .metrics import CACHE_REQUESTS
+
+
+class TTLCache:
+    """
+    In-process LRU cache where every entry expires after a fixed time to live.
+
+    Args:
+        maxsize: Maximum number of entries kept before the least recently used is evicted
+        ttl: Time to live of an entry in seconds
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def cache_key(*parts) -> str:
+    """Hash any JSON serializable parts into a stable cache key"""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CacheBackend:
+    """
+    Async key-value store for JSON serializable values with hit/miss counters.
+
+    Subclasses implement _get and _set, callers use get and set.
+    """
+
+    # label for the cache_requests_total metric, set by build_cache
+    name = "cache"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self._get(key)
+        if value is None:
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache=self.name, result="miss")
+        else:
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache=self.name, result="hit")
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self._set(key, value, ttl)
+
+    async def _get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def _set(self, key: str, value: Any, ttl: Optional[float]):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process LRU backend with size and TTL eviction.
+
+    Args:
+        maxsize: Maximum number of entries
+        ttl: Default time to live in seconds
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        super().__init__()
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def _get(self, key):
+        return self._cache.get(key)
+
+    async def _set(self, key, value, ttl):
+        self._cache.set(key, value, ttl)
+
+    def __len__(self):
+        return len(self._cache)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    On-disk backend storing JSON values in a SQLite table.
+
+    The database runs in WAL mode, so worker processes sharing the file read
+    while another writes instead of waiting on a lock.
+
+    Args:
+        path: Path of the database file, created if missing
+        table: Table name, so several caches can share one file
+        ttl: Default time to live in seconds
+    """
+
+    def __init__(self, path: str, table: str = "cache", ttl: float = 3600):
+        super().__init__()
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL stays consistent without a sync on every commit, a crash only loses cache entries
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _read(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def _write(self, key, value, ttl):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+
+    def purge_expired(self):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),)
+            )
+
+    async def _get(self, key):
+        return await asyncio.to_thread(self._read, key)
+
+    async def _set(self, key, value, ttl):
+        await asyncio.to_thread(self._write, key, value, ttl)
+
+
+class TieredCache(CacheBackend):
+    """
+    Per-process memory tier in front of a SQLite tier shared by all workers.
+
+    Reads try memory first and copy shared hits into it; writes go to both.
+    Local copies live at most `local_ttl` seconds, which bounds how long a
+    worker can serve a value another worker has since replaced.
+
+    Args:
+        shared: SQLite backend every worker process opens
+        maxsize: Maximum entries of the memory tier
+        ttl: Default time to live in seconds
+        local_ttl: Maximum seconds an entry is served from memory
+    """
+
+    def __init__(
+        self, shared: SQLiteCache, maxsize: int = 1024, ttl: float = 3600, local_ttl: float = 30
+    ):
+        super().__init__()
+        self.shared = shared
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self._local = TTLCache(maxsize=maxsize, ttl=min(ttl, local_ttl))
+
+    async def _get(self, key):
+        value = self._local.get(key)
+        if value is None:
+            value = await self.shared._get(key)
+            if value is not None:
+                self._local.set(key, value)
+        return value
+
+    async def _set(self, key, value, ttl):
+        self._local.set(key, value, min(self.ttl if ttl is None else ttl, self.local_ttl))
+        await self.shared._set(key, value, ttl)
+
+
+def shared_caches() -> bool:
+    """Whether caches default to the tier shared by worker processes, see main.serve"""
+    return os.getenv("CACHE_SHARED", "false").lower() == "true"
+
+
+def build_cache(
+    prefix: str, ttl: float = 3600, maxsize: int = 1024, backend: str = "memory"
+) -> Optional[CacheBackend]:
+    """
+    Build the cache backend configured through environment variables.
+
+    {prefix}_CACHE_BACKEND selects "memory", "sqlite", "tiered" or "none",
+    {prefix}_CACHE_TTL and {prefix}_CACHE_SIZE override the defaults,
+    {prefix}_CACHE_PATH sets the SQLite file and {prefix}_CACHE_LOCAL_TTL
+    how long the tiered backend keeps entries in memory. With
+    CACHE_SHARED=true, caches without an explicit backend are tiered so
+    every worker process shares them.
+
+    Args:
+        prefix: Environment variable prefix, e.g. "LLM"
+        ttl: Default time to live in seconds
+        maxsize: Default maximum entries for the memory backend
+        backend: Backend used when {prefix}_CACHE_BACKEND is not set
+
+    Returns:
+        CacheBackend: The configured backend, or None if caching is disabled
+    """
+    if shared_caches():
+        backend = "tiered"
+    backend = os.getenv(f"{prefix}_CACHE_BACKEND", backend).lower()
+    ttl = float(os.getenv(f"{prefix}_CACHE_TTL", ttl))
+
+    if backend == "none":
+        return None
+    if backend in ("sqlite", "tiered"):
+        path = os.getenv(f"{prefix}_CACHE_PATH", f"cache/{prefix.lower()}.sqlite3")
+        cache = SQLiteCache(path, table=f"{prefix.lower()}_cache", ttl=ttl)
+        if backend == "tiered":
+            cache = TieredCache(
+                cache,
+                maxsize=int(os.getenv(f"{prefix}_CACHE_SIZE", maxsize)),
+                ttl=ttl,
+                local_ttl=float(os.getenv(f"{prefix}_CACHE_LOCAL_TTL", 30)),
+            )
+    elif backend == "memory":
+        maxsize = int(os.getenv(f"{prefix}_CACHE_SIZE", maxsize))
+        cache = MemoryCache(maxsize=maxsize, ttl=ttl)
+    else:
+        raise ValueError(f"Unknown cache backend for {prefix}: {backend}")
+
+    cache.name = prefix.lower()
+    return cache
@@ -0,0 +1,346 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+# query parameters and headers never written to a cassette
+REDACTED_PARAMS = {"key", "api_key"}
+# response headers kept, the body is stored decoded so encodings are dropped
+KEPT_HEADERS = {"content-type", "retry-after"}
+
+
+class CassetteMiss(httpx.TransportError):
+    """
+    Raised in replay mode for a request that was never recorded. It is a
+    transport error, so callers treat it like an unreachable upstream.
+    """
+
+
+def _redact_url(url: httpx.URL) -> str:
+    parts = urlsplit(str(url))
+    query = [
+        (name, "REDACTED" if name in REDACTED_PARAMS else value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _decode_body(content: bytes):
+    if not content:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        return content.decode("utf-8", errors="replace")
+
+
+class Cassette:
+    """
+    JSONL record of outbound exchanges, one line per request with the
+    provider, request, response and timings.
+
+    In "record" mode exchanges pass through to the real upstream and are
+    appended to the file. In "replay" mode they are served from the file
+    with their recorded latency and nothing reaches the network. Requests
+    are matched on provider, method, URL and body; repeats of the same
+    request are replayed in recorded order, and the last one is reused once
+    they run out.
+
+    Args:
+        path: JSONL file to append to or replay from
+        mode: "record" or "replay"
+        time_scale: Multiplier applied to recorded latencies on replay. When
+            recording, measured latencies are divided by it, so a cassette
+            recorded from a sped-up simulation still holds real-time latencies
+    """
+
+    def __init__(self, path: str, mode: str = "replay", time_scale: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.time_scale = time_scale
+        self._lock = threading.Lock()
+        self._entries = defaultdict(list)
+        self._positions = defaultdict(int)
+        if mode == "replay":
+            self.load()
+
+    @staticmethod
+    def match_key(provider: str, method: str, url: str, body) -> str:
+        payload = json.dumps([provider, method, url, body], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    def record(self, provider: str, request: dict, response: dict, timing: dict):
+        """Append one exchange to the cassette file"""
+        entry = {
+            "key": self.match_key(
+                provider, request["method"], request["url"], request.get("body")
+            ),
+            "provider": provider,
+            "recorded_at": time.time(),
+            "request": request,
+            "response": response,
+            "timing": {name: seconds / self.time_scale for name, seconds in timing.items()},
+        }
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def lookup(self, provider: str, method: str, url: str, body) -> dict:
+        """Next recorded exchange for a request, raising CassetteMiss if there is none"""
+        key = self.match_key(provider, method, url, body)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMiss(f"no recorded {provider} exchange for {method} {url}")
+            position = self._positions[key]
+            self._positions[key] = position + 1
+            return entries[min(position, len(entries) - 1)]
+
+    def delay(self, entry: dict, timing: str = "elapsed") -> float:
+        return entry["timing"].get(timing, 0.0) * self.time_scale
+
+    def async_transport(
+        self, provider: str, inner: Optional[httpx.AsyncBaseTransport] = None
+    ) -> "AsyncCassetteTransport":
+        return AsyncCassetteTransport(self, provider, inner)
+
+    def sync_transport(
+        self, provider: str, inner: Optional[httpx.BaseTransport] = None
+    ) -> "SyncCassetteTransport":
+        return SyncCassetteTransport(self, provider, inner)
+
+    def ddgs(self, inner=None) -> "CassetteDDGS":
+        return CassetteDDGS(self, inner)
+
+
+def _request_entry(request: httpx.Request) -> dict:
+    return {
+        "method": request.method,
+        "url": _redact_url(request.url),
+        "body": _decode_body(request.content),
+    }
+
+
+def _response_entry(response: httpx.Response, content: bytes) -> dict:
+    return {
+        "status": response.status_code,
+        "headers": {
+            name: value
+            for name, value in response.headers.items()
+            if name.lower() in KEPT_HEADERS
+        },
+        "body": content.decode("utf-8", errors="replace"),
+    }
+
+
+def _replayed_response(entry: dict, request: httpx.Request, content=None) -> httpx.Response:
+    response = entry["response"]
+    return httpx.Response(
+        response["status"],
+        headers=response["headers"],
+        content=content if content is not None else response["body"].encode("utf-8"),
+        request=request,
+    )
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """
+    Async httpx transport recording to or replaying from a cassette.
+
+    Recorded responses are read in full before being returned, so a
+    streamed response reaches the caller at once while recording. Replay
+    restores the recorded time to first byte and total time.
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        provider: str,
+        inner: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.cassette = cassette
+        self.provider = provider
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        entry = _request_entry(request)
+        if self.cassette.mode == "replay":
+            return await self._replay(request, entry)
+
+        start = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        first_byte = time.perf_counter() - start
+        try:
+            content = b"".join([chunk async for chunk in response.stream])
+        finally:
+            await response.aclose()
+        elapsed = time.perf_counter() - start
+
+        replay = httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            content=content,
+            request=request,
+        )
+        # record the decoded body the client will see
+        decoded = await replay.aread()
+        # appending to the file blocks, keep it off the event loop
+        await asyncio.to_thread(
+            self.cassette.record,
+            self.provider,
+            entry,
+            _response_entry(replay, decoded),
+            {"first_byte": first_byte, "elapsed": elapsed},
+        )
+        return replay
+
+    async def _replay(self, request: httpx.Request, entry: dict) -> httpx.Response:
+        recorded = self.cassette.lookup(
+            self.provider, entry["method"], entry["url"], entry["body"]
+        )
+        first_byte = self.cassette.delay(recorded, "first_byte")
+        await asyncio.sleep(first_byte)
+
+        async def body():
+            await asyncio.sleep(max(0.0, self.cassette.delay(recorded) - first_byte))
+            yield recorded["response"]["body"].encode("utf-8")
+
+        return _replayed_response(recorded, request, content=body())
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+
+class SyncCassetteTransport(httpx.BaseTransport):
+    """Sync counterpart of AsyncCassetteTransport, for the Perplexity client"""
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        provider: str,
+        inner: Optional[httpx.BaseTransport] = None,
+    ):
+        self.cassette = cassette
+        self.provider = provider
+        self.inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        entry = _request_entry(request)
+        if self.cassette.mode == "replay":
+            recorded = self.cassette.lookup(
+                self.provider, entry["method"], entry["url"], entry["body"]
+            )
+            time.sleep(self.cassette.delay(recorded))
+            return _replayed_response(recorded, request)
+
+        start = time.perf_counter()
+        response = self.inner.handle_request(request)
+        first_byte = time.perf_counter() - start
+        try:
+            content = b"".join(response.stream)
+        finally:
+            response.close()
+        elapsed = time.perf_counter() - start
+
+        replay = httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            content=content,
+            request=request,
+        )
+        decoded = replay.read()
+        self.cassette.record(
+            self.provider,
+            entry,
+            _response_entry(replay, decoded),
+            {"first_byte": first_byte, "elapsed": elapsed},
+        )
+        return replay
+
+    def close(self):
+        if self.inner is not None:
+            self.inner.close()
+
+
+class CassetteDDGS:
+    """
+    Wraps a DDGS session so image queries are recorded or replayed. DDGS
+    does not expose its HTTP client, so exchanges are captured at the
+    method level with the query as the request and the results as the body.
+    Errors are recorded too and raised again on replay.
+    """
+
+    def __init__(self, cassette: Cassette, inner=None):
+        self.cassette = cassette
+        self.inner = inner
+
+    def images(self, query: str, max_results: int = None):
+        request = {
+            "method": "images",
+            "url": "ddgs://images",
+            "body": {"query": query, "max_results": max_results},
+        }
+        if self.cassette.mode == "replay":
+            recorded = self.cassette.lookup(
+                "duckduckgo", request["method"], request["url"], request["body"]
+            )
+            time.sleep(self.cassette.delay(recorded))
+            response = recorded["response"]
+            if response.get("error"):
+                raise RuntimeError(response["error"])
+            return response["body"]
+
+        start = time.perf_counter()
+        try:
+            results = list(self.inner.images(query, max_results=max_results))
+        except Exception as e:
+            response = {"error": f"{type(e).__name__}: {e}", "body": None}
+            self.cassette.record(
+                "duckduckgo", request, response, {"elapsed": time.perf_counter() - start}
+            )
+            raise
+        self.cassette.record(
+            "duckduckgo",
+            request,
+            {"error": None, "body": results},
+            {"elapsed": time.perf_counter() - start},
+        )
+        return results
+
+
+@lru_cache(maxsize=None)
+def get_cassette() -> Optional[Cassette]:
+    """
+    Process-wide cassette from CASSETTE_MODE ("record" or "replay"),
+    CASSETTE_PATH and CASSETTE_TIME_SCALE, or None when recording is off.
+    """
+    mode = os.getenv("CASSETTE_MODE", "off").lower()
+    if mode in ("", "off", "none"):
+        return None
+    return Cassette(
+        os.getenv("CASSETTE_PATH", "cassette.jsonl"),
+        mode=mode,
+        time_scale=float(os.getenv("CASSETTE_TIME_SCALE", 1.0)),
+    )
@@ -0,0 +1,316 @@
+"""
+Pre-generated activities and facts for the most requested cities.
+
+Build the catalog for the configured cities with:
+    python -m generation.catalog --cities London,Paris,Rome
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+from .cache import build_cache, cache_key
+from .image_searcher import get_n_random_places
+from .jobs import get_job_queue
+from .metrics import CATALOG_EVENTS
+from .utils import TIME_OF_DAY_WINDOWS, normalize_text
+
+CATALOG_GROUPS = ("solo", "couples", "family", "friends")
+UNIQUENESS_LEVELS = tuple(range(5))
+# activities returned by /activities, and per titles call
+ACTIVITIES_PER_REQUEST = 6
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+class CityCatalog:
+    """
+    Store of pre-generated activities, with images, for every group and
+    uniqueness level of a configured list of cities, plus facts per city.
+
+    /activities samples from an entry instead of making two LLM calls and
+    an image search. Entries older than `ttl` are still served, and a
+    refresh is started in the background (stale-while-revalidate); after
+    `max_age` they are dropped. A requested city outside the list, a
+    request for only some parts of the day, or an entry that has not been
+    built yet, falls back to live generation, and a missing entry of a
+    listed city is built in the background.
+
+    Args:
+        cities: Cities kept in the catalog
+        ttl: Seconds after which an entry is refreshed
+        max_age: Seconds after which an entry is no longer served
+        activities_per_entry: Activities generated per city, group and uniqueness
+        facts_per_city: Facts generated per city
+        max_pending: Background refreshes running at once, further ones are skipped
+    """
+
+    def __init__(
+        self,
+        cities: Iterable[str] = (),
+        ttl: float = 7 * 24 * 3600,
+        max_age: float = 30 * 24 * 3600,
+        activities_per_entry: int = 12,
+        facts_per_city: int = 10,
+        max_pending: int = 2,
+    ):
+        self.cities = {normalize_text(city): city for city in cities}
+        self.ttl = ttl
+        self.max_age = max_age
+        self.activities_per_entry = activities_per_entry
+        self.facts_per_city = facts_per_city
+        self.max_pending = max_pending
+        self.cache = build_cache("CATALOG", ttl=max_age, maxsize=16384, backend="sqlite")
+        self.refreshing = set()
+        self.tasks = set()
+
+    @classmethod
+    def from_env(cls) -> "CityCatalog":
+        """Read CATALOG_CITIES (comma separated), CATALOG_TTL, CATALOG_MAX_AGE, CATALOG_ACTIVITIES, CATALOG_FACTS and CATALOG_MAX_PENDING"""
+        return cls(
+            cities=_split(os.getenv("CATALOG_CITIES")),
+            ttl=float(os.getenv("CATALOG_TTL", 7 * 24 * 3600)),
+            max_age=float(os.getenv("CATALOG_MAX_AGE", 30 * 24 * 3600)),
+            activities_per_entry=int(os.getenv("CATALOG_ACTIVITIES", 12)),
+            facts_per_city=int(os.getenv("CATALOG_FACTS", 10)),
+            max_pending=int(os.getenv("CATALOG_MAX_PENDING", 2)),
+        )
+
+    @staticmethod
+    def key(city: str, group: Optional[str] = None, uniqueness: Optional[int] = None) -> str:
+        return cache_key("catalog", normalize_text(city), group, uniqueness)
+
+    @staticmethod
+    def facts_key(city: str) -> str:
+        return cache_key("catalog_facts", normalize_text(city))
+
+    def covers(self, city: str, group=None, uniqueness=None, timeOfDay=None) -> bool:
+        """
+        Whether a request can be served from the catalog. Entries are built
+        for the whole day, so requests for only some parts of it are not.
+        """
+        return (
+            self.cache is not None
+            and normalize_text(city) in self.cities
+            and group in CATALOG_GROUPS
+            and uniqueness in UNIQUENESS_LEVELS
+            and (not timeOfDay or set(TIME_OF_DAY_WINDOWS) <= set(timeOfDay))
+        )
+
+    def entries(self):
+        """(city, group, uniqueness) of every activity entry in the catalog"""
+        for city in self.cities.values():
+            for group in CATALOG_GROUPS:
+                for uniqueness in UNIQUENESS_LEVELS:
+                    yield city, group, uniqueness
+
+    def is_stale(self, entry: dict) -> bool:
+        return time.time() - entry["generated_at"] > self.ttl
+
+    async def build_activities(self, generator, city: str, group: str, uniqueness: int) -> dict:
+        """Generate an entry's activities in rounds of titles then details, with images"""
+        activities = []
+        seen = set()
+        rounds = -(-self.activities_per_entry // ACTIVITIES_PER_REQUEST)
+        for _ in range(rounds):
+            titles = await generator.generate_activities(
+                city, titles_only=True, uniqueness=uniqueness, group=group, use_cache=False
+            )
+            new_titles = []
+            for title in titles:
+                if normalize_text(title["title"]) in seen:
+                    continue
+                seen.add(normalize_text(title["title"]))
+                # ids must stay unique across rounds
+                new_titles.append({"id": len(activities) + len(new_titles), "title": title["title"]})
+            if not new_titles:
+                continue
+            activities.extend(
+                await generator.generate_activities(
+                    city, titles=new_titles, uniqueness=uniqueness, group=group, use_cache=False
+                )
+            )
+
+        images = await get_n_random_places({item["id"]: item["title"] for item in activities})
+        for item in activities:
+            item["image_link"] = images.get(item["id"], [])
+        return {"generated_at": time.time(), "activities": activities}
+
+    async def build_facts(self, generator, city: str) -> dict:
+        facts = []
+        seen = set()
+        # generate_facts returns at most 5 facts per call
+        for _ in range(-(-self.facts_per_city // 5)):
+            for fact in await generator.generate_facts(city, 5, use_cache=False):
+                if normalize_text(fact) not in seen:
+                    seen.add(normalize_text(fact))
+                    facts.append(fact)
+        return {"generated_at": time.time(), "facts": facts}
+
+    async def refresh(self, generator, city: str, group=None, uniqueness=None):
+        """Rebuild one activity entry, or the city's facts when group is None"""
+        if group is None:
+            key, entry = self.facts_key(city), await self.build_facts(generator, city)
+        else:
+            key = self.key(city, group, uniqueness)
+            entry = await self.build_activities(generator, city, group, uniqueness)
+        await self.cache.set(key, entry, ttl=self.max_age)
+        CATALOG_EVENTS.inc(event="refreshed")
+
+    def revalidate(self, generator, city: str, group=None, uniqueness=None):
+        """
+        Refresh an entry in the background as a catalog job of the job queue,
+        which runs after interactive and prefetch jobs, once at a time and
+        within max_pending
+        """
+        key = (normalize_text(city), group, uniqueness)
+        if key in self.refreshing or len(self.tasks) >= self.max_pending:
+            return
+
+        async def run():
+            try:
+                job = await get_job_queue().submit(
+                    lambda job: self.refresh(generator, city, group, uniqueness),
+                    priority="catalog",
+                )
+                await job.wait()
+                if job.error is not None:
+                    raise RuntimeError(job.error["detail"])
+            except Exception as e:
+                CATALOG_EVENTS.inc(event="failed")
+                print(f"Error refreshing catalog entry {key}: {e}")
+            finally:
+                self.refreshing.discard(key)
+
+        self.refreshing.add(key)
+        task = asyncio.ensure_future(run())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _lookup(self, generator, key: str, city: str, group=None, uniqueness=None):
+        entry = await self.cache.get(key)
+        if entry is None:
+            CATALOG_EVENTS.inc(event="miss")
+            self.revalidate(generator, city, group, uniqueness)
+        elif self.is_stale(entry):
+            CATALOG_EVENTS.inc(event="stale")
+            self.revalidate(generator, city, group, uniqueness)
+        else:
+            CATALOG_EVENTS.inc(event="hit")
+        return entry
+
+    async def sample_activities(
+        self,
+        generator,
+        city: str,
+        group=None,
+        uniqueness=None,
+        num: int = ACTIVITIES_PER_REQUEST,
+        timeOfDay=None,
+    ) -> Optional[List[dict]]:
+        """Random activities from the catalog, or None when the request is not covered"""
+        if not self.covers(city, group, uniqueness, timeOfDay):
+            return None
+        entry = await self._lookup(generator, self.key(city, group, uniqueness), city, group, uniqueness)
+        if not entry or not entry["activities"]:
+            return None
+        activities = random.sample(entry["activities"], min(num, len(entry["activities"])))
+        # ids follow the order served, as for live generation
+        return [{**item, "id": i} for i, item in enumerate(activities)]
+
+    async def sample_facts(self, generator, city: str, num: int) -> Optional[List[str]]:
+        """Random facts for a catalog city, without repeats, or None"""
+        if self.cache is None or normalize_text(city) not in self.cities:
+            return None
+        entry = await self._lookup(generator, self.facts_key(city), city)
+        if not entry or not entry["facts"]:
+            return None
+        return random.sample(entry["facts"], min(num, len(entry["facts"])))
+
+    async def build(self, generator, cities: Iterable[str] = None, concurrency: int = 4, force=False):
+        """
+        Bulk job filling every entry of the given (default: configured) cities.
+
+        Entries that exist and are fresh are kept unless `force` is set.
+        Returns the number of entries built.
+        """
+        if cities is not None:
+            self.cities.update({normalize_text(city): city for city in cities})
+        semaphore = asyncio.Semaphore(concurrency)
+        built = 0
+
+        async def build_one(city, group=None, uniqueness=None):
+            nonlocal built
+            key = self.key(city, group, uniqueness) if group else self.facts_key(city)
+            entry = await self.cache.get(key)
+            if entry is not None and not self.is_stale(entry) and not force:
+                return
+            async with semaphore:
+                try:
+                    await self.refresh(generator, city, group, uniqueness)
+                    built += 1
+                except Exception as e:
+                    CATALOG_EVENTS.inc(event="failed")
+                    print(f"Error building catalog entry {city} {group} {uniqueness}: {e}")
+
+        jobs = [build_one(*entry) for entry in self.entries()]
+        jobs += [build_one(city) for city in self.cities.values()]
+        await asyncio.gather(*jobs)
+        return built
+
+    async def run_refresher(self, generator, interval: float):
+        """Periodically refresh stale or missing entries of the configured cities"""
+        while True:
+            await asyncio.sleep(interval)
+            for city, group, uniqueness in list(self.entries()):
+                entry = await self.cache.get(self.key(city, group, uniqueness))
+                if entry is None or self.is_stale(entry):
+                    self.revalidate(generator, city, group, uniqueness)
+
+    async def aclose(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+
+@lru_cache(maxsize=None)
+def get_catalog() -> CityCatalog:
+    """Process-wide city catalog configured by CATALOG_CITIES"""
+    return CityCatalog.from_env()
+
+
+async def main():
+    from dotenv import load_dotenv
+
+    from .clients import ClientRegistry
+    from .generation import Generator
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Build the city catalog")
+    parser.add_argument("--cities", help="comma separated, defaults to CATALOG_CITIES")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--force", action="store_true", help="rebuild fresh entries too")
+    args = parser.parse_args()
+
+    catalog = get_catalog()
+    clients = ClientRegistry()
+    try:
+        start = time.perf_counter()
+        built = await catalog.build(
+            Generator(clients),
+            cities=_split(args.cities) or None,
+            concurrency=args.concurrency,
+            force=args.force,
+        )
+        print(f"Built {built} catalog entries in {time.perf_counter() - start:.1f}s")
+    finally:
+        await clients.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
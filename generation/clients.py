@@ -0,0 +1,128 @@
+import importlib.util
+import os
+from typing import Optional
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from .activity_links import setup_perplexity_chain
+from .cassette import Cassette, get_cassette
+from .weather import WeatherService
+
+# HTTP/2 needs the optional h2 package
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def build_limits(max_connections: int, max_keepalive: int) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=float(os.getenv("OUTBOUND_KEEPALIVE_EXPIRY", 60)),
+    )
+
+
+def build_http_client(
+    max_connections: int,
+    max_keepalive: int,
+    timeout: float,
+    provider: Optional[str] = None,
+    cassette: Optional[Cassette] = None,
+) -> httpx.AsyncClient:
+    """
+    Build a pooled async HTTP client with keep-alive tuned for a single upstream.
+    With a cassette, exchanges with the provider are recorded or replayed.
+    """
+    transport = httpx.AsyncHTTPTransport(
+        http2=HTTP2_AVAILABLE, limits=build_limits(max_connections, max_keepalive)
+    )
+    if cassette is not None:
+        transport = cassette.async_transport(provider, transport)
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout, connect=5.0), transport=transport
+    )
+
+
+class ClientRegistry:
+    """
+    Owns every outbound client for the lifetime of the application, so routes
+    share connection pools instead of each building their own.
+
+    Args:
+        openai_http: HTTP client for OpenAI, defaults to a tuned pooled client
+        weather_http: HTTP client for WeatherAPI, defaults to a tuned pooled client
+        perplexity_http: Sync HTTP client for Perplexity, defaults to a tuned pooled client
+        cassette: Records or replays the default clients' exchanges, defaults
+            to the one configured by CASSETTE_MODE, see generation.cassette
+
+    The image searcher keeps one DDGS session per worker thread, see
+    generation.image_searcher.get_ddgs.
+    """
+
+    def __init__(
+        self,
+        openai_http: Optional[httpx.AsyncClient] = None,
+        weather_http: Optional[httpx.AsyncClient] = None,
+        perplexity_http: Optional[httpx.Client] = None,
+        cassette: Optional[Cassette] = None,
+    ):
+        cassette = cassette if cassette is not None else get_cassette()
+        self.openai_http = openai_http or build_http_client(
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", 100)),
+            max_keepalive=int(os.getenv("OPENAI_MAX_KEEPALIVE", 20)),
+            timeout=float(os.getenv("OPENAI_TIMEOUT", 60)),
+            provider="openai",
+            cassette=cassette,
+        )
+        self.weather_http = weather_http or build_http_client(
+            max_connections=int(os.getenv("WEATHER_MAX_CONNECTIONS", 20)),
+            max_keepalive=int(os.getenv("WEATHER_MAX_KEEPALIVE", 10)),
+            timeout=10.0,
+            provider="weatherapi",
+            cassette=cassette,
+        )
+
+        if perplexity_http is None:
+            transport = httpx.HTTPTransport(
+                http2=HTTP2_AVAILABLE,
+                limits=build_limits(
+                    int(os.getenv("PERPLEXITY_MAX_CONNECTIONS", 20)),
+                    int(os.getenv("PERPLEXITY_MAX_KEEPALIVE", 10)),
+                ),
+            )
+            if cassette is not None:
+                transport = cassette.sync_transport("perplexity", transport)
+            perplexity_http = httpx.Client(
+                timeout=httpx.Timeout(
+                    float(os.getenv("PERPLEXITY_TIMEOUT", 60)), connect=5.0
+                ),
+                transport=transport,
+            )
+        self.perplexity_http = perplexity_http
+
+        self.llm = ChatOpenAI(
+            model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+            http_async_client=self.openai_http,
+        )
+        # ChatPerplexity is sync only, langchain runs it in a thread for ainvoke
+        self.perplexity = setup_perplexity_chain(http_client=self.perplexity_http)
+        self.weather = WeatherService(
+            api_key=os.getenv("WEATHER_API_KEY", None), client=self.weather_http
+        )
+        self._structured = {}
+
+    def structured(self, schema):
+        """
+        Return the with_structured_output runnable for a schema, built once per
+        schema. It includes the raw message so token usage can be recorded, see
+        Generator.parse_structured.
+        """
+        runnable = self._structured.get(schema)
+        if runnable is None:
+            runnable = self.llm.with_structured_output(schema, include_raw=True)
+            self._structured[schema] = runnable
+        return runnable
+
+    async def aclose(self):
+        await self.openai_http.aclose()
+        await self.weather_http.aclose()
+        self.perplexity_http.close()
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# header carrying the client's time budget in seconds
+DEADLINE_HEADER = "X-Request-Deadline"
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a required stage cannot finish within the request deadline"""
+
+    def __init__(self, stage: Optional[str] = None):
+        super().__init__(f"deadline exceeded during {stage or 'request'}")
+        self.stage = stage
+
+
+class Deadline:
+    """
+    Time budget for one request.
+
+    Optional stages (weather, images, booking links) are cut off when the
+    budget runs out and return a default, and are recorded in `skipped`.
+    Required stages get whatever time is left and raise DeadlineExceeded
+    when it runs out.
+
+    Args:
+        seconds: Budget from now, None for no deadline
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        self.skipped = []
+
+    @classmethod
+    def from_header(cls, value: Optional[str] = None) -> "Deadline":
+        """Budget from the request header, else REQUEST_DEADLINE_SECONDS, else none"""
+        for seconds in (value, os.getenv("REQUEST_DEADLINE_SECONDS")):
+            try:
+                if seconds and float(seconds) > 0:
+                    return cls(float(seconds))
+            except ValueError:
+                continue
+        return cls()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None without a deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def skip(self, stage: str):
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+
+    async def optional(
+        self, stage: str, awaitable: Awaitable[T], default: T = None, share: float = 1.0
+    ) -> T:
+        """
+        Await an optional stage, returning `default` if it does not finish in time.
+
+        Args:
+            stage: Name reported in `skipped`
+            awaitable: The stage's work
+            default: Result used when the stage is cut off
+            share: Fraction of the remaining time the stage may use, for
+                optional stages that block required ones
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, remaining * share)
+        except asyncio.TimeoutError:
+            self.skip(stage)
+            return default
+
+    async def required(self, awaitable: Awaitable[T], stage: str = None) -> T:
+        """Await a required stage within the remaining time, else raise DeadlineExceeded"""
+        remaining = self.remaining()
+        if remaining is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, remaining)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(stage) from None
+
+    async def iterate(self, aiterable: AsyncIterator[T], stage: str = None):
+        """Re-yield an async iterable, raising DeadlineExceeded if the next item is late"""
+        iterator = aiterable.__aiter__()
+        while True:
+            try:
+                item = await self.required(iterator.__anext__(), stage)
+            except StopAsyncIteration:
+                return
+            yield item
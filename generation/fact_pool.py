@@ -0,0 +1,138 @@
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional
+
+from .metrics import FACT_POOL_EVENTS
+from .scheduler import get_scheduler
+from .utils import normalize_text
+
+# generate_facts returns at most 5 facts per call
+FACTS_PER_CALL = 5
+
+
+class FactPool:
+    """
+    Per-location pools of loading screen facts, refilled in the background.
+
+    `sample` answers from memory without any upstream call. A pool with
+    fewer than `refill_below` facts, or last refilled more than `ttl`
+    seconds ago, is topped up in the background while its facts are still
+    served; refills add up to `size` facts, dropping the oldest once full.
+    Refills only run while no interactive OpenAI call is queued, so they do
+    not compete with the itinerary call the facts are shown in front of.
+    Only a cold pool needs a live `generate_facts` call, whose facts seed it.
+
+    Args:
+        size: Facts kept per location
+        refill_below: Pool size under which a refill is started
+        ttl: Seconds after which a pool is refreshed
+        max_locations: Locations kept, least recently used are dropped
+        max_pending: Refills running at once, further ones are skipped
+    """
+
+    def __init__(
+        self,
+        size: int = 20,
+        refill_below: int = 10,
+        ttl: float = 24 * 3600,
+        max_locations: int = 1024,
+        max_pending: int = 2,
+    ):
+        self.size = size
+        self.refill_below = refill_below
+        self.ttl = ttl
+        self.max_locations = max_locations
+        self.max_pending = max_pending
+        self.pools = OrderedDict()
+        self.refilling = set()
+        self.tasks = set()
+
+    @classmethod
+    def from_env(cls) -> "FactPool":
+        """Read FACT_POOL_SIZE, FACT_POOL_REFILL_BELOW, FACT_POOL_TTL, FACT_POOL_MAX_LOCATIONS and FACT_POOL_MAX_PENDING"""
+        return cls(
+            size=int(os.getenv("FACT_POOL_SIZE", 20)),
+            refill_below=int(os.getenv("FACT_POOL_REFILL_BELOW", 10)),
+            ttl=float(os.getenv("FACT_POOL_TTL", 24 * 3600)),
+            max_locations=int(os.getenv("FACT_POOL_MAX_LOCATIONS", 1024)),
+            max_pending=int(os.getenv("FACT_POOL_MAX_PENDING", 2)),
+        )
+
+    def sample(self, generator, location: str, num: int) -> Optional[List[str]]:
+        """
+        Up to `num` distinct facts from the location's pool, or None if it is cold.
+
+        Starts a background refill when the pool is small or stale.
+        """
+        key = normalize_text(location)
+        pool = self.pools.get(key)
+        if not pool or not pool["facts"]:
+            FACT_POOL_EVENTS.inc(event="cold")
+            return None
+
+        self.pools.move_to_end(key)
+        if len(pool["facts"]) < self.refill_below or time.time() - pool["refilled_at"] > self.ttl:
+            self.refill(generator, location)
+        FACT_POOL_EVENTS.inc(event="hit")
+        # bounded like generate_facts, which the pool stands in for
+        num = max(1, min(num, FACTS_PER_CALL))
+        return random.sample(pool["facts"], min(num, len(pool["facts"])))
+
+    def add(self, location: str, facts: List[str], replace: bool = False):
+        """Add new facts to the location's pool, keeping the newest `size`"""
+        key = normalize_text(location)
+        pool = self.pools.get(key)
+        current = [] if pool is None or replace else pool["facts"]
+        seen = {normalize_text(fact) for fact in current}
+        merged = list(current)
+        for fact in facts:
+            if normalize_text(fact) not in seen:
+                seen.add(normalize_text(fact))
+                merged.append(fact)
+
+        self.pools[key] = {"facts": merged[-self.size:], "refilled_at": time.time()}
+        self.pools.move_to_end(key)
+        while len(self.pools) > self.max_locations:
+            self.pools.popitem(last=False)
+
+    def refill(self, generator, location: str):
+        """Top up a location's pool in the background, once at a time and within max_pending"""
+        key = normalize_text(location)
+        if key in self.refilling or len(self.tasks) >= self.max_pending:
+            return
+        if get_scheduler().provider("openai").queued > 0:
+            # interactive calls are waiting, try again on a later request
+            FACT_POOL_EVENTS.inc(event="skipped")
+            return
+
+        async def run():
+            try:
+                pool = self.pools.get(key)
+                stale = pool is not None and time.time() - pool["refilled_at"] > self.ttl
+                facts = await generator.generate_facts(location, FACTS_PER_CALL, use_cache=False)
+                self.add(location, facts, replace=stale)
+                FACT_POOL_EVENTS.inc(event="refilled")
+            except Exception as e:
+                FACT_POOL_EVENTS.inc(event="failed")
+                print(f"Error refilling facts for {location}: {e}")
+            finally:
+                self.refilling.discard(key)
+
+        self.refilling.add(key)
+        task = asyncio.ensure_future(run())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def aclose(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+
+@lru_cache(maxsize=None)
+def get_fact_pool() -> FactPool:
+    """Process-wide fact pool configured by FACT_POOL_*"""
+    return FactPool.from_env()
@@ -1,139 +1,258 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from dotenv import load_dotenv
 from .generation_models import (
     ActivityList,
     ActivityTitles,
     ItineraryItem,
+    ItineraryItemBatch,
     SimpleItineraryItem,
     ItinerarySummary,
     Facts,
     FullItinerary,
 )
 import asyncio
+from typing import List, get_args
+from pydantic import BaseModel
 from .prompts import Prompts
+from .prompt_encoder import SWAP_CONTEXT_TIERS
+from .streaming import IncrementalListParser
+from .transport import build_transport_item
+from .clients import ClientRegistry
+from .deadline import Deadline, DeadlineExceeded
+from .metrics import LLM_TOKENS, STAGE_LATENCY
+from .cache import build_cache, cache_key
+from .retry import RetryPolicy, call_with_retries
+from .scheduler import SchedulerBusy, get_scheduler
+from .singleflight import SingleFlight
+from .tokens import count_message_tokens, count_tokens
+from .utils import drop_repeated_venues, repeated_days
+from langchain_core.exceptions import OutputParserException
 import os
-import requests
-from datetime import datetime
 
 load_dotenv()
 
 
 class Generator:
-    def __init__(self):
-        self.llm = ChatOpenAI(model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
-        self.weather_api_key = os.getenv("WEATHER_API_KEY", None)
-        self.weather_url = "http://api.weatherapi.com/v1/forecast.json"
+    def __init__(self, clients: ClientRegistry = None):
+        # share the application's clients, or own a set when used standalone
+        self.clients = clients if clients is not None else ClientRegistry()
+        self.llm = self.clients.llm
+        self.weather = self.clients.weather
         self.num_retries = 3
+        self.retry_policy = RetryPolicy.from_env("LLM")
+        # call latencies per output schema, used to decide when to hedge
+        self.latencies = {}
+        self.cache = build_cache("LLM", ttl=24 * 3600)
+        self.flights = SingleFlight()
+        # stream structured output so routes can pipeline work behind token generation
+        self.streaming = os.getenv("LLM_STREAMING", "false").lower() == "true"
+        # number of itinerary items detailed per LLM call, 1 means one call per item
+        self.detail_batch_size = max(1, int(os.getenv("ITEM_DETAIL_BATCH_SIZE", 1)))
+        # share of a request's remaining time the weather lookup may use, as
+        # the itinerary summary waits for it
+        self.weather_deadline_share = float(os.getenv("WEATHER_DEADLINE_SHARE", 0.2))
+        # order venues and build travel legs locally with route_planner, so the
+        # itinerary prompt only selects venues
+        self.plan_routes = os.getenv("ROUTE_PLANNER", "false").lower() == "true"
+        # fix overlapping and out of order times locally with schedule.solve_schedule
+        # instead of regenerating the itinerary with feedback
+        self.solve_schedules = os.getenv("SCHEDULE_SOLVER", "false").lower() == "true"
 
     # Fetch Live weather data
-    def get_weather(self, location, date=None):
+    async def get_weather(self, location, date=None, deadline: Deadline = None):
         """
         Fetches hourly weather forecast for a given location and date using WeatherAPI.
 
         Args:
             location (str): The location to get weather for
             date (str, optional): The date in YYYY-MM-DD format. Defaults to None (current day).
+            deadline (Deadline, optional): Request deadline, weather is skipped if it runs out
 
         Returns:
             list: List of dictionaries containing hourly weather data from 7am to midnight
                   Each dict has keys: time (str), weather (str), temperature (int)
         """
-        if date is None:
-            return None
+        with STAGE_LATENCY.time(stage="weather"):
+            if deadline is None:
+                return await self.weather.get_weather(location, date)
+            return await deadline.optional(
+                "weather",
+                self.weather.get_weather(location, date),
+                share=self.weather_deadline_share,
+            )
+
+    async def get_weather_days(self, location, dates, deadline: Deadline = None):
+        """
+        Fetches hourly weather for every date of a trip with a single forecast lookup.
 
-        if self.weather_api_key is None:
-            print(
-                "Weather API key not found. Please set the WEATHER_API_KEY environment variable."
+        Returns:
+            dict: Mapping of each date to its hourly weather as in get_weather, or
+                  to None when there is no forecast or the deadline cut it off
+        """
+        with STAGE_LATENCY.time(stage="weather"):
+            lookup = self.weather.get_weather_days(location, dates)
+            if deadline is None:
+                return await lookup
+            weather = await deadline.optional(
+                "weather", lookup, share=self.weather_deadline_share
             )
-            return None
-
-        # Calculate days difference between today and requested date
-        today = datetime.now().date()
-        requested_date = datetime.strptime(date, "%Y-%m-%d").date()
-        days_diff = (requested_date - today).days
-
-        # Ensure the requested date is within API limits (0-14 days)
-        if days_diff < 0:
-            print("Cannot retrieve weather for past dates")
-            return None
-        elif days_diff > 14:
-            return None
-
-        # WeatherAPI allows forecast up to 14 days
-        days_param = days_diff + 1
-
-        params = {
-            "key": self.weather_api_key,
-            "q": location,
-            "aqi": "no",
-            "days": days_param,
-            "hour": "0-23",  # Get all hours
-        }
+            return weather or {date: None for date in dates}
+
+    def llm_cache_key(self, schema, messages) -> str:
+        """Key a structured LLM call on model name, output schema and messages"""
+        return cache_key(
+            self.llm.model_name,
+            schema.model_json_schema(),
+            [(message.type, message.content) for message in messages],
+        )
 
-        response = requests.get(self.weather_url, params=params)
-        data = response.json()
+    async def invoke_with_retries(
+        self,
+        mdl,
+        messages,
+        retries,
+        schema=None,
+        use_cache=True,
+        deadline=None,
+        stage=None,
+    ):
+        """
+        Invoke a structured model, serving repeated requests from the LLM cache
+        and coalescing identical in-flight requests into one upstream call.
 
-        if response.status_code != 200 or "forecast" not in data:
-            print("Error fetching weather information")
-            return None
+        Args:
+            mdl: Runnable returned by with_structured_output
+            messages: Prompt messages
+            retries: Maximum number of attempts for retryable errors
+            schema: Pydantic output schema, required for caching and coalescing
+            use_cache: Set False to always call the model, e.g. when the user sent feedback
+            deadline: Request deadline, DeadlineExceeded is raised if it runs out
+            stage: Label for the stage latency and token metrics, defaults to the schema name
 
-        # Find the forecast for the target date
-        forecast_day = None
-        for day in data["forecast"]["forecastday"]:
-            if day["date"] == date:
-                forecast_day = day
-                break
+        Returns:
+            The parsed schema instance
+        """
+        if deadline is None:
+            deadline = Deadline()
+        if stage is None:
+            stage = schema.__name__ if schema is not None else "llm"
+
+        with STAGE_LATENCY.time(stage=stage):
+            return await self._invoke_cached(
+                mdl, messages, retries, schema, use_cache, deadline, stage
+            )
 
-        if not forecast_day:
-            return None
+    async def _invoke_cached(
+        self, mdl, messages, retries, schema, use_cache, deadline, stage
+    ):
+        if schema is None:
+            return await deadline.required(
+                self._invoke_with_retries(mdl, messages, retries, stage=stage)
+            )
 
-        hourly_data = forecast_day["hour"]
+        key = self.llm_cache_key(schema, messages)
+        if use_cache and self.cache is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return schema.model_validate(cached)
+
+        # identical concurrent requests share a single upstream call, which
+        # keeps running until the last waiter's deadline gives up on it
+        response = await deadline.required(
+            self.flights.do(
+                key,
+                self._invoke_and_store,
+                mdl,
+                messages,
+                retries,
+                key,
+                use_cache,
+                schema,
+                stage,
+            ),
+            schema.__name__,
+        )
 
-        # Filter hours between 7am and midnight
-        filtered_hours = []
-        for hour_entry in hourly_data:
-            hour_time_obj = datetime.strptime(hour_entry["time"], "%Y-%m-%d %H:%M")
-            hour = hour_time_obj.hour
+        return response.model_copy(deep=True)
 
-            if 7 <= hour <= 23:  # From 7am to midnight (23:00)
-                filtered_hours.append(
-                    {
-                        "time": hour_time_obj.strftime("%H:%M"),  # Format as HH:MM
-                        "weather": hour_entry["condition"]["text"],
-                        "temperature": int(
-                            round(hour_entry["temp_c"])
-                        ),  # Round to nearest integer
-                    }
-                )
+    async def _invoke_and_store(
+        self, mdl, messages, retries, key, use_cache, schema, stage
+    ):
+        response = await self._invoke_with_retries(
+            mdl, messages, retries, schema, stage
+        )
 
-        return filtered_hours
+        if use_cache and self.cache is not None:
+            await self.cache.set(key, response.model_dump(mode="json"))
 
-    async def invoke_with_retries(self, mdl, messages, retries):
-        try:
-            return await mdl.ainvoke(messages)
-        except Exception as e:
-            if retries > 1:
-                print(f"Error invoking model: {e}. Retries left: {retries - 1}")
-                return await self.invoke_with_retries(messages, retries - 1)
-            raise  # Let the last failure propagate
+        return response
 
-    # Generate activities
-    async def generate_activities(
-        self,
-        location,
-        titles_only=False,
-        uniqueness=None,
-        titles=None,
-        timeOfDay=None,
-        group=None,
+    async def _invoke_with_retries(
+        self, mdl, messages, retries, schema=None, stage="llm"
     ):
-        num_activities = 6
+        """
+        Invoke a model with backoff between retryable failures, hedging slow
+        calls when LLM_HEDGE_PERCENTILE is set, see generation.retry.
+        """
+        tokens = count_message_tokens(messages)
+
+        async def attempt():
+            # every attempt, and every hedge, is admitted separately
+            async with get_scheduler().slot("openai", tokens=tokens):
+                result = await mdl.ainvoke(messages)
+            return self.parse_structured(result, tokens, stage)
+
+        name = schema.__name__ if schema is not None else None
+        latencies = self.latencies.get(name)
+        if latencies is None:
+            latencies = self.latencies[name] = self.retry_policy.tracker()
 
-        if titles_only:
-            structured_model = self.llm.with_structured_output(ActivityTitles)
+        return await call_with_retries(
+            attempt, retries, self.retry_policy, latencies, name=stage
+        )
+
+    def parse_structured(self, result, prompt_tokens: int, stage: str):
+        """
+        Unwrap the output of a structured runnable and count its tokens.
+
+        Runnables from ClientRegistry.structured return the raw message with
+        the parsed output, whose usage metadata gives exact token counts. Other
+        runnables return the parsed output directly and tokens are estimated.
+        """
+        usage = {}
+        if isinstance(result, dict) and "parsed" in result:
+            usage = getattr(result.get("raw"), "usage_metadata", None) or {}
+            error, result = result.get("parsing_error"), result["parsed"]
         else:
-            structured_model = self.llm.with_structured_output(ActivityList)
+            error = None
+        if error is None and result is None:
+            error = OutputParserException("Model returned no structured output")
+
+        completion_tokens = usage.get("output_tokens")
+        if completion_tokens is None:
+            completion_tokens = (
+                count_tokens(result.model_dump_json())
+                if isinstance(result, BaseModel)
+                else 0
+            )
+        self.record_tokens(
+            stage, usage.get("input_tokens", prompt_tokens), completion_tokens
+        )
+
+        if error is not None:
+            raise error
+        return result
+
+    def record_tokens(self, stage: str, prompt_tokens: int, completion_tokens: int):
+        model = self.llm.model_name
+        LLM_TOKENS.inc(prompt_tokens, model=model, method=stage, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, model=model, method=stage, kind="completion")
+
+    def activity_messages(
+        self, location, uniqueness=None, titles=None, timeOfDay=None, group=None
+    ):
+        """Build the prompt messages for activity titles or activity details"""
+        num_activities = 6
 
         if titles is not None:
             activity_str = "\n".join(
@@ -165,14 +284,40 @@ class Generator:
             HumanMessage(human_prompt),
         ]
 
+        return messages
+
+    # Generate activities
+    async def generate_activities(
+        self,
+        location,
+        titles_only=False,
+        uniqueness=None,
+        titles=None,
+        timeOfDay=None,
+        group=None,
+        use_cache=True,
+        deadline=None,
+    ):
+        schema = ActivityTitles if titles_only else ActivityList
+        structured_model = self.clients.structured(schema)
+
+        messages = self.activity_messages(
+            location, uniqueness, titles, timeOfDay, group
+        )
+
         response = await self.invoke_with_retries(
-            structured_model, messages, self.num_retries
+            structured_model,
+            messages,
+            self.num_retries,
+            schema=schema,
+            use_cache=use_cache,
+            deadline=deadline,
+            stage="activity_titles" if titles_only else "activity_details",
         )
 
         return response.model_dump()["activities"]
 
-    # Generate itinerary item details
-    async def generate_itinerary(
+    def itinerary_messages(
         self,
         location,
         timeOfDay=None,
@@ -182,9 +327,16 @@ class Generator:
         prior_itinerary=None,
         feedback=None,
         weather=None,
+        day=None,
+        days=None,
+        exclude=None,
     ):
-        structured_model = self.llm.with_structured_output(ItinerarySummary)
+        """
+        Build the prompt messages for a day itinerary summary.
 
+        For a day of a longer trip, `day` and `days` give its position and
+        `exclude` lists venues the user visits on the other days.
+        """
         if weather is not None:
             # Fetch hourly weather data
             weather_string = f"Consider the following weather information available for the day in formulating the itinerary: ${weather}"
@@ -202,7 +354,7 @@ class Generator:
             preference_string = ""
 
         if prior_itinerary is not None:
-            prior_itinerary_str = f"The user has already been shown the following itinerary:\n{Prompts.itinerary_to_string(prior_itinerary)}"
+            prior_itinerary_str = f"The user has already been shown the following itinerary:\n{Prompts.itinerary_to_string(prior_itinerary, endpoint='itinerary', model=self.llm.model_name)}"
             if feedback is not None:
                 prior_itinerary_str += f"The user provided feedback on the itinerary: {feedback}. Update the itinerary based on the user's feedback. Keep as close as possible to the original itinerary as you can while addressing the user's feedback."
                 prior_itinerary_str += "Above all, you must make sure your response addresses the user's feedback - remove and change items as needed to achieve this."
@@ -213,6 +365,35 @@ class Generator:
         if timeOfDay is None:
             timeOfDay = ["morning", "afternoon", "evening"]
 
+        trip_strings = []
+        if days is not None and days > 1:
+            trip_strings.append(
+                f"This is day {day} of a {days} day trip. The other days are planned separately, "
+                "so give this day its own area or theme of the city."
+            )
+        if exclude:
+            trip_strings.append(
+                f"Do not include any of the following places, the user visits them on other days: {', '.join(exclude)}."
+            )
+        trip_string = " ".join(trip_strings)
+
+        if self.plan_routes:
+            # order and travel legs are planned locally, the LLM only picks venues
+            travel_rule = (
+                "Only list the venues to visit with their start and end times, do NOT include travel steps."
+            )
+            travel_steps = ""
+            travel_request = "List the venues only, travel between them is planned separately."
+        else:
+            travel_rule = "You MUST include steps in the itinerary for travel between locations."
+            travel_steps = (
+                "You must generate these travel steps as items in the itinerary so the user knows how to get between different events, and include start and end times for travel."
+            )
+            travel_request = (
+                "Explicitly include travel steps in the itinerary. For example, the title of an activity step could be 'Take the tube from Waterloo to Oxford Circus'"
+                "Mark travel steps as transport and give their mode of transport."
+            )
+
         # set prompting messages
         messages = [
             SystemMessage(
@@ -221,26 +402,252 @@ class Generator:
                 f"The user is travelling {Prompts.get_group_prompt(group)}."
                 f"The user wants an itinerary for these parts of the day: {', '.join(timeOfDay)}"
                 f"{Prompts.get_uniqueness_prompt(uniqueness)}"
-                "You MUST include steps in the itinerary for travel between locations."
+                f"{travel_rule}"
                 "When suggesting restaurants, you MUST provide specific restaurant names, cuisine type, and a brief description."
                 "Example: Instead of 'Have a rooftop dinner,' say 'Enjoy an Italian fine dining experience at Aqua Shard, a rooftop restaurant with panoramic views of London.'"
-                "You must generate these travel steps as items in the itinerary so the user knows how to get between different events, and include start and end times for travel."
+                f"{travel_steps}"
                 f"\n\n{weather_string}"
             ),
             SystemMessage(preference_string),
             SystemMessage(prior_itinerary_str),
             HumanMessage(
                 f"Generate a full day itinerary for the user in the following location: {location}."
-                "Explicitly include travel steps in the itinerary. For example, the title of an activity step could be 'Take the tube from Waterloo to Oxford Circus'"
+                f"{travel_request}"
             ),
         ]
+        # single day prompts, and their cache keys, stay as they were
+        if trip_string:
+            messages.insert(-1, SystemMessage(trip_string))
+
+        return messages
+
+    # Generate itinerary item details
+    async def generate_itinerary(
+        self,
+        location,
+        timeOfDay=None,
+        group=None,
+        uniqueness=None,
+        preferences=None,
+        prior_itinerary=None,
+        feedback=None,
+        weather=None,
+        use_cache=True,
+        deadline=None,
+        day=None,
+        days=None,
+        exclude=None,
+    ):
+        structured_model = self.clients.structured(ItinerarySummary)
+
+        messages = self.itinerary_messages(
+            location,
+            timeOfDay,
+            group,
+            uniqueness,
+            preferences,
+            prior_itinerary,
+            feedback,
+            weather,
+            day,
+            days,
+            exclude,
+        )
 
+        # a feedback round must not be answered with the itinerary the user rejected
         response = await self.invoke_with_retries(
-            structured_model, messages, self.num_retries
+            structured_model,
+            messages,
+            self.num_retries,
+            schema=ItinerarySummary,
+            use_cache=use_cache and feedback is None,
+            deadline=deadline,
+            stage="itinerary",
         )
 
         return response
 
+    async def generate_trip(
+        self,
+        location,
+        days: int,
+        weather: List[str] = None,
+        deadline: Deadline = None,
+        **kwargs,
+    ) -> List[ItinerarySummary]:
+        """
+        Generate the day summaries of a multi-day trip concurrently.
+
+        Each day is told its place in the trip. Days that repeat a venue of an
+        earlier day are generated again, once and concurrently, with the venues
+        of every other day excluded; venues still repeated after that are dropped.
+
+        Args:
+            days: Number of days
+            weather: Weather string of each day
+            kwargs: Passed on to generate_itinerary for every day
+        """
+        weather = weather or [None] * days
+
+        def generate(day, exclude=None):
+            return self.generate_itinerary(
+                location,
+                weather=weather[day],
+                deadline=deadline,
+                day=day + 1,
+                days=days,
+                exclude=exclude,
+                **kwargs,
+            )
+
+        summaries = list(await asyncio.gather(*(generate(day) for day in range(days))))
+
+        repeated = repeated_days(summaries)
+        if repeated:
+            def other_venues(day):
+                return sorted(
+                    {
+                        item.imageTag or item.title
+                        for other, summary in enumerate(summaries)
+                        if other != day
+                        for item in summary.itinerary
+                        if not item.transport
+                    }
+                )
+
+            retries = await asyncio.gather(
+                *(generate(day, exclude=other_venues(day)) for day in repeated)
+            )
+            for day, summary in zip(repeated, retries):
+                summaries[day] = summary
+
+        return drop_repeated_venues(summaries)
+
+    async def stream_structured_list(
+        self, schema, list_key, messages, use_cache=True, deadline=None, stage=None
+    ):
+        """
+        Stream a structured LLM response and yield the elements of one of its
+        list fields as soon as each element has been generated, so downstream
+        work can start before the final token.
+
+        A complete response is stored in (and served from) the LLM cache like
+        invoke_with_retries. Streams are not retried, as elements may already
+        have been consumed when an error occurs.
+
+        Args:
+            schema: Pydantic output schema
+            list_key: Name of the list field of the schema to stream
+            messages: Prompt messages
+            use_cache: Set False to always call the model
+            deadline: Request deadline, DeadlineExceeded is raised if it runs out
+            stage: Label for the stage latency and token metrics, defaults to the schema name
+
+        Yields:
+            The validated list elements, in generation order
+        """
+        stage = stage or schema.__name__
+        with STAGE_LATENCY.time(stage=stage):
+            async for element in self._stream_structured_list(
+                schema, list_key, messages, use_cache, deadline, stage
+            ):
+                yield element
+
+    async def _stream_structured_list(
+        self, schema, list_key, messages, use_cache, deadline, stage
+    ):
+        item_type = get_args(schema.model_fields[list_key].annotation)[0]
+
+        key = self.llm_cache_key(schema, messages)
+        if use_cache and self.cache is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                for element in getattr(schema.model_validate(cached), list_key):
+                    yield element
+                return
+
+        model = self.llm.bind_tools(
+            [schema], tool_choice=schema.__name__, parallel_tool_calls=False
+        )
+        parser = IncrementalListParser(list_key)
+        elements = []
+        arguments = []
+        prompt_tokens = count_message_tokens(messages)
+        async with get_scheduler().slot("openai", tokens=prompt_tokens):
+            chunks = model.astream(messages)
+            if deadline is not None:
+                chunks = deadline.iterate(chunks, schema.__name__)
+            async for chunk in chunks:
+                for tool_call_chunk in chunk.tool_call_chunks:
+                    arguments.append(tool_call_chunk.get("args") or "")
+                    for element in parser.feed(arguments[-1]):
+                        if issubclass(item_type, BaseModel):
+                            element = item_type.model_validate(element)
+                        elements.append(element)
+                        yield element
+
+        # streamed chunks carry no usage, so completion tokens are counted locally
+        self.record_tokens(stage, prompt_tokens, count_tokens("".join(arguments)))
+
+        if use_cache and self.cache is not None:
+            response = schema.model_validate({list_key: elements})
+            await self.cache.set(key, response.model_dump(mode="json"))
+
+    def stream_activity_titles(
+        self,
+        location,
+        uniqueness=None,
+        timeOfDay=None,
+        group=None,
+        use_cache=True,
+        deadline=None,
+    ):
+        """Streaming version of generate_activities(titles_only=True), yields ActivityTitleStruct"""
+        messages = self.activity_messages(
+            location, uniqueness, timeOfDay=timeOfDay, group=group
+        )
+        return self.stream_structured_list(
+            ActivityTitles,
+            "activities",
+            messages,
+            use_cache=use_cache,
+            deadline=deadline,
+            stage="activity_titles",
+        )
+
+    def stream_itinerary(
+        self,
+        location,
+        timeOfDay=None,
+        group=None,
+        uniqueness=None,
+        preferences=None,
+        prior_itinerary=None,
+        feedback=None,
+        weather=None,
+        use_cache=True,
+        deadline=None,
+    ):
+        """Streaming version of generate_itinerary, yields SimpleItineraryItem"""
+        messages = self.itinerary_messages(
+            location,
+            timeOfDay,
+            group,
+            uniqueness,
+            preferences,
+            prior_itinerary,
+            feedback,
+            weather,
+        )
+        return self.stream_structured_list(
+            ItinerarySummary,
+            "itinerary",
+            messages,
+            use_cache=use_cache and feedback is None,
+            deadline=deadline,
+            stage="itinerary",
+        )
+
     # Generate details for all items asynchronously
     async def generate_item_details(
         self,
@@ -248,9 +655,11 @@ class Generator:
         location: str,
         group: str,
         weather: str = None,
+        use_cache: bool = True,
+        deadline: Deadline = None,
     ) -> ItineraryItem:
         # set model
-        structured_model = self.llm.with_structured_output(ItineraryItem)
+        structured_model = self.clients.structured(ItineraryItem)
 
         if weather is not None:
             # Fetch hourly weather data
@@ -275,22 +684,223 @@ class Generator:
         ]
 
         response = await self.invoke_with_retries(
-            structured_model, messages, self.num_retries
+            structured_model,
+            messages,
+            self.num_retries,
+            schema=ItineraryItem,
+            use_cache=use_cache,
+            deadline=deadline,
+            stage="item_details",
         )
 
         return response.model_dump()
 
+    async def generate_batch_details(
+        self,
+        items: List[SimpleItineraryItem],
+        location: str,
+        group: str,
+        weather: str = None,
+        use_cache: bool = True,
+        deadline: Deadline = None,
+    ) -> List[dict]:
+        """
+        Generate details for several itinerary items in a single LLM call, so the
+        system prompt and weather are sent once per batch instead of once per item.
+
+        Items missing from the response, or every item if the batch call fails,
+        fall back to one generate_item_details call each. Transport steps are
+        built locally by build_transport_item without any LLM call.
+
+        Returns:
+            list: Item details in the order of the given items
+        """
+        # transport steps are built locally, only venues need the LLM
+        details = {
+            item.id: build_transport_item(item, location)
+            for item in items
+            if item.transport
+        }
+        items_to_generate = [item for item in items if not item.transport]
+
+        if len(items_to_generate) <= 1:
+            for item in items_to_generate:
+                details[item.id] = await self.generate_item_details(
+                    item,
+                    location,
+                    group,
+                    weather,
+                    use_cache=use_cache,
+                    deadline=deadline,
+                )
+            return [details[item.id] for item in items]
+
+        structured_model = self.clients.structured(ItineraryItemBatch)
+
+        if weather is not None:
+            weather_string = f"Consider the following weather information available for the day in formulating the itinerary: ${weather}"
+        else:
+            weather_string = ""
+
+        items_str = "\n".join(
+            f"id: {item.id}, title: {item.title}, start: {item.start}, end: {item.end}"
+            for item in items_to_generate
+        )
+
+        # set prompting messages
+        messages = [
+            SystemMessage(
+                f"You are an AI travel agent preparing an itinerary for a user travelling to {location}."
+                "Your writing style should match a travel blogger, it should be casual."
+                "You must provide full details in the schema requested for each of the given activities."
+                f"Bear in mind the user is travelling {Prompts.get_group_prompt(group)}"
+                f"\n\n{weather_string}"
+            ),
+            HumanMessage(
+                "Generate full details for each of the following activities, returning exactly one item per activity."
+                "Each activity will start and finish at the given times, and you must keep the given id for each item.\n"
+                f"{items_str}"
+            ),
+        ]
+
+        try:
+            response = await self.invoke_with_retries(
+                structured_model,
+                messages,
+                self.num_retries,
+                schema=ItineraryItemBatch,
+                use_cache=use_cache,
+                deadline=deadline,
+                stage="batch_details",
+            )
+            requested = {item.id for item in items_to_generate}
+            for detail in response.items:
+                if detail.id in requested:
+                    details[detail.id] = detail.model_dump()
+        except (DeadlineExceeded, SchedulerBusy):
+            # no time left for the per-item fallback either, and a shed call
+            # must not come back as one call per item to the saturated provider
+            raise
+        except Exception as e:
+            print(f"Error generating batch details: {e}. Falling back to single items")
+
+        missing = [item for item in items_to_generate if item.id not in details]
+        fallbacks = await asyncio.gather(
+            *(
+                self.generate_item_details(
+                    item,
+                    location,
+                    group,
+                    weather,
+                    use_cache=use_cache,
+                    deadline=deadline,
+                )
+                for item in missing
+            )
+        )
+        for item, detail in zip(missing, fallbacks):
+            details[item.id] = detail
+
+        return [details[item.id] for item in items]
+
     async def generate_itinerary_details(
-        self, itinerary: ItinerarySummary, location: str, group: str, weather: str
+        self,
+        itinerary: ItinerarySummary,
+        location: str,
+        group: str,
+        weather: str,
+        batch_size: int = None,
+        deadline: Deadline = None,
     ):
-        # create tasks for each item
+        # create tasks for each batch of items
+        batch_size = batch_size or self.detail_batch_size
         itinerary_items = itinerary.itinerary
-        tasks = [
-            self.generate_item_details(item, location, group, weather)
-            for item in itinerary_items
+
+        # transport steps are built locally, so keep them out of the LLM batches
+        positions = list(range(len(itinerary_items)))
+        venues = [i for i in positions if not itinerary_items[i].transport]
+        batches = [[i] for i in positions if itinerary_items[i].transport] + [
+            venues[i : i + batch_size] for i in range(0, len(venues), batch_size)
         ]
-        responses = await asyncio.gather(*tasks)
-        return responses
+        responses = await asyncio.gather(
+            *(
+                self.generate_batch_details(
+                    [itinerary_items[i] for i in batch],
+                    location,
+                    group,
+                    weather,
+                    deadline=deadline,
+                )
+                for batch in batches
+            )
+        )
+
+        # put the details back in itinerary order
+        details = [None] * len(itinerary_items)
+        for batch, response in zip(batches, responses):
+            for i, detail in zip(batch, response):
+                details[i] = detail
+        return details
+
+    async def iter_itinerary_details(
+        self,
+        itinerary,
+        location: str,
+        group: str,
+        weather: str,
+        batch_size: int = None,
+        deadline: Deadline = None,
+    ):
+        """
+        Yield detailed items in completion order rather than itinerary order.
+
+        Args:
+            itinerary: An ItinerarySummary, or an async iterable of SimpleItineraryItem
+                such as stream_itinerary, in which case each batch's detail call
+                starts as soon as its items have been streamed
+            batch_size: Items per detail call, defaults to detail_batch_size
+            deadline: Request deadline, DeadlineExceeded is raised if it runs out
+        """
+        batch_size = batch_size or self.detail_batch_size
+        done = asyncio.Queue()
+        tasks = []
+        pending = []
+
+        def start(batch):
+            task = asyncio.ensure_future(
+                self.generate_batch_details(
+                    batch, location, group, weather, deadline=deadline
+                )
+            )
+            task.add_done_callback(done.put_nowait)
+            tasks.append(task)
+
+        def add(item):
+            if item.transport:
+                start([item])
+                return
+            pending.append(item)
+            if len(pending) >= batch_size:
+                start(pending[:])
+                pending.clear()
+
+        try:
+            if isinstance(itinerary, ItinerarySummary):
+                for item in itinerary.itinerary:
+                    add(item)
+            else:
+                async for item in itinerary:
+                    add(item)
+            if pending:
+                start(pending[:])
+
+            for _ in range(len(tasks)):
+                for detail in (await done.get()).result():
+                    yield detail
+        finally:
+            # the consumer stopped early, e.g. the client disconnected
+            for task in tasks:
+                task.cancel()
 
     async def swap_activity(
         self,
@@ -301,9 +911,18 @@ class Generator:
         itinerary: FullItinerary,
         feedback: str,
         weather: str = None,
+        use_cache: bool = True,
+        deadline: Deadline = None,
+        exclude: List[str] = None,
     ) -> ItineraryItem:
+        """
+        Generate a replacement for one activity of an itinerary.
+
+        `exclude` lists titles that must not be suggested, e.g. alternatives
+        already generated for the same activity.
+        """
         # set model
-        structured_model = self.llm.with_structured_output(ItineraryItem)
+        structured_model = self.clients.structured(ItineraryItem)
 
         if weather is not None:
             # Fetch hourly weather data
@@ -312,10 +931,12 @@ class Generator:
             weather_string = ""
 
         prior_itinerary_str = (
-            f"The user is planning has been shown the following itinerary:\n{Prompts.itinerary_to_string(itinerary)}"
+            f"The user is planning has been shown the following itinerary:\n{Prompts.itinerary_to_string(itinerary, SWAP_CONTEXT_TIERS, endpoint='swap', model=self.llm.model_name)}"
             "The user now wants to swap out a single activity on the itinerary for something else."
             f"You will be told what activity to swap, and you should swap it considering the following feedback: {feedback}"
         )
+        if exclude:
+            prior_itinerary_str += f"Do not suggest any of the following activities: {', '.join(exclude)}."
 
         # set prompting messages
         messages = [
@@ -332,19 +953,31 @@ class Generator:
             ),
             SystemMessage(prior_itinerary_str),
             HumanMessage(
-                f"Generate a new activity to replace the following activity: {Prompts.activity_to_string(activity)}."
+                f"Generate a new activity to replace the following activity: {Prompts.activity_to_string(activity, endpoint='swap', model=self.llm.model_name)}."
             ),
         ]
 
         response = await self.invoke_with_retries(
-            structured_model, messages, self.num_retries
+            structured_model,
+            messages,
+            self.num_retries,
+            schema=ItineraryItem,
+            use_cache=use_cache and not feedback,
+            deadline=deadline,
+            stage="swap",
         )
         return response
 
-    async def generate_facts(self, location: str, num: int = 1):
+    async def generate_facts(
+        self,
+        location: str,
+        num: int = 1,
+        use_cache: bool = True,
+        deadline: Deadline = None,
+    ):
         """Generates some interesting facts about a given location"""
         # set model
-        structured_model = self.llm.with_structured_output(Facts)
+        structured_model = self.clients.structured(Facts)
 
         # make num bounded between 1 and 5
         num = max(1, min(num, 5))
@@ -361,7 +994,13 @@ class Generator:
         ]
 
         response = await self.invoke_with_retries(
-            structured_model, messages, self.num_retries
+            structured_model,
+            messages,
+            self.num_retries,
+            schema=Facts,
+            use_cache=use_cache,
+            deadline=deadline,
+            stage="facts",
         )
 
         return response.facts
@@ -73,7 +73,7 @@ class ItineraryItem(BaseModel):
     description: str = Field(
         description="Brief description of the activity - maximum two sentences."
     )
-    price: float = Field(
+    price: Optional[float] = Field(
         description="Cost of the itinerary item, in GBP. If free, write 0."
     )
     theme: Theme = Field(description="Theme of the itinerary item.")
@@ -105,6 +105,14 @@ class ItineraryItem(BaseModel):
     )
 
 
+class ItineraryItemBatch(BaseModel):
+    """Full details for a batch of itinerary items"""
+
+    items: list[ItineraryItem] = Field(
+        description="One entry per requested itinerary item, keeping the given ids"
+    )
+
+
 class FullItinerary(BaseModel):
     itinerary: list[ItineraryItem] = Field(
         description="A full day itinerary for the given location"
@@ -121,6 +129,14 @@ class SimpleItineraryItem(BaseModel):
     start: str = Field(description="Start time of the itinerary item.")
     end: str = Field(description="End time of the itinerary item.")
     id: int = Field(description="Unique identifier for the itinerary item.")
+    transport: bool = Field(
+        default=False,
+        description="Only TRUE if the itinerary item is not an actual activity of any kind but is just transport from one location to another.",
+    )
+    transportMode: TransportMode = Field(
+        default=TransportMode.DEFAULT,
+        description="Mode of transport if it is a transport step, otherwise N/A.",
+    )
 
 
 class ActivityList(BaseModel):
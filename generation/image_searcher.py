@@ -1,12 +1,73 @@
 import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from duckduckgo_search import DDGS
 from typing import List, Tuple, Optional
-
-
-async def get_n_random_places(titles):
+from .cache import build_cache, cache_key
+from .cassette import get_cassette
+from .deadline import Deadline
+from .metrics import STAGE_LATENCY
+from .scheduler import get_scheduler
+from .singleflight import SingleFlight
+from .utils import normalize_text
+
+_flights = SingleFlight()
+_query_flights = SingleFlight()
+_local = threading.local()
+
+# DDGS is blocking, so searches run on their own small pool instead of the
+# default executor shared with every other asyncio.to_thread caller
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("IMAGE_SEARCH_WORKERS", 4)),
+    thread_name_prefix="image-search",
+)
+
+IMAGE_CACHE_TTL = 7 * 24 * 3600
+NEGATIVE_CACHE_TTL = float(os.getenv("IMAGE_NEGATIVE_CACHE_TTL", 6 * 3600))
+
+
+@lru_cache(maxsize=None)
+def get_image_cache():
+    """Normalized query to image URLs cache, persisted in SQLite unless configured otherwise"""
+    return build_cache("IMAGE", ttl=IMAGE_CACHE_TTL, maxsize=4096, backend="sqlite")
+
+
+def get_ddgs() -> DDGS:
+    """Return this thread's DDGS session, reused across searches to keep its connections"""
+    ddgs = getattr(_local, "ddgs", None)
+    if ddgs is None:
+        cassette = get_cassette()
+        if cassette is None:
+            ddgs = DDGS()
+        else:
+            # replay never touches the network, so no real session is needed
+            ddgs = cassette.ddgs(DDGS() if cassette.mode == "record" else None)
+        _local.ddgs = ddgs
+    return ddgs
+
+
+async def get_n_random_places(titles, deadline: Optional[Deadline] = None):
     # filter out items where value is empty
     filtered_titles = {k: v for k, v in titles.items() if v is not None and len(v) > 0}
 
+    # concurrent requests for the same titles share one set of searches
+    key = cache_key(
+        sorted((str(k), normalize_text(v)) for k, v in filtered_titles.items())
+    )
+    search = _flights.do(key, _search_titles, filtered_titles)
+
+    # images are optional, without time left the items go without them
+    with STAGE_LATENCY.time(stage="images"):
+        if deadline is not None:
+            final_data = await deadline.optional("images", search, {})
+        else:
+            final_data = await search
+    return dict(final_data)
+
+
+async def _search_titles(filtered_titles):
     keys = list(filtered_titles.keys())
     values = list(filtered_titles.values())
     final_data = await search_duckduckgo_images(values, keys)
@@ -31,45 +92,83 @@ def search_single_image(
         return (key, None)
 
     try:
-        with DDGS() as ddgs:
-            results = list(ddgs.images(query, max_results=2))
+        results = list(get_ddgs().images(query, max_results=2))
 
-            if not results:
-                return (key, None)
+        if not results:
+            return (key, None)
 
-            # Handle case where we get less than 2 images
-            urls = []
-            for result in results:
-                urls.append(result["image"])
+        # Handle case where we get less than 2 images
+        urls = []
+        for result in results:
+            urls.append(result["image"])
 
-            # Make sure we have at least 2 URLs or pad with None
-            while len(urls) < 2:
-                urls.append(None)
+        # Make sure we have at least 2 URLs or pad with None
+        while len(urls) < 2:
+            urls.append(None)
 
-            return (key, urls)
+        return (key, urls)
     except Exception as e:
         print(f"Error searching for {query}: {e}")
         raise
 
 
+async def search_image(query: str, key=None) -> Optional[List[str]]:
+    """
+    Return image URLs for a query, searching only on a cache miss.
+
+    Queries are cached by their normalized text, and queries without results
+    are cached as well for IMAGE_NEGATIVE_CACHE_TTL. Concurrent searches for
+    the same query share one request.
+
+    Args:
+        query: The search query string
+        key: Key passed through to search_single_image
+
+    Returns:
+        A list of image URLs, or None if the search found nothing
+    """
+    normalized = normalize_text(query)
+    cache = get_image_cache()
+    if cache is not None:
+        urls = await cache.get(normalized)
+        if urls is not None:
+            return list(urls) or None
+
+    urls = await _query_flights.do(normalized, _search_and_store, query, key)
+    return list(urls) if urls else None
+
+
+async def _search_and_store(query, key):
+    loop = asyncio.get_running_loop()
+    async with get_scheduler().slot("duckduckgo"):
+        _, urls = await loop.run_in_executor(_executor, search_single_image, query, key)
+
+    cache = get_image_cache()
+    if cache is not None:
+        if urls:
+            await cache.set(normalize_text(query), urls)
+        else:
+            await cache.set(normalize_text(query), [], ttl=NEGATIVE_CACHE_TTL)
+    return urls
+
+
 async def search_duckduckgo_images(queries, keys):
     data = {}
 
-    # Create a mapping between queries and keys
-    query_key_map = {queries[i]: keys[i] for i in range(len(queries))}
-
-    # Run searches concurrently using asyncio.to_thread
-    tasks = [
-        asyncio.to_thread(search_single_image, query, query_key_map[query])
-        for query in queries
-    ]
+    # Group keys by query so repeated image tags are only searched once
+    query_keys = {}
+    for query, key in zip(queries, keys):
+        query_keys.setdefault(normalize_text(query), (query, []))[1].append(key)
 
-    results = await asyncio.gather(*tasks)
+    results = await asyncio.gather(
+        *(search_image(query, group[0]) for query, group in query_keys.values())
+    )
 
     # Process results
-    for key, image_url in results:
+    for (_, group), image_url in zip(query_keys.values(), results):
         if image_url:
-            data[key] = image_url
+            for key in group:
+                data[key] = list(image_url)
 
     return data
 
@@ -0,0 +1,296 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Optional
+
+from .cache import build_cache, cache_key
+from .deadline import DeadlineExceeded
+from .metrics import JOB_QUEUE_DEPTH, JOBS
+from .scheduler import SchedulerBusy
+
+# lower runs first
+PRIORITIES = {"interactive": 0, "prefetch": 1, "catalog": 2}
+
+
+class Job:
+    """
+    One unit of queued work, its progress events and its outcome.
+
+    `work` is called with the job once a worker picks it up and may report
+    progress through `publish`; its return value becomes the result.
+    """
+
+    def __init__(
+        self,
+        work: Callable[["Job"], Awaitable[Any]],
+        priority: str = "interactive",
+        key: Optional[str] = None,
+    ):
+        self.id = uuid.uuid4().hex
+        self.work = work
+        self.priority = priority
+        self.key = key
+        self.status = "queued"
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def publish(self, event: str, data):
+        self.events.append((event, data))
+        # wake everyone following the job, later waiters get a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self):
+        """Yield every (event, data) of the job, past and future, until it finishes"""
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.finished:
+                return
+            await changed.wait()
+
+    async def wait(self):
+        """Return once the job has finished, its outcome is in result or error"""
+        async for _ in self.follow():
+            pass
+
+    async def run(self):
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            self.result = await self.work(self)
+            self.status = "done"
+            self.publish("done", self.result)
+        except Exception as e:
+            status = getattr(e, "status_code", 500)
+            if isinstance(e, SchedulerBusy):
+                status = 503
+            elif isinstance(e, DeadlineExceeded):
+                status = 504
+            self.error = {"status": status, "detail": getattr(e, "detail", str(e))}
+            self.status = "failed"
+            self.publish("failed", self.error)
+        finally:
+            self.finished_at = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    In-process priority queue of jobs run by a fixed number of workers.
+
+    Interactive jobs run before prefetch jobs, which run before catalog jobs,
+    and first come first served within a priority. `reserved` workers only
+    take interactive jobs, so background work never occupies every worker.
+    The number of workers caps how many pipelines run at once, however many
+    requests arrive. A full queue rejects jobs with SchedulerBusy.
+
+    Jobs and their events stay in memory for `retention` seconds after they
+    finish (at most `max_retained` of them), and a job submitted with the
+    key of a retained, not failed job returns that job instead of running
+    again. Job records are also written to the JOBS cache, so with a shared
+    cache tier any worker process can answer a status poll.
+
+    Args:
+        workers: Jobs run at once
+        reserved: Workers kept free for interactive jobs
+        max_queued: Jobs waiting before new ones are rejected
+        retention: Seconds a finished job is kept
+        max_retained: Jobs kept in memory
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        reserved: int = 1,
+        max_queued: int = 256,
+        retention: float = 3600,
+        max_retained: int = 1024,
+    ):
+        self.workers = workers
+        self.reserved = min(reserved, workers - 1)
+        self.max_queued = max_queued
+        self.retention = retention
+        self.max_retained = max_retained
+        self.cache = build_cache("JOBS", ttl=retention, maxsize=max_retained)
+        self.jobs = OrderedDict()
+        self.by_key = {}
+        self.running = 0
+        self.running_background = 0
+        self._heap = []
+        self._order = itertools.count()
+        self._loop = None
+        self._ready = None
+        self._tasks = []
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        """Read JOBS_WORKERS, JOBS_RESERVED, JOBS_MAX_QUEUED, JOBS_RETENTION and JOBS_MAX_RETAINED"""
+        return cls(
+            workers=int(os.getenv("JOBS_WORKERS", 4)),
+            reserved=int(os.getenv("JOBS_RESERVED", 1)),
+            max_queued=int(os.getenv("JOBS_MAX_QUEUED", 256)),
+            retention=float(os.getenv("JOBS_RETENTION", 3600)),
+            max_retained=int(os.getenv("JOBS_MAX_RETAINED", 1024)),
+        )
+
+    def _start(self):
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        # first use, or a new event loop whose predecessor took its workers along
+        self._loop = loop
+        self._ready = asyncio.Condition()
+        self._heap = []
+        self.running = self.running_background = 0
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def _runnable(self) -> bool:
+        if not self._heap:
+            return False
+        priority = self._heap[0][0]
+        return priority == 0 or self.running_background < self.workers - self.reserved
+
+    def _export_depth(self):
+        depth = {name: 0 for name in PRIORITIES}
+        for _, _, job in self._heap:
+            depth[job.priority] += 1
+        for name, value in depth.items():
+            JOB_QUEUE_DEPTH.set(value, priority=name)
+
+    async def _worker(self):
+        while True:
+            async with self._ready:
+                await self._ready.wait_for(self._runnable)
+                priority, _, job = heapq.heappop(self._heap)
+                background = priority > 0
+                self.running += 1
+                self.running_background += background
+                self._export_depth()
+            try:
+                await self._save(job, status="running")
+                await job.run()
+                JOBS.inc(priority=job.priority, status=job.status)
+                await self._save(job)
+            finally:
+                async with self._ready:
+                    self.running -= 1
+                    self.running_background -= background
+                    self._ready.notify_all()
+
+    def find(self, key: str) -> Optional[Job]:
+        """A retained job submitted with the same key that has not failed"""
+        job = self.by_key.get(key)
+        if job is None or job.status == "failed":
+            return None
+        if job.finished and time.time() - job.finished_at > self.retention:
+            return None
+        return job
+
+    async def submit(
+        self,
+        work: Callable[[Job], Awaitable[Any]],
+        priority: str = "interactive",
+        key: Optional[str] = None,
+    ) -> Job:
+        """
+        Queue work, or return the retained job with the same key.
+
+        Raises:
+            SchedulerBusy: If max_queued jobs are already waiting
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown job priority: {priority}")
+        existing = self.find(key) if key is not None else None
+        if existing is not None:
+            JOBS.inc(priority=priority, status="reused")
+            return existing
+
+        self._start()
+        if len(self._heap) >= self.max_queued:
+            JOBS.inc(priority=priority, status="rejected")
+            raise SchedulerBusy("jobs", "queue full")
+
+        job = Job(work, priority, key)
+        self._retain(job)
+        await self._save(job)
+        async with self._ready:
+            heapq.heappush(self._heap, (PRIORITIES[priority], next(self._order), job))
+            self._export_depth()
+            self._ready.notify_all()
+        JOBS.inc(priority=priority, status="queued")
+        return job
+
+    def _retain(self, job: Job):
+        self.jobs[job.id] = job
+        if job.key is not None:
+            self.by_key[job.key] = job
+
+        now = time.time()
+        for old in list(self.jobs.values()):
+            expired = old.finished and now - old.finished_at > self.retention
+            if not expired and len(self.jobs) <= self.max_retained:
+                break
+            if not old.finished:
+                # never drop a job that is still queued or running
+                continue
+            del self.jobs[old.id]
+            if self.by_key.get(old.key) is old:
+                del self.by_key[old.key]
+
+    async def _save(self, job: Job, status: Optional[str] = None):
+        if self.cache is not None:
+            record = job.to_dict()
+            if status is not None:
+                record["status"] = status
+            await self.cache.set(cache_key("job", job.id), record)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Status and, once finished, result or error of a job, or None if unknown"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.cache is None:
+            return None
+        return await self.cache.get(cache_key("job", job_id))
+
+    async def aclose(self):
+        if self._loop is not asyncio.get_running_loop():
+            # the workers went with the event loop they were started on
+            return
+        for task in self._tasks:
+            task.cancel()
+
+
+@lru_cache(maxsize=None)
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue configured by JOBS_*"""
+    return JobQueue.from_env()
@@ -0,0 +1,271 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+# seconds, spanning cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    labels = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return f"{{{labels}}}" if labels else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """
+    Base class for a metric family with a fixed set of label names.
+
+    Args:
+        name: Metric name, e.g. "llm_tokens_total"
+        documentation: Help text shown in the exposition
+        labelnames: Names of the labels every sample carries
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        unknown = set(labels) - set(self.labelnames)
+        if unknown:
+            raise ValueError(f"Unknown labels for {self.name}: {sorted(unknown)}")
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> List[Tuple[str, str]]:
+        return list(zip(self.labelnames, key))
+
+    def clear(self):
+        self._values.clear()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        return [
+            f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Metric):
+    """Value that can go up and down, such as a queue depth"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        return [
+            f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(Metric):
+    """
+    Cumulative histogram of observations, typically durations in seconds.
+
+    Args:
+        buckets: Upper bounds of the buckets, +Inf is added automatically
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # per-bucket counts, sum, count
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the enclosed block, awaits included"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def samples(self):
+        lines = []
+        for key, (counts, total, count) in sorted(self._values.items()):
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {repr(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time to response headers per route.",
+        ("method", "route", "status"),
+    )
+)
+STAGE_LATENCY = REGISTRY.register(
+    Histogram(
+        "stage_duration_seconds",
+        "Duration of internal pipeline stages.",
+        ("stage",),
+    )
+)
+LLM_TOKENS = REGISTRY.register(
+    Counter(
+        "llm_tokens_total",
+        "LLM tokens by model, calling stage and kind (prompt or completion).",
+        ("model", "method", "kind"),
+    )
+)
+PROMPT_TOKENS_SAVED = REGISTRY.register(
+    Counter(
+        "prompt_tokens_saved_total",
+        "Prompt tokens saved by the compact itinerary encoding, by endpoint.",
+        ("endpoint",),
+    )
+)
+SWAP_POOL_EVENTS = REGISTRY.register(
+    Counter(
+        "swap_pool_events_total",
+        "Pre-generated swap alternatives: generated, skipped fills, hits and misses.",
+        ("event",),
+    )
+)
+FACT_POOL_EVENTS = REGISTRY.register(
+    Counter(
+        "fact_pool_events_total",
+        "Fact pool lookups (hit, cold) and background refills (refilled, skipped, failed).",
+        ("event",),
+    )
+)
+CATALOG_EVENTS = REGISTRY.register(
+    Counter(
+        "catalog_events_total",
+        "City catalog lookups (hit, stale, miss) and refreshes (refreshed, failed).",
+        ("event",),
+    )
+)
+RETRIES = REGISTRY.register(
+    Counter("retries_total", "Retried upstream calls.", ("operation",))
+)
+CACHE_REQUESTS = REGISTRY.register(
+    Counter("cache_requests_total", "Cache lookups by result.", ("cache", "result"))
+)
+UPSTREAM_ERRORS = REGISTRY.register(
+    Counter(
+        "upstream_errors_total",
+        "Failed outbound calls by provider and error type.",
+        ("provider", "error"),
+    )
+)
+SCHEDULER_REJECTIONS = REGISTRY.register(
+    Counter(
+        "scheduler_rejections_total",
+        "Outbound calls shed by admission control.",
+        ("provider", "reason"),
+    )
+)
+SCHEDULER_WAIT = REGISTRY.register(
+    Histogram(
+        "scheduler_wait_seconds",
+        "Time outbound calls waited for admission.",
+        ("provider",),
+    )
+)
+SCHEDULER_QUEUE_DEPTH = REGISTRY.register(
+    Gauge(
+        "scheduler_queue_depth", "Outbound calls waiting for admission.", ("provider",)
+    )
+)
+SCHEDULER_IN_FLIGHT = REGISTRY.register(
+    Gauge("scheduler_in_flight", "Outbound calls in flight.", ("provider",))
+)
+JOBS = REGISTRY.register(
+    Counter(
+        "jobs_total",
+        "Background jobs by priority and outcome (queued, reused, rejected, done, failed).",
+        ("priority", "status"),
+    )
+)
+JOB_QUEUE_DEPTH = REGISTRY.register(
+    Gauge("job_queue_depth", "Jobs waiting for a worker.", ("priority",))
+)
@@ -0,0 +1,120 @@
+import os
+from typing import Iterable, List, Optional, Sequence
+
+from .metrics import PROMPT_TOKENS_SAVED
+from .tokens import count_tokens
+from .utils import compact_enabled, parse_time
+
+# Fields each prompt needs, richest first. When an encoding is over its
+# token budget the next, leaner tier is tried before items are dropped.
+FEEDBACK_TIERS = (
+    ("id", "time", "title", "transportMode", "theme", "price", "description"),
+    ("id", "time", "title", "transportMode", "theme", "price"),
+    ("id", "time", "title", "transportMode"),
+)
+# the rest of the itinerary is context for a swap, timings and titles suffice
+SWAP_CONTEXT_TIERS = (
+    ("id", "time", "title", "transportMode"),
+    ("id", "time", "title"),
+)
+# the replaced activity, with its location so the alternative stays nearby
+SWAP_TARGET_TIERS = (
+    ("id", "time", "title", "theme", "price", "description", "location"),
+    ("id", "time", "title", "theme", "location"),
+)
+
+ITINERARY_TOKEN_BUDGET = int(os.getenv("PROMPT_ITINERARY_TOKEN_BUDGET", 600))
+ACTIVITY_TOKEN_BUDGET = int(os.getenv("PROMPT_ACTIVITY_TOKEN_BUDGET", 120))
+
+
+def _clock(value) -> Optional[str]:
+    minutes = parse_time(value)
+    if minutes is None:
+        return str(value) if value else None
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _field(item, name: str) -> Optional[str]:
+    """Compact value of one field, None when it carries nothing for the prompt"""
+    if name == "time":
+        start = _clock(getattr(item, "start", None))
+        end = _clock(getattr(item, "end", None))
+        return f"{start}-{end}" if start and end else start or end
+    if name == "location":
+        latitude = getattr(item, "latitude", None)
+        longitude = getattr(item, "longitude", None)
+        if latitude is None or longitude is None:
+            return None
+        return f"{latitude:.3f},{longitude:.3f}"
+    if name == "transportMode" and not getattr(item, "transport", False):
+        # only transport steps have a mode, activities carry "N/A"
+        return None
+
+    value = getattr(item, name, None)
+    value = getattr(value, "value", value)
+    if value is None or value == "" or value == []:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+# shorter labels where the field name is not self-explanatory
+LABELS = {"transportMode": "transport"}
+
+
+def encode_item(item, fields: Sequence[str]) -> str:
+    """One line per item with only the given fields, e.g. "id: 3; time: 10:00-11:00; title: ..." """
+    parts = []
+    for name in fields:
+        value = _field(item, name)
+        if value is not None:
+            parts.append(f"{LABELS.get(name, name)}: {value}")
+    return "; ".join(parts)
+
+
+def encode_items(
+    items: Iterable,
+    tiers: Sequence[Sequence[str]],
+    budget: int,
+    model: str = "gpt-4o-mini",
+) -> str:
+    """
+    Encode items one per line within a token budget.
+
+    Tiers are tried in order until the encoding fits. If even the leanest
+    tier is over budget, trailing items are dropped and counted instead.
+    """
+    items = list(items)
+    lines: List[str] = []
+    for fields in tiers:
+        lines = [encode_item(item, fields) for item in items]
+        if count_tokens("\n".join(lines), model) <= budget:
+            return "\n".join(lines)
+
+    kept = []
+    for line in lines:
+        if count_tokens("\n".join(kept + [line]), model) > budget:
+            break
+        kept.append(line)
+    if len(kept) < len(lines):
+        kept.append(f"(+{len(lines) - len(kept)} more items not shown)")
+    return "\n".join(kept)
+
+
+def full_item_string(item) -> str:
+    """Every field of an item as "key: value" lines, the original encoding"""
+    return "".join(f"{key}: {value}\n" for key, value in item.model_dump().items())
+
+
+def full_itinerary_string(items: Iterable) -> str:
+    return "".join(
+        f"<Itinerary Item>\n{full_item_string(item)}</Itinerary Item>\n" for item in items
+    )
+
+
+def record_savings(endpoint: str, full: str, compact: str, model: str = "gpt-4o-mini"):
+    """Count the prompt tokens the compact encoding saved for an endpoint"""
+    saved = count_tokens(full, model) - count_tokens(compact, model)
+    if saved > 0:
+        PROMPT_TOKENS_SAVED.inc(saved, endpoint=endpoint)
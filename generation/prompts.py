@@ -1,4 +1,15 @@
 from .generation_models import FullItinerary, ItineraryItem
+from .prompt_encoder import (
+    ACTIVITY_TOKEN_BUDGET,
+    FEEDBACK_TIERS,
+    ITINERARY_TOKEN_BUDGET,
+    SWAP_TARGET_TIERS,
+    encode_items,
+    full_item_string,
+    full_itinerary_string,
+    record_savings,
+)
+from .utils import compact_enabled
 
 from typing import List
 
@@ -76,20 +87,47 @@ class Prompts:
             return "all day"
 
     @staticmethod
-    def itinerary_to_string(itinerary: FullItinerary) -> str:
-        itinerary_str = ""
-        for item in itinerary.itinerary:
-            json_item = item.model_dump()
-            itinerary_str += "<Itinerary Item>\n"
-            for key, value in json_item.items():
-                itinerary_str += f"{key}: {value}\n"
-            itinerary_str += "</Itinerary Item>\n"
-        return itinerary_str
+    def itinerary_to_string(
+        itinerary: FullItinerary,
+        tiers=FEEDBACK_TIERS,
+        budget: int = None,
+        endpoint: str = None,
+        model: str = "gpt-4o-mini",
+    ) -> str:
+        """
+        Itinerary items for a prompt, one compact line each with the fields in
+        the first tier that fits the token budget, see prompt_encoder.
+
+        Args:
+            itinerary: Itinerary or itinerary summary to encode
+            tiers: Field sets to try, richest first
+            budget: Token budget, defaults to PROMPT_ITINERARY_TOKEN_BUDGET
+            endpoint: Label for the prompt_tokens_saved_total metric, if any
+            model: Model whose tokenizer counts the budget and the savings
+        """
+        full = full_itinerary_string(itinerary.itinerary)
+        if not compact_enabled():
+            return full
+        compact = encode_items(
+            itinerary.itinerary, tiers, budget or ITINERARY_TOKEN_BUDGET, model
+        )
+        if endpoint is not None:
+            record_savings(endpoint, full, compact, model)
+        return compact
 
     @staticmethod
-    def activity_to_string(activity: ItineraryItem) -> str:
-        activity_str = ""
-        json_item = activity.model_dump()
-        for key, value in json_item.items():
-            activity_str += f"{key}: {value}\n"
-        return activity_str
+    def activity_to_string(
+        activity: ItineraryItem,
+        tiers=SWAP_TARGET_TIERS,
+        budget: int = None,
+        endpoint: str = None,
+        model: str = "gpt-4o-mini",
+    ) -> str:
+        """A single activity for a prompt, see itinerary_to_string"""
+        full = full_item_string(activity)
+        if not compact_enabled():
+            return full
+        compact = encode_items([activity], tiers, budget or ACTIVITY_TOKEN_BUDGET, model)
+        if endpoint is not None:
+            record_savings(endpoint, full, compact, model)
+        return compact
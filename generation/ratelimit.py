@@ -0,0 +1,68 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Async token bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`, and
+    waiters are served in arrival order so a burst cannot starve earlier callers.
+
+    Args:
+        rate: Tokens added per second
+        capacity: Maximum tokens held, defaults to one second worth of tokens
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = None
+        self._loop = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _get_lock(self) -> asyncio.Lock:
+        # created lazily, on Python 3.9 a lock binds to the loop current at creation
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    async def acquire(self, tokens: float = 1):
+        """
+        Wait until `tokens` are available and take them.
+
+        A request larger than the bucket waits for a full bucket and is still
+        charged in full, the bucket goes negative and later callers wait until
+        the difference has refilled.
+        """
+        async with self._get_lock():
+            self._refill()
+            needed = min(tokens, self.capacity)
+            while self.tokens < needed:
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+
+    def consume(self, tokens: float):
+        """Take tokens without waiting, e.g. to charge usage known only after a call"""
+        self._refill()
+        self.tokens -= tokens
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Take tokens if they are available now, without waiting"""
+        self._refill()
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+import openai
+from langchain_core.exceptions import OutputParserException
+from pydantic import ValidationError
+
+from .metrics import RETRIES
+from .scheduler import SchedulerBusy
+
+T = TypeVar("T")
+
+# statuses worth another attempt, anything else (bad request, auth) fails the same way again
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Classify an error from an upstream call.
+
+    Timeouts, connection errors, rate limits and server errors are transient.
+    Malformed structured output is retryable too, since a new sample usually
+    parses. Admission rejections are not, as retrying only adds load.
+    """
+    if isinstance(error, SchedulerBusy):
+        return False
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    return isinstance(
+        error,
+        (
+            asyncio.TimeoutError,
+            openai.APIConnectionError,
+            httpx.TransportError,
+            OutputParserException,
+            ValidationError,
+        ),
+    )
+
+
+class LatencyTracker:
+    """
+    Rolling window of call latencies used to decide when to hedge.
+
+    Args:
+        window: Number of recent latencies kept
+        min_samples: Samples needed before a percentile is reported
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class RetryPolicy:
+    """
+    Backoff and hedging settings for upstream calls.
+
+    Args:
+        base_delay: Backoff before the second attempt, doubled for each later one
+        max_delay: Upper bound of a single backoff
+        hedge_percentile: Latency percentile after which a duplicate request
+            is started, None to disable hedging
+        hedge_min_samples: Latencies observed before hedging starts
+    """
+
+    def __init__(
+        self,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: int = 20,
+    ):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "RetryPolicy":
+        """Read {prefix}_RETRY_BASE_DELAY, {prefix}_RETRY_MAX_DELAY, {prefix}_HEDGE_PERCENTILE and {prefix}_HEDGE_MIN_SAMPLES"""
+        hedge = os.getenv(f"{prefix}_HEDGE_PERCENTILE")
+        return cls(
+            base_delay=float(os.getenv(f"{prefix}_RETRY_BASE_DELAY", 0.5)),
+            max_delay=float(os.getenv(f"{prefix}_RETRY_MAX_DELAY", 8.0)),
+            hedge_percentile=float(hedge) if hedge else None,
+            hedge_min_samples=int(os.getenv(f"{prefix}_HEDGE_MIN_SAMPLES", 20)),
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff after the given zero-based attempt"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def tracker(self) -> LatencyTracker:
+        return LatencyTracker(min_samples=self.hedge_min_samples)
+
+    def hedge_delay(self, latencies: Optional[LatencyTracker]) -> Optional[float]:
+        if self.hedge_percentile is None or latencies is None:
+            return None
+        return latencies.percentile(self.hedge_percentile)
+
+
+async def _timed(fn: Callable[[], Awaitable[T]], latencies) -> T:
+    start = time.monotonic()
+    result = await fn()
+    if latencies is not None:
+        latencies.record(time.monotonic() - start)
+    return result
+
+
+async def hedged_call(
+    fn: Callable[[], Awaitable[T]],
+    delay: Optional[float],
+    latencies: Optional[LatencyTracker] = None,
+) -> T:
+    """
+    Await fn(), starting a second identical call if the first has not finished
+    after `delay` seconds, and return whichever succeeds first.
+
+    Raises the last error if every call failed.
+    """
+    if delay is None:
+        return await _timed(fn, latencies)
+
+    first = asyncio.ensure_future(_timed(fn, latencies))
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if not done:
+            pending.add(asyncio.ensure_future(_timed(fn, latencies)))
+
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_with_retries(
+    fn: Callable[[], Awaitable[T]],
+    attempts: int,
+    policy: RetryPolicy,
+    latencies: Optional[LatencyTracker] = None,
+    retryable: Callable[[BaseException], bool] = is_retryable,
+    name: str = "call",
+) -> T:
+    """
+    Call fn() until it succeeds, backing off between retryable failures.
+
+    Args:
+        fn: Zero-argument coroutine function making one upstream call
+        attempts: Maximum number of attempts
+        policy: Backoff and hedging settings
+        latencies: Latencies of this kind of call, used and updated for hedging
+        retryable: Classifies which errors get another attempt
+        name: Operation name for logs and the retries_total metric
+
+    Returns:
+        The result of the first successful call
+
+    Raises:
+        The last error once attempts are exhausted, or the first non-retryable one
+    """
+    for attempt in range(attempts):
+        try:
+            return await hedged_call(fn, policy.hedge_delay(latencies), latencies)
+        except Exception as e:
+            if attempt + 1 >= attempts or not retryable(e):
+                raise
+            delay = policy.backoff(attempt)
+            RETRIES.inc(operation=name)
+            print(
+                f"Error in {name}: {e}. Retrying in {delay:.2f}s, "
+                f"attempts left: {attempts - attempt - 1}"
+            )
+            await asyncio.sleep(delay)
@@ -0,0 +1,254 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .generation_models import SimpleItineraryItem, TransportMode
+from .transport import build_transport_item
+from .utils import (
+    DAY_MINUTES,
+    TIME_OF_DAY_WINDOWS,
+    format_time,
+    minutes_between,
+    night_minutes,
+    parse_time,
+    time_of_day,
+)
+
+EARTH_RADIUS_KM = 6371.0
+# streets are longer than the straight line between two stops
+DETOUR_FACTOR = 1.3
+# longest leg walked rather than ridden
+MAX_WALK_KM = 1.5
+# modes considered for longer legs, the fastest estimate wins
+RIDE_MODES = (TransportMode.TUBE, TransportMode.TRAIN)
+
+# (minutes to get going, km/h) for each mode: reaching the stop, waiting, hailing
+LEG_SPEEDS = {
+    TransportMode.WALKING: (0, 4.8),
+    TransportMode.BUS: (8, 12.0),
+    TransportMode.TUBE: (10, 30.0),
+    TransportMode.TAXI: (5, 20.0),
+    TransportMode.TRAIN: (15, 50.0),
+    TransportMode.FERRY: (15, 18.0),
+    TransportMode.DEFAULT: (10, 15.0),
+}
+
+# legs to or from a stop without coordinates
+UNKNOWN_LEG_MINUTES = 20
+
+# titles of added legs, formatted with the venue they lead to
+LEG_TITLES = {
+    TransportMode.TUBE: "Take the Tube to {destination}",
+    TransportMode.WALKING: "Walk to {destination}",
+    TransportMode.BUS: "Take the bus to {destination}",
+    TransportMode.TAXI: "Take a taxi to {destination}",
+    TransportMode.TRAIN: "Take the train to {destination}",
+    TransportMode.FERRY: "Take the ferry to {destination}",
+    TransportMode.DEFAULT: "Travel to {destination}",
+}
+
+
+def haversine_matrix(latitudes, longitudes) -> np.ndarray:
+    """Great circle distances in km between every pair of points"""
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.outer(np.cos(lat), np.cos(lat)) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def leg_minutes(mode: TransportMode, km: float) -> int:
+    """Estimated minutes to cover a straight-line distance by a mode of transport"""
+    overhead, speed = LEG_SPEEDS[mode]
+    return max(1, round(overhead + 60 * km * DETOUR_FACTOR / speed))
+
+
+def estimate_leg(km: float) -> Tuple[TransportMode, int]:
+    """Mode and minutes of the leg between two stops km apart in a straight line"""
+    if km <= MAX_WALK_KM:
+        mode = TransportMode.WALKING
+    else:
+        mode = min(RIDE_MODES, key=lambda mode: leg_minutes(mode, km))
+    return mode, leg_minutes(mode, km)
+
+
+def path_length(matrix: np.ndarray, path: List[int]) -> float:
+    if len(path) < 2:
+        return 0.0
+    return float(matrix[path[:-1], path[1:]].sum())
+
+
+def two_opt(matrix: np.ndarray, path: List[int], fixed_start: bool = False) -> List[int]:
+    """Reverse segments of an open path while that shortens it"""
+    path = list(path)
+    first = 1 if fixed_start else 0
+    improved = True
+    while improved:
+        improved = False
+        for i in range(first, len(path) - 1):
+            for j in range(i + 1, len(path)):
+                before = after = 0.0
+                if i > 0:
+                    before += matrix[path[i - 1], path[i]]
+                    after += matrix[path[i - 1], path[j]]
+                if j < len(path) - 1:
+                    before += matrix[path[j], path[j + 1]]
+                    after += matrix[path[i], path[j + 1]]
+                if after < before - 1e-9:
+                    path[i : j + 1] = reversed(path[i : j + 1])
+                    improved = True
+    return path
+
+
+def nearest_neighbour(matrix: np.ndarray, start: int, stops: List[int]) -> List[int]:
+    path = [start]
+    remaining = [stop for stop in stops if stop != start]
+    while remaining:
+        nearest = min(remaining, key=lambda stop: matrix[path[-1], stop])
+        path.append(nearest)
+        remaining.remove(nearest)
+    return path
+
+
+def order_stops(matrix: np.ndarray, stops: List[int], anchor: Optional[int] = None) -> List[int]:
+    """
+    Short open path through stops, from anchor when given.
+
+    Nearest neighbour tours from every possible start are improved with 2-opt
+    and the shortest is kept, which is exact for the handful of stops of a day.
+
+    Returns:
+        list: The stops in visiting order, without the anchor
+    """
+    if len(stops) < 2 and anchor is None:
+        return list(stops)
+    if anchor is not None:
+        path = two_opt(matrix, nearest_neighbour(matrix, anchor, stops), fixed_start=True)
+        return path[1:]
+    paths = [two_opt(matrix, nearest_neighbour(matrix, start, stops)) for start in stops]
+    return min(paths, key=lambda path: path_length(matrix, path))
+
+
+def plan_route(
+    items: List[dict], next_id: Optional[int] = None, location: Optional[str] = None
+) -> List[dict]:
+    """
+    Order the venues of a day and rebuild the travel legs between them locally.
+
+    Venues stay in their part of the day (morning, afternoon, evening, then
+    the small hours after it, from their start time). Within a part they
+    follow the shortest path found from the last venue of the previous part,
+    or the order of their start times when that finishes the part earlier,
+    as no venue starts before its own start time. Every venue keeps its
+    duration and legs are estimated from the distance by estimate_leg.
+
+    Args:
+        items: Detailed items (ItineraryItem dicts) of one day, transport steps
+            among them are dropped and replaced
+        next_id: First id for legs once the ids of the dropped steps run out,
+            after the highest item id by default
+        location: City of the itinerary, used to price the legs
+
+    Returns:
+        list: Venues and legs in visiting order, with start, end and duration set
+    """
+    venues = [item for item in items if not item["transport"]]
+    if not venues:
+        return items
+    leg_ids = [item["id"] for item in items if item["transport"]]
+    if next_id is None:
+        next_id = max(item["id"] for item in items) + 1
+
+    starts = [night_minutes(parse_time(item["start"])) for item in venues]
+    durations = [
+        minutes_between(item["start"], item["end"]) or item.get("duration") or 60
+        for item in venues
+    ]
+    located = {
+        i for i, item in enumerate(venues)
+        if item.get("latitude") is not None and item.get("longitude") is not None
+    }
+    matrix = np.zeros((len(venues), len(venues)))
+    if located:
+        indexes = sorted(located)
+        distances = haversine_matrix(
+            [venues[i]["latitude"] for i in indexes],
+            [venues[i]["longitude"] for i in indexes],
+        )
+        matrix[np.ix_(indexes, indexes)] = distances
+
+    def leg(previous: int, i: int) -> Tuple[TransportMode, int]:
+        if previous in located and i in located:
+            return estimate_leg(matrix[previous, i])
+        return TransportMode.DEFAULT, UNKNOWN_LEG_MINUTES
+
+    def timeline(path: List[int], previous: Optional[int], cursor: Optional[int]):
+        """(leg or None, start) of each venue of path, and when the last one ends"""
+        visits = []
+        for i in path:
+            start = starts[i]
+            if start is None:
+                start = cursor if cursor is not None else TIME_OF_DAY_WINDOWS["morning"][0]
+            travel = None
+            if previous is not None:
+                travel = leg(previous, i)
+                start = max(start, cursor + travel[1])
+            visits.append((travel, start))
+            cursor, previous = start + durations[i], i
+        return visits, cursor
+
+    # visit the parts of the day in order, the small hours after the evening
+    # and unparseable starts last
+    parts = list(TIME_OF_DAY_WINDOWS)
+    by_part = {}
+    for i, start in enumerate(starts):
+        if start is None:
+            part = len(parts) + 1
+        elif start >= DAY_MINUTES:
+            part = len(parts)
+        else:
+            part = parts.index(time_of_day(start))
+        by_part.setdefault(part, []).append(i)
+
+    planned = []
+    previous = cursor = None
+    for part in sorted(by_part):
+        stops = by_part[part]
+        anchor = previous if previous in located else None
+        shortest = order_stops(matrix, [i for i in stops if i in located], anchor)
+        shortest += [i for i in stops if i not in located]
+        chronological = sorted(stops, key=lambda i: starts[i] if starts[i] is not None else 0)
+        path = min(
+            [shortest, chronological],
+            key=lambda path: (timeline(path, previous, cursor)[1], path_length(matrix, path)),
+        )
+
+        visits, _ = timeline(path, previous, cursor)
+        for i, (travel, start) in zip(path, visits):
+            if travel is not None:
+                mode, minutes = travel
+                if leg_ids:
+                    leg_id = leg_ids.pop(0)
+                else:
+                    leg_id, next_id = next_id, next_id + 1
+                destination = venues[i].get("imageTag") or venues[i]["title"]
+                step = SimpleItineraryItem(
+                    title=LEG_TITLES[mode].format(destination=destination),
+                    imageTag="",
+                    start=format_time(start - minutes),
+                    end=format_time(start),
+                    id=leg_id,
+                    transport=True,
+                    transportMode=mode,
+                )
+                planned.append(build_transport_item(step, location))
+
+            venue = dict(venues[i])
+            venue["start"] = format_time(start)
+            venue["end"] = format_time(start + durations[i])
+            venue["duration"] = durations[i]
+            planned.append(venue)
+            previous, cursor = i, start + durations[i]
+
+    return planned
@@ -0,0 +1,169 @@
+from typing import List, Optional, Tuple
+
+from .deadline import Deadline
+from .utils import (
+    DAY_MINUTES,
+    LATE_NIGHT_MINUTES,
+    TIME_OF_DAY_WINDOWS,
+    format_time,
+    minutes_between,
+    night_minutes,
+    parse_time,
+)
+
+# duration given to items whose times and duration are all unusable
+DEFAULT_MINUTES = {True: 15, False: 60}
+# longer spans between start and end are taken as a mistake, e.g. swapped times
+MAX_ITEM_MINUTES = 8 * 60
+# shortest visit left when trimming a venue to the end of its part of the day,
+# a venue that would end up shorter moves to the next part the user picked
+MIN_VISIT_MINUTES = 30
+
+
+def allowed_windows(timeOfDay: Optional[List[str]] = None) -> list:
+    """
+    [start, end) minutes of the parts of the day the user picked, all of them
+    by default. Adjacent parts merge into one window, so a visit may run from
+    the morning into the afternoon, and the evening runs on into the night,
+    past DAY_MINUTES.
+    """
+    parts = [part for part in timeOfDay or [] if part in TIME_OF_DAY_WINDOWS]
+    if not parts:
+        parts = list(TIME_OF_DAY_WINDOWS)
+    windows = []
+    for part, (start, end) in TIME_OF_DAY_WINDOWS.items():
+        if part not in parts:
+            continue
+        if end == DAY_MINUTES:
+            end += LATE_NIGHT_MINUTES
+        if windows and windows[-1][1] == start:
+            start = windows.pop()[0]
+        windows.append((start, end))
+    return windows
+
+
+def nearest_window(start: int, windows: list) -> tuple:
+    """The window a start time falls in, or the closest one"""
+
+    def distance(window):
+        window_start, window_end = window
+        return max(window_start - start, start - window_end + 1, 0)
+
+    return min(windows, key=distance)
+
+
+def place(
+    start: int, minutes: int, transport: bool, windows: list
+) -> Optional[Tuple[int, int]]:
+    """
+    Start and end of an item starting no earlier than start, inside the first
+    window it fits in, with venues trimmed to the end of a window when at
+    least MIN_VISIT_MINUTES remain. None when it fits in no window.
+    """
+    for window_start, window_end in windows:
+        if window_end <= start:
+            continue
+        start = max(start, window_start)
+        if start + minutes <= window_end:
+            return start, start + minutes
+        if not transport and window_end - start >= MIN_VISIT_MINUTES:
+            return start, window_end
+    return None
+
+
+def item_minutes(item: dict) -> int:
+    """Duration of an item from its times, its duration field, or a default"""
+    minutes = minutes_between(item.get("start"), item.get("end"))
+    if not minutes or minutes > MAX_ITEM_MINUTES:
+        minutes = item.get("duration")
+    if not isinstance(minutes, int) or not 0 < minutes <= MAX_ITEM_MINUTES:
+        minutes = DEFAULT_MINUTES[bool(item.get("transport"))]
+    return minutes
+
+
+def solve_schedule(
+    items: List[dict],
+    timeOfDay: Optional[List[str]] = None,
+    deadline: Deadline = None,
+) -> List[dict]:
+    """
+    Make the times of a day consistent without asking the LLM again.
+
+    Starts are parsed from any of the formats parse_time accepts, an item
+    without a usable start follows the one before it, and small hours starts
+    count as the end of the evening. Each start is moved into a window of the
+    parts of the day the user picked, the nearest one, and items are sorted
+    by start, keeping their order on ties. Travel steps sort directly before
+    the venue that follows them in the given order. Overlaps are then resolved by
+    pushing items later, and an item running past the end of its window is
+    placed as described in place, moving to the start of the next window if
+    need be. Items that fit in no window are dropped. Duration is recomputed
+    from start and end.
+
+    Args:
+        items: Itinerary items of one day as dicts (ItineraryItem or
+            SimpleItineraryItem fields)
+        timeOfDay: Parts of the day the user wants, all of them by default
+        deadline: Dropping items is reported as the skipped "schedule" stage
+
+    Returns:
+        list: Copies of the items sorted by start, with "HH:MM" start and end
+            and the duration in minutes
+    """
+    if not items:
+        return []
+    windows = allowed_windows(timeOfDay)
+
+    slots = []
+    previous_end = None
+    for position, item in enumerate(items):
+        minutes = item_minutes(item)
+        start = parse_time(item.get("start"))
+        if start is None:
+            end = parse_time(item.get("end"))
+            if end is not None:
+                start = end - minutes
+            elif previous_end is not None:
+                start = previous_end
+            else:
+                start = windows[0][0]
+        start = night_minutes(start % DAY_MINUTES)
+        window_start, window_end = nearest_window(start, windows)
+        if start < window_start:
+            start = window_start
+        elif start >= window_end:
+            start = max(window_start, window_end - minutes)
+        slots.append([start, position, minutes, start])
+        previous_end = start + minutes
+
+    # a travel step sorts with the venue that follows it in the skeleton and
+    # ahead of it on the tie, whatever its own times say
+    following = None
+    for slot in reversed(slots):
+        if items[slot[1]].get("transport"):
+            if following is not None:
+                slot[0] = following
+                slot[3] = min(slot[3], following)
+        else:
+            following = slot[0]
+    slots.sort(key=lambda slot: (slot[0], slot[1]))
+
+    solved = []
+    cursor = None
+    for _, position, minutes, start in slots:
+        if cursor is not None:
+            start = max(start, cursor)
+        placed = place(start, minutes, bool(items[position].get("transport")), windows)
+        if placed is None:
+            if deadline is not None:
+                deadline.skip("schedule")
+            continue
+        start, end = placed
+
+        item = dict(items[position])
+        item["start"] = format_time(start)
+        item["end"] = format_time(end)
+        item["duration"] = end - start
+        solved.append(item)
+        cursor = end
+    return solved
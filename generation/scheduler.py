@@ -0,0 +1,211 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from .metrics import (
+    SCHEDULER_IN_FLIGHT,
+    SCHEDULER_QUEUE_DEPTH,
+    SCHEDULER_REJECTIONS,
+    SCHEDULER_WAIT,
+    UPSTREAM_ERRORS,
+)
+from .ratelimit import TokenBucket
+
+# concurrency, requests per minute, tokens per minute, queue size, queue timeout
+PROVIDER_DEFAULTS = {
+    "openai": (32, 500, 200_000, 256, 10.0),
+    "perplexity": (8, 50, 0, 64, 10.0),
+    "duckduckgo": (4, 120, 0, 128, 10.0),
+    "weatherapi": (10, 600, 0, 64, 5.0),
+}
+
+
+class SchedulerBusy(Exception):
+    """Raised when an outbound call cannot be admitted, served as 503 by the API"""
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"{provider} is busy: {reason}")
+        self.provider = provider
+        self.reason = reason
+
+
+class ProviderLimiter:
+    """
+    Admission control for one upstream provider.
+
+    Calls wait in a bounded queue for a concurrency slot and for their share
+    of the requests-per-minute and tokens-per-minute budgets. A call is
+    rejected with SchedulerBusy when the queue is full or it has waited
+    longer than queue_timeout. The budgets hold `burst` seconds' worth of
+    their per-minute rate, so a quiet provider admits that much at once.
+
+    Args:
+        name: Provider name used in errors and stats
+        concurrency: Maximum calls in flight
+        rpm: Requests per minute, 0 for no limit
+        tpm: Tokens per minute, 0 for no limit
+        queue_size: Maximum calls waiting for admission
+        queue_timeout: Maximum seconds a call waits for admission
+        burst: Seconds of the RPM and TPM budgets that may be spent at once
+    """
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        rpm: float = 0,
+        tpm: float = 0,
+        queue_size: int = 128,
+        queue_timeout: float = 10.0,
+        burst: float = 10.0,
+    ):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.requests = TokenBucket(rpm / 60, max(rpm / 60 * burst, 1)) if rpm else None
+        self.tokens = TokenBucket(tpm / 60, max(tpm / 60 * burst, 1)) if tpm else None
+
+        self.queued = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def _admit(self, semaphore, tokens):
+        await semaphore.acquire()
+        try:
+            if self.requests is not None:
+                await self.requests.acquire()
+            if self.tokens is not None and tokens:
+                await self.tokens.acquire(tokens)
+        except BaseException:
+            semaphore.release()
+            raise
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0):
+        """Hold an admitted slot for the duration of one outbound call"""
+        if self.queued >= self.queue_size:
+            self.rejected += 1
+            SCHEDULER_REJECTIONS.inc(provider=self.name, reason="queue full")
+            raise SchedulerBusy(self.name, "queue full")
+
+        semaphore = self._get_semaphore()
+        self.queued += 1
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._admit(semaphore, tokens), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            SCHEDULER_REJECTIONS.inc(provider=self.name, reason="queue timeout")
+            raise SchedulerBusy(self.name, "queue timeout") from None
+        finally:
+            self.queued -= 1
+
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        SCHEDULER_WAIT.observe(waited, provider=self.name)
+
+        self.in_flight += 1
+        try:
+            yield
+        except Exception as e:
+            # every outbound call runs in a slot, so this sees all upstream failures
+            UPSTREAM_ERRORS.inc(provider=self.name, error=type(e).__name__)
+            raise
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queued,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_seconds": (
+                self.wait_seconds / self.admitted if self.admitted else 0.0
+            ),
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+
+class Scheduler:
+    """
+    Central admission control every outbound call goes through, with one
+    ProviderLimiter per upstream provider.
+
+    Limits come from {PROVIDER}_CONCURRENCY, {PROVIDER}_RPM, {PROVIDER}_TPM,
+    {PROVIDER}_QUEUE_SIZE, {PROVIDER}_QUEUE_TIMEOUT and {PROVIDER}_BURST,
+    falling back to PROVIDER_DEFAULTS and a 10 second burst. Concurrency, RPM and TPM are account-wide limits, so
+    with WEB_CONCURRENCY worker processes each one gets an equal share.
+    """
+
+    def __init__(self):
+        self.providers = {}
+
+    def provider(self, name: str) -> ProviderLimiter:
+        limiter = self.providers.get(name)
+        if limiter is None:
+            limiter = self.providers[name] = self.limiter_from_env(name)
+        return limiter
+
+    @staticmethod
+    def limiter_from_env(name: str) -> ProviderLimiter:
+        concurrency, rpm, tpm, queue_size, queue_timeout = PROVIDER_DEFAULTS.get(
+            name, (16, 0, 0, 128, 10.0)
+        )
+        prefix = name.upper()
+        workers = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+        return ProviderLimiter(
+            name,
+            concurrency=max(1, int(os.getenv(f"{prefix}_CONCURRENCY", concurrency)) // workers),
+            rpm=float(os.getenv(f"{prefix}_RPM", rpm)) / workers,
+            tpm=float(os.getenv(f"{prefix}_TPM", tpm)) / workers,
+            queue_size=int(os.getenv(f"{prefix}_QUEUE_SIZE", queue_size)),
+            queue_timeout=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", queue_timeout)),
+            burst=float(os.getenv(f"{prefix}_BURST", 10.0)),
+        )
+
+    def slot(self, name: str, tokens: int = 0):
+        """
+        Wait for admission to call a provider.
+
+        Args:
+            name: Provider name, e.g. "openai"
+            tokens: Estimated tokens the call uses, charged to the TPM budget
+
+        Raises:
+            SchedulerBusy: If the provider's queue is full or the wait timed out
+        """
+        return self.provider(name).slot(tokens)
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self.providers.items()}
+
+    def export_gauges(self):
+        """Copy current queue depth and in-flight counts into the metrics registry"""
+        for name, limiter in self.providers.items():
+            SCHEDULER_QUEUE_DEPTH.set(limiter.queued, provider=name)
+            SCHEDULER_IN_FLIGHT.set(limiter.in_flight, provider=name)
+
+
+@lru_cache(maxsize=None)
+def get_scheduler() -> Scheduler:
+    """Process-wide scheduler shared by all outbound clients"""
+    return Scheduler()
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one upstream call.
+
+    The first caller for a key starts the work in its own task and every
+    caller that arrives before it finishes awaits the same task, so the
+    result (or exception) fans out to all of them. The work keeps running
+    when the caller that started it is cancelled, and is only cancelled
+    once every waiting caller has gone away.
+
+    Results are shared between callers, so copy them before mutating.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(
+        self, key: str, fn: Callable[..., Awaitable[Any]], *args, **kwargs
+    ) -> Any:
+        """
+        Run fn(*args, **kwargs) unless a call with the same key is in flight.
+
+        Args:
+            key: Identifies calls that are interchangeable
+            fn: Coroutine function doing the upstream call
+
+        Returns:
+            The result of the shared call
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn(*args, **kwargs)))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # last interested caller left, later callers start a fresh call
+                self._forget(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,87 @@
+import json
+from typing import Any, List
+
+
+class IncrementalListParser:
+    """
+    Incrementally parses a streamed JSON object and returns the elements of one
+    of its top level lists as soon as each element is complete.
+
+    Example:
+        parser = IncrementalListParser("activities")
+        parser.feed('{"activities": [{"id": 1, "ti')  # -> []
+        parser.feed('tle": "Tate"}, {"id"')  # -> [{"id": 1, "title": "Tate"}]
+
+    Args:
+        list_key: Key of the top level list whose elements should be emitted
+    """
+
+    def __init__(self, list_key: str):
+        self.list_key = list_key
+        self._buffer = []
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string_start = None
+        self._last_key = None
+        self._in_list = False
+        self._element_start = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        """
+        Consume the next piece of the JSON text.
+
+        Args:
+            chunk: Next fragment of the streamed JSON
+
+        Returns:
+            list: Elements of the target list completed by this chunk
+        """
+        completed = []
+        for char in chunk:
+            self._buffer.append(char)
+            position = self._position
+            self._position += 1
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    self._close_string(position, completed)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = position
+            elif char in "{[":
+                self._depth += 1
+                if self._in_list and self._depth == 3 and char == "{":
+                    self._element_start = position
+                elif (
+                    char == "[" and self._depth == 2 and self._last_key == self.list_key
+                ):
+                    self._in_list = True
+            elif char in "}]":
+                if self._in_list and self._depth == 3 and char == "}":
+                    completed.append(self._decode(self._element_start, position))
+                    self._element_start = None
+                elif self._in_list and self._depth == 2:
+                    self._in_list = False
+                self._depth -= 1
+
+        return completed
+
+    def _close_string(self, end: int, completed: List[Any]):
+        if self._depth == 1:
+            # strings directly inside the top level object are keys or values;
+            # only the one right before the list's "[" matters
+            self._last_key = self._decode(self._string_start, end)
+        elif self._in_list and self._depth == 2:
+            completed.append(self._decode(self._string_start, end))
+
+    def _decode(self, start: int, end: int) -> Any:
+        return json.loads("".join(self._buffer[start : end + 1]))
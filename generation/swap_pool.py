@@ -0,0 +1,252 @@
+import asyncio
+import os
+import time
+from functools import lru_cache
+from typing import List, Optional
+
+from .activity_links import get_activity_links
+from .cache import build_cache, cache_key
+from .deadline import DeadlineExceeded
+from .generation_models import FullItinerary, ItineraryItem
+from .image_searcher import get_n_random_places
+from .jobs import get_job_queue
+from .metrics import SWAP_POOL_EVENTS
+from .ratelimit import TokenBucket
+from .scheduler import SchedulerBusy, get_scheduler
+from .utils import normalize_text, weather_to_str
+
+
+def _enabled() -> bool:
+    return os.getenv("SWAP_POOL_ENABLED", "false").lower() == "true"
+
+
+class SwapPool:
+    """
+    Pre-generated swap alternatives for the items of recently served itineraries.
+
+    After /itinerary returns, `schedule` fills the pool in the background with
+    `size` alternatives per activity, images and booking links attached, so a
+    /swap without feedback is answered without any upstream call. Filling is
+    low priority: it runs as a prefetch job of the job queue, behind every
+    interactive job, only while the OpenAI scheduler has no queue and spare
+    concurrency, and is capped by an LLM call budget per minute. Work
+    that does not fit is dropped, not queued. Alternatives expire after `ttl`
+    seconds, as does the forecast and availability they were made for.
+
+    Args:
+        size: Alternatives generated per activity
+        ttl: Seconds an alternative may be served for
+        rpm: LLM calls per minute the pool may spend
+        max_items: Activities per itinerary that get alternatives
+        max_pending: Itineraries being filled at once, further ones are skipped
+        max_share: Share of the OpenAI concurrency above which filling yields
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        ttl: float = 1800,
+        rpm: float = 30,
+        max_items: int = 8,
+        max_pending: int = 4,
+        max_share: float = 0.5,
+    ):
+        self.size = size
+        self.ttl = ttl
+        self.max_items = max_items
+        self.max_pending = max_pending
+        self.max_share = max_share
+        self.budget = TokenBucket(rpm / 60, capacity=max(size, rpm / 60))
+        self.cache = build_cache("SWAP_POOL", ttl=ttl, maxsize=4096)
+        self.tasks = set()
+        # [lock, users] per key being taken from, so concurrent swaps of the
+        # same activity never pop the same alternative
+        self.locks = {}
+
+    @classmethod
+    def from_env(cls) -> "SwapPool":
+        """Read SWAP_POOL_SIZE, SWAP_POOL_TTL, SWAP_POOL_RPM, SWAP_POOL_MAX_ITEMS, SWAP_POOL_MAX_PENDING and SWAP_POOL_MAX_SHARE"""
+        return cls(
+            size=int(os.getenv("SWAP_POOL_SIZE", 2)),
+            ttl=float(os.getenv("SWAP_POOL_TTL", 1800)),
+            rpm=float(os.getenv("SWAP_POOL_RPM", 30)),
+            max_items=int(os.getenv("SWAP_POOL_MAX_ITEMS", 8)),
+            max_pending=int(os.getenv("SWAP_POOL_MAX_PENDING", 4)),
+            max_share=float(os.getenv("SWAP_POOL_MAX_SHARE", 0.5)),
+        )
+
+    @staticmethod
+    def key(city: str, item: ItineraryItem, group=None, uniqueness=None) -> str:
+        return cache_key(
+            "swap_pool",
+            normalize_text(city),
+            normalize_text(item.title),
+            item.start,
+            item.end,
+            group,
+            uniqueness,
+        )
+
+    def schedule(
+        self, generator, city: str, itinerary: FullItinerary, cookie_data: dict
+    ) -> Optional[asyncio.Task]:
+        """Start filling the pool for an itinerary in the background, unless busy"""
+        if not _enabled() or self.cache is None:
+            return None
+        if len(self.tasks) >= self.max_pending:
+            SWAP_POOL_EVENTS.inc(event="skipped")
+            return None
+
+        async def run():
+            try:
+                job = await get_job_queue().submit(
+                    lambda job: self.fill(generator, city, itinerary, cookie_data),
+                    priority="prefetch",
+                )
+            except SchedulerBusy:
+                SWAP_POOL_EVENTS.inc(event="skipped")
+                return
+            await job.wait()
+            if job.error is not None:
+                print(f"Error pre-generating swaps for {city}: {job.error['detail']}")
+
+        task = asyncio.ensure_future(run())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def _has_headroom(self) -> bool:
+        # interactive requests are waiting or using most slots, leave them be
+        limiter = get_scheduler().provider("openai")
+        return (
+            limiter.queued == 0
+            and limiter.in_flight < limiter.concurrency * self.max_share
+        )
+
+    async def fill(self, generator, city: str, itinerary: FullItinerary, cookie_data: dict):
+        group = cookie_data.get("group", None)
+        uniqueness = cookie_data.get("uniqueness", None)
+        activities = [item for item in itinerary.itinerary if not item.transport]
+        weather = weather_to_str(
+            await generator.get_weather(city, cookie_data.get("date", None))
+        )
+
+        for item in activities[: self.max_items]:
+            key = self.key(city, item, group, uniqueness)
+            if await self.cache.get(key):
+                continue
+
+            alternatives = []
+            for _ in range(self.size):
+                if not self._has_headroom() or not self.budget.try_acquire():
+                    SWAP_POOL_EVENTS.inc(event="skipped")
+                    break
+                try:
+                    alternative = await generator.swap_activity(
+                        activity=item,
+                        location=city,
+                        group=group,
+                        uniqueness=uniqueness,
+                        itinerary=itinerary,
+                        feedback=None,
+                        weather=weather,
+                        use_cache=False,
+                        exclude=[alt.title for alt in alternatives],
+                    )
+                except (SchedulerBusy, DeadlineExceeded) as e:
+                    print(f"Swap pool fill stopped: {e}")
+                    return
+                except Exception as e:
+                    print(f"Error pre-generating swap for {item.title}: {e}")
+                    break
+                alternatives.append(alternative)
+
+            if alternatives:
+                await self.attach_extras(generator, city, alternatives)
+                await self.store(key, [alt.model_dump() for alt in alternatives])
+                SWAP_POOL_EVENTS.inc(len(alternatives), event="generated")
+
+    async def attach_extras(self, generator, city: str, alternatives: List[ItineraryItem]):
+        """Search images and booking links for all alternatives of an item at once"""
+        titles = {i: alt.title for i, alt in enumerate(alternatives)}
+        images, links = await asyncio.gather(
+            get_n_random_places(titles),
+            get_activity_links(titles, city, perplexity_chain=generator.clients.perplexity),
+        )
+        for i, alt in enumerate(alternatives):
+            alt.image_link = images.get(i, [])
+            alt.booking_url = (links or {}).get(i, None)
+
+    async def store(self, key: str, alternatives: List[dict]):
+        entry = {"expires_at": time.time() + self.ttl, "alternatives": alternatives}
+        await self.cache.set(key, entry, ttl=self.ttl)
+
+    async def take(
+        self,
+        city: str,
+        activity: ItineraryItem,
+        itinerary: FullItinerary,
+        cookie_data: dict,
+    ) -> Optional[ItineraryItem]:
+        """
+        Remove and return a pre-generated alternative for an activity, or None.
+
+        Alternatives already in the itinerary, e.g. from an earlier swap, are
+        skipped. The returned item takes the replaced activity's id. Takes
+        of the same entry run one at a time within the process.
+        """
+        if not _enabled() or self.cache is None or activity is None:
+            return None
+
+        key = self.key(
+            city,
+            activity,
+            cookie_data.get("group", None),
+            cookie_data.get("uniqueness", None),
+        )
+        lock = self.locks.setdefault(key, [asyncio.Lock(), 0])
+        lock[1] += 1
+        try:
+            async with lock[0]:
+                return await self._take(key, activity, itinerary)
+        finally:
+            lock[1] -= 1
+            if not lock[1]:
+                del self.locks[key]
+
+    async def _take(
+        self, key: str, activity: ItineraryItem, itinerary: FullItinerary
+    ) -> Optional[ItineraryItem]:
+        # the read and the write back of the shortened list must not interleave
+        # with another take of the same key, take holds its lock
+        entry = await self.cache.get(key)
+        remaining = entry["expires_at"] - time.time() if entry else 0
+        if remaining <= 0:
+            SWAP_POOL_EVENTS.inc(event="miss")
+            return None
+
+        shown = {normalize_text(item.title) for item in itinerary.itinerary}
+        alternatives = [
+            alt for alt in entry["alternatives"] if normalize_text(alt["title"]) not in shown
+        ]
+        if not alternatives:
+            SWAP_POOL_EVENTS.inc(event="miss")
+            return None
+
+        chosen = alternatives.pop(0)
+        # keep the original expiry, consuming must not extend an entry's life
+        await self.cache.set(
+            key, {"expires_at": entry["expires_at"], "alternatives": alternatives}, ttl=remaining
+        )
+        SWAP_POOL_EVENTS.inc(event="hit")
+        return ItineraryItem(**{**chosen, "id": activity.id})
+
+    async def aclose(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+
+@lru_cache(maxsize=None)
+def get_swap_pool() -> SwapPool:
+    """Process-wide swap pool, enabled with SWAP_POOL_ENABLED=true"""
+    return SwapPool.from_env()
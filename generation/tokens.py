@@ -0,0 +1,45 @@
+from functools import lru_cache
+
+import tiktoken
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """
+    Return the tiktoken encoding for a model, or None when it cannot be loaded.
+
+    tiktoken downloads encodings on first use, which fails in offline
+    environments, so callers fall back to an estimate instead of failing.
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """
+    Count the tokens of a text for the given model.
+
+    Args:
+        text: Text to measure
+        model: Model whose tokenizer should be used
+
+    Returns:
+        int: Exact token count, or an estimate of 4 characters per token if the
+             tokenizer is unavailable
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def count_message_tokens(messages, model: str = "gpt-4o-mini") -> int:
+    """Count the prompt tokens of a list of chat messages, including per-message overhead"""
+    return sum(count_tokens(str(message.content), model) + 4 for message in messages)
@@ -0,0 +1,98 @@
+import re
+from typing import Optional
+from .generation_models import ItineraryItem, SimpleItineraryItem, Theme, TransportMode
+from .utils import minutes_between, normalize_text
+
+# (flat fare, fare per minute) in GBP, like every item price, for each mode of
+# transport in the cities whose fares are known
+TRANSPORT_PRICES = {
+    "london": {
+        TransportMode.TUBE: (2.80, 0.0),
+        TransportMode.WALKING: (0.0, 0.0),
+        TransportMode.BUS: (1.75, 0.0),
+        TransportMode.TAXI: (3.80, 0.90),
+        TransportMode.TRAIN: (4.00, 0.15),
+        TransportMode.FERRY: (4.50, 0.05),
+        TransportMode.DEFAULT: (0.0, 0.0),
+    },
+}
+
+TRANSPORT_DESCRIPTIONS = {
+    TransportMode.TUBE: "Hop on the metro for a quick {duration} minute ride.",
+    TransportMode.WALKING: "A {duration} minute walk, a great chance to soak up the streets on foot.",
+    TransportMode.BUS: "Grab a seat on the bus for about {duration} minutes.",
+    TransportMode.TAXI: "Jump in a taxi for an easy {duration} minute ride.",
+    TransportMode.TRAIN: "Take the train, it's around {duration} minutes.",
+    TransportMode.FERRY: "Enjoy the views from the ferry on this {duration} minute crossing.",
+    TransportMode.DEFAULT: "Allow about {duration} minutes to get to your next stop.",
+}
+
+# keywords used to recover the mode from a title when the LLM left it as N/A
+TRANSPORT_KEYWORDS = [
+    (TransportMode.TUBE, r"\b(tube|underground|metro|subway|overground|dlr)\b"),
+    (TransportMode.WALKING, r"\b(walk|walking|stroll|on foot)\b"),
+    (TransportMode.BUS, r"\bbus\b"),
+    (TransportMode.TAXI, r"\b(taxi|cab|uber)\b"),
+    (TransportMode.TRAIN, r"\b(train|rail)\b"),
+    (TransportMode.FERRY, r"\b(ferry|boat|clipper)\b"),
+]
+
+
+def infer_transport_mode(item: SimpleItineraryItem) -> TransportMode:
+    if item.transportMode != TransportMode.DEFAULT:
+        return item.transportMode
+
+    title = item.title.lower()
+    for mode, pattern in TRANSPORT_KEYWORDS:
+        if re.search(pattern, title):
+            return mode
+    return TransportMode.DEFAULT
+
+
+def transport_price(
+    mode: TransportMode, duration: int, location: str = None
+) -> Optional[float]:
+    """Fare of a step, free on foot, None in a city without known fares"""
+    if mode == TransportMode.WALKING:
+        return 0.0
+    fares = TRANSPORT_PRICES.get(normalize_text(location or ""))
+    if fares is None:
+        return None
+    flat_fare, per_minute = fares[mode]
+    return round(flat_fare + per_minute * duration, 2)
+
+
+def build_transport_item(item: SimpleItineraryItem, location: str = None) -> dict:
+    """
+    Build the details of a transport step locally instead of with an LLM call.
+
+    Args:
+        item: A skeleton item marked as transport
+        location: City of the itinerary, the price is left unset when its
+            fares are not in TRANSPORT_PRICES
+
+    Returns:
+        dict: The ItineraryItem fields, like Generator.generate_item_details
+    """
+    mode = infer_transport_mode(item)
+    duration = minutes_between(item.start, item.end) or 0
+
+    return ItineraryItem(
+        title=item.title,
+        transport=True,
+        start=item.start,
+        end=item.end,
+        description=TRANSPORT_DESCRIPTIONS[mode].format(duration=duration),
+        price=transport_price(mode, duration, location),
+        theme=Theme.ADVENTURE,
+        transportMode=mode.value,
+        requires_booking=False,
+        booking_url=None,
+        weather=None,
+        temperature=None,
+        image_link=[],
+        duration=duration,
+        id=item.id,
+        latitude=None,
+        longitude=None,
+    ).model_dump()
@@ -1,5 +1,18 @@
+import os
+import re
+from typing import List, Optional
 from .generation_models import FullItinerary, ItineraryItem
 
+_TIME_PATTERN = re.compile(
+    r"(?P<hour>\d{1,2})(?:[:.](?P<minute>\d{2}))?(?::\d{2})?\s*(?P<meridiem>[ap]\.?m\.?)?",
+    re.IGNORECASE,
+)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so equivalent inputs share cache keys"""
+    return " ".join(str(text).lower().split())
+
 
 def get_activity_from_id(itinerary: FullItinerary, activityId: int) -> ItineraryItem:
     items = itinerary.itinerary
@@ -24,10 +37,163 @@ def swap_activity(
     return itinerary
 
 
-def weather_to_str(weather) -> str:
+def compact_enabled() -> bool:
+    """Whether prompts use the compact encodings, PROMPT_ENCODING=full restores the originals"""
+    return os.getenv("PROMPT_ENCODING", "compact").lower() != "full"
+
+
+def weather_to_str(weather, collapse: Optional[bool] = None) -> str:
+    """
+    Hourly weather as prompt text.
+
+    Consecutive hours with the same conditions are collapsed into one range
+    with its temperature span, e.g. "07:00-11:00: Sunny 12-15°C", unless
+    collapse is False or PROMPT_ENCODING=full.
+    """
     if weather is None:
         return None
-    return " ".join(
-        f"{entry['time']}: {entry['weather'].strip()} {entry['temperature']}°C"
-        for entry in weather
-    )
+    if collapse is None:
+        collapse = compact_enabled()
+    if not collapse:
+        return " ".join(
+            f"{entry['time']}: {entry['weather'].strip()} {entry['temperature']}°C"
+            for entry in weather
+        )
+
+    runs = []
+    for entry in weather:
+        condition = entry["weather"].strip()
+        if runs and runs[-1]["weather"] == condition:
+            runs[-1]["end"] = entry["time"]
+            runs[-1]["temperatures"].append(entry["temperature"])
+        else:
+            runs.append(
+                {
+                    "start": entry["time"],
+                    "end": entry["time"],
+                    "weather": condition,
+                    "temperatures": [entry["temperature"]],
+                }
+            )
+
+    parts = []
+    for run in runs:
+        hours = run["start"] if run["start"] == run["end"] else f"{run['start']}-{run['end']}"
+        low, high = min(run["temperatures"]), max(run["temperatures"])
+        temperature = f"{low}" if low == high else f"{low}-{high}"
+        parts.append(f"{hours}: {run['weather']} {temperature}°C")
+    return ", ".join(parts)
+
+
+def parse_time(value: str) -> Optional[int]:
+    """
+    Parse the time of day out of the formats the LLM produces for start and end.
+
+    Accepts e.g. "10:00", "9:30 AM", "7pm", "2025-03-04 10:00" and "2025-03-04T10:00:00".
+
+    Args:
+        value: A time or datetime string
+
+    Returns:
+        int: Minutes since midnight, or None if no time could be found
+    """
+    if not value:
+        return None
+
+    # drop a leading date so its digits are not mistaken for the hour
+    value = re.sub(r"^\s*\d{4}-\d{2}-\d{2}[T ]?", "", str(value))
+    match = _TIME_PATTERN.search(value)
+    if match is None:
+        return None
+
+    hour = int(match.group("hour"))
+    minute = int(match.group("minute") or 0)
+    meridiem = (match.group("meridiem") or "").lower()
+    if meridiem.startswith("p") and hour < 12:
+        hour += 12
+    elif meridiem.startswith("a") and hour == 12:
+        hour = 0
+
+    if hour > 24 or minute > 59:
+        return None
+    return (hour * 60 + minute) % (24 * 60)
+
+
+def minutes_between(start: str, end: str) -> Optional[int]:
+    """Minutes from start to end, wrapping past midnight, or None if either is unparseable"""
+    start_minutes, end_minutes = parse_time(start), parse_time(end)
+    if start_minutes is None or end_minutes is None:
+        return None
+    return (end_minutes - start_minutes) % (24 * 60)
+
+
+def format_time(minutes: int) -> str:
+    """Minutes since midnight as "HH:MM", wrapping past midnight"""
+    minutes = int(minutes) % (24 * 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+# [start, end) minutes since midnight of each part of the day a user can pick
+TIME_OF_DAY_WINDOWS = {
+    "morning": (7 * 60, 12 * 60),
+    "afternoon": (12 * 60, 17 * 60),
+    "evening": (17 * 60, 24 * 60),
+}
+DAY_MINUTES = 24 * 60
+# starts before this belong to the night before, e.g. a 00:30 club after dinner
+LATE_NIGHT_MINUTES = 4 * 60
+
+
+def night_minutes(minutes: Optional[int]) -> Optional[int]:
+    """Minutes since midnight, with the small hours counted on past DAY_MINUTES"""
+    if minutes is not None and minutes % DAY_MINUTES < LATE_NIGHT_MINUTES:
+        return minutes % DAY_MINUTES + DAY_MINUTES
+    return minutes
+
+
+def time_of_day(minutes: Optional[int]) -> Optional[str]:
+    """
+    The part of the day a time falls in. The small hours are the end of the
+    evening, the rest of the night before the morning counts as morning.
+    """
+    if minutes is None:
+        return None
+    minutes = night_minutes(minutes)
+    for name, (start, end) in TIME_OF_DAY_WINDOWS.items():
+        if start <= minutes < end:
+            return name
+    return "morning" if minutes < 7 * 60 else "evening"
+
+
+def venue_key(item) -> str:
+    """Normalized name of the venue an itinerary item takes place at"""
+    return normalize_text(item.imageTag or item.title)
+
+
+def repeated_days(summaries) -> List[int]:
+    """Indexes of the trip days that visit a venue of an earlier day"""
+    seen = set()
+    repeated = []
+    for day, summary in enumerate(summaries):
+        venues = {venue_key(item) for item in summary.itinerary if not item.transport}
+        if venues & seen:
+            repeated.append(day)
+        seen |= venues
+    return repeated
+
+
+def drop_repeated_venues(summaries):
+    """Remove the items of each day that visit a venue of an earlier day, in place"""
+    seen = set()
+    for summary in summaries:
+        venues = set()
+        kept = []
+        for item in summary.itinerary:
+            if not item.transport:
+                if venue_key(item) in seen:
+                    continue
+                venues.add(venue_key(item))
+            kept.append(item)
+        summary.itinerary = kept
+        seen |= venues
+    return summaries
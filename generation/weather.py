@@ -0,0 +1,206 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import httpx
+
+from .cache import CacheBackend, build_cache
+from .scheduler import SchedulerBusy, get_scheduler
+from .singleflight import SingleFlight
+from .utils import normalize_text
+
+WEATHER_URL = "http://api.weatherapi.com/v1/forecast.json"
+
+# WeatherAPI allows forecast up to 14 days
+FORECAST_DAYS = 14
+
+_shared_client = None
+
+
+def get_shared_client() -> httpx.AsyncClient:
+    """Return the process wide pooled HTTP client used for weather lookups"""
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        _shared_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _shared_client
+
+
+@lru_cache(maxsize=None)
+def get_shared_cache() -> Optional[CacheBackend]:
+    """
+    Return the process wide forecast cache, keyed by normalized location.
+
+    Configured like the other caches through WEATHER_CACHE_*, so worker
+    processes can share forecasts; None when WEATHER_CACHE_BACKEND=none.
+    """
+    return build_cache("WEATHER", ttl=3600, maxsize=512)
+
+
+def filter_hours(hourly_data: List[dict]) -> List[dict]:
+    """
+    Reduce WeatherAPI hourly entries to the hours we show in an itinerary.
+
+    Args:
+        hourly_data: The "hour" list of a WeatherAPI forecast day
+
+    Returns:
+        list: List of dictionaries containing hourly weather data from 7am to midnight
+              Each dict has keys: time (str), weather (str), temperature (int)
+    """
+    filtered_hours = []
+    for hour_entry in hourly_data:
+        # WeatherAPI times are always "YYYY-MM-DD HH:MM", slicing avoids strptime
+        hour_time = hour_entry["time"][-5:]
+        hour = int(hour_time[:2])
+
+        if 7 <= hour <= 23:  # From 7am to midnight (23:00)
+            filtered_hours.append(
+                {
+                    "time": hour_time,  # Format as HH:MM
+                    "weather": hour_entry["condition"]["text"],
+                    "temperature": int(
+                        round(hour_entry["temp_c"])
+                    ),  # Round to nearest integer
+                }
+            )
+
+    return filtered_hours
+
+
+class WeatherService:
+    """
+    Async WeatherAPI client with a TTL cache of whole forecasts.
+
+    A single lookup fetches the full 14 day forecast for a location, so every
+    later date for the same location is served from the cache.
+
+    Args:
+        api_key: WeatherAPI key. Lookups return None when it is missing
+        client: Pooled HTTP client, defaults to the shared client
+        cache: Forecast cache, defaults to the shared cache
+        url: Forecast endpoint
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        cache: Optional[CacheBackend] = None,
+        url: str = WEATHER_URL,
+    ):
+        self.api_key = api_key
+        self.url = url
+        self._client = client
+        self.cache = cache if cache is not None else get_shared_cache()
+        self.flights = SingleFlight()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client if self._client is not None else get_shared_client()
+
+    async def get_forecast(self, location: str) -> Optional[Dict[str, List[dict]]]:
+        """
+        Fetches the full forecast for a location, using the cache when possible.
+
+        Args:
+            location (str): The location to get weather for
+
+        Returns:
+            dict: Mapping of date (YYYY-MM-DD) to filtered hourly weather, or None on error
+        """
+        key = normalize_text(location)
+        forecast = await self.cache.get(key) if self.cache is not None else None
+        if forecast is not None:
+            return forecast
+
+        # concurrent misses for the same location share one upstream fetch
+        return await self.flights.do(key, self._fetch_forecast, location, key)
+
+    async def _fetch_forecast(self, location: str, key: str):
+        params = {
+            "key": self.api_key,
+            "q": location,
+            "aqi": "no",
+            "days": FORECAST_DAYS,
+            "hour": "0-23",  # Get all hours
+        }
+
+        try:
+            async with get_scheduler().slot("weatherapi"):
+                response = await self.client.get(self.url, params=params)
+            data = response.json()
+        except (httpx.HTTPError, ValueError, SchedulerBusy) as e:
+            # weather is optional context, the itinerary is built without it
+            print(f"Error fetching weather information: {e}")
+            return None
+
+        if response.status_code != 200 or "forecast" not in data:
+            print("Error fetching weather information")
+            return None
+
+        forecast = {
+            day["date"]: filter_hours(day["hour"])
+            for day in data["forecast"]["forecastday"]
+        }
+        if self.cache is not None:
+            await self.cache.set(key, forecast)
+
+        return forecast
+
+    async def get_weather(self, location: str, date: Optional[str] = None):
+        """
+        Fetches hourly weather forecast for a given location and date.
+
+        Args:
+            location (str): The location to get weather for
+            date (str, optional): The date in YYYY-MM-DD format. Defaults to None (current day).
+
+        Returns:
+            list: List of dictionaries containing hourly weather data from 7am to midnight
+                  Each dict has keys: time (str), weather (str), temperature (int)
+        """
+        return (await self.get_weather_days(location, [date]))[date]
+
+    async def get_weather_days(
+        self, location: str, dates: List[Optional[str]]
+    ) -> Dict[Optional[str], Optional[List[dict]]]:
+        """
+        Fetches hourly weather for several dates of a trip with one forecast lookup.
+
+        Returns:
+            dict: Mapping of each date to its hourly weather as in get_weather,
+                  None for dates without a forecast
+        """
+        weather = {date: None for date in dates}
+        wanted = [date for date in dates if date is not None]
+        if not wanted:
+            return weather
+
+        if self.api_key is None:
+            print(
+                "Weather API key not found. Please set the WEATHER_API_KEY environment variable."
+            )
+            return weather
+
+        # Ensure the requested dates are within API limits (0-14 days)
+        today = datetime.now().date()
+        for date in list(wanted):
+            days_diff = (datetime.strptime(date, "%Y-%m-%d").date() - today).days
+            if days_diff < 0:
+                print("Cannot retrieve weather for past dates")
+                wanted.remove(date)
+            elif days_diff > FORECAST_DAYS:
+                wanted.remove(date)
+        if not wanted:
+            return weather
+
+        forecast = await self.get_forecast(location)
+        if forecast is None:
+            return weather
+
+        for date in wanted:
+            weather[date] = forecast.get(date)
+        return weather
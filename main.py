@@ -1,13 +1,80 @@
 import uvicorn
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
+import asyncio
+import importlib.util
 import os
-from routes import activities, itinerary, facts, swap
+import time
+from generation.catalog import get_catalog
+from generation.fact_pool import get_fact_pool
+from generation.clients import ClientRegistry
+from generation.generation import Generator
+from generation.jobs import get_job_queue
+from generation.deadline import DeadlineExceeded
+from generation.metrics import REQUEST_LATENCY
+from generation.scheduler import SchedulerBusy
+from generation.swap_pool import get_swap_pool
+from routes import activities, itinerary, jobs, facts, swap, stats, metrics
 
 load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one set of pooled outbound clients shared by every route
+    clients = ClientRegistry()
+    app.state.clients = clients
+    app.state.generator = Generator(clients)
+    # refresh stale catalog entries in the background, besides on reads
+    refresh_interval = float(os.getenv("CATALOG_REFRESH_INTERVAL", 0))
+    refresher = None
+    if refresh_interval > 0:
+        refresher = asyncio.ensure_future(
+            get_catalog().run_refresher(app.state.generator, refresh_interval)
+        )
+    yield
+    if refresher is not None:
+        refresher.cancel()
+    await get_job_queue().aclose()
+    await get_catalog().aclose()
+    await get_fact_pool().aclose()
+    await get_swap_pool().aclose()
+    await clients.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(SchedulerBusy)
+async def scheduler_busy_handler(request: Request, exc: SchedulerBusy):
+    # shed load instead of queueing without bound behind a saturated provider
+    return JSONResponse(
+        status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"}
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # label by route template so path parameters do not explode the series
+    route = request.scope.get("route")
+    REQUEST_LATENCY.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    )
+    return response
+
 
 # Allow CORS for the React app's origin
 app.add_middleware(
@@ -26,8 +93,39 @@ app.add_middleware(
 # Include routers
 app.include_router(activities.router)
 app.include_router(itinerary.router)
+app.include_router(jobs.router)
 app.include_router(facts.router)
 app.include_router(swap.router)
+app.include_router(stats.router)
+app.include_router(metrics.router)
+
+
+def serve():
+    """
+    Run the API with WEB_CONCURRENCY worker processes (default 1).
+
+    uvicorn picks uvloop and httptools when they are installed. With more
+    than one worker, caches default to the memory + SQLite tier every worker
+    shares (CACHE_SHARED) and each worker takes an equal share of the
+    provider rate limits.
+    """
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        # workers inherit the environment, so set this before they start
+        os.environ.setdefault("CACHE_SHARED", "true")
+
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    print(f"Serving with {workers} worker(s), loop={loop}, http={http}")
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", 8000)),
+        workers=workers,
+        loop=loop,
+        http=http,
+    )
+
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    serve()
@@ -1,5 +1,8 @@
-from fastapi import APIRouter, Response
+from fastapi import APIRouter, Depends, Response
+from .dependencies import get_deadline, get_generator
 from .request_models import ActivityRequest
+from generation.catalog import CityCatalog, get_catalog
+from generation.deadline import Deadline
 from generation.generation import Generator
 from generation.image_searcher import get_n_random_places
 import asyncio
@@ -7,11 +10,16 @@ import json
 from datetime import timedelta
 
 router = APIRouter()
-generator = Generator()
 
 
 @router.post("/activities")
-async def get_activities(request: ActivityRequest, response: Response):
+async def get_activities(
+    request: ActivityRequest,
+    response: Response,
+    generator: Generator = Depends(get_generator),
+    deadline: Deadline = Depends(get_deadline),
+    catalog: CityCatalog = Depends(get_catalog),
+):
     # Unpack request parameters
     city = request.city
     timeOfDay = request.timeOfDay
@@ -31,9 +39,57 @@ async def get_activities(request: ActivityRequest, response: Response):
         samesite="None",
     )
 
+    # popular cities are served from the pre-generated catalog
+    activities = await catalog.sample_activities(
+        generator, city, group, uni, timeOfDay=timeOfDay
+    )
+    if activities is not None:
+        return {"activities": activities, "skipped": []}
+
+    if generator.streaming:
+        # start each image search as soon as its title has been generated
+        activity_titles = []
+        image_tasks = []
+        try:
+            async for title in generator.stream_activity_titles(
+                city, timeOfDay=timeOfDay, group=group, uniqueness=uni, deadline=deadline
+            ):
+                activity_titles.append(title.model_dump())
+                image_tasks.append(
+                    asyncio.ensure_future(
+                        get_n_random_places({title.id: title.title}, deadline)
+                    )
+                )
+
+            activity_response, image_results = await asyncio.gather(
+                generator.generate_activities(
+                    city,
+                    titles=activity_titles,
+                    timeOfDay=timeOfDay,
+                    group=group,
+                    uniqueness=uni,
+                    deadline=deadline,
+                ),
+                asyncio.gather(*image_tasks),
+            )
+        finally:
+            # a failed stage must not leave image searches holding DDG slots
+            for task in image_tasks:
+                task.cancel()
+        image_dict = {k: v for result in image_results for k, v in result.items()}
+        return {
+            "activities": attach_images(activity_response, image_dict),
+            "skipped": deadline.skipped,
+        }
+
     # Activity titles is a list of string representing different activity titles
     activity_titles = await generator.generate_activities(
-        city, titles_only=True, timeOfDay=timeOfDay, group=group, uniqueness=uni
+        city,
+        titles_only=True,
+        timeOfDay=timeOfDay,
+        group=group,
+        uniqueness=uni,
+        deadline=deadline,
     )
     titles_dict = {item["id"]: item["title"] for item in activity_titles}
 
@@ -44,12 +100,20 @@ async def get_activities(request: ActivityRequest, response: Response):
             timeOfDay=timeOfDay,
             group=group,
             uniqueness=uni,
+            deadline=deadline,
         ),
-        get_n_random_places(titles_dict),
+        get_n_random_places(titles_dict, deadline),
     )
 
+    return {
+        "activities": attach_images(activity_response, image_dict),
+        "skipped": deadline.skipped,
+    }
+
+
+def attach_images(activity_response, image_dict):
     # update images in response
     for item in activity_response:
         item["image_link"] = image_dict.get(item["id"], [])
 
-    return {"activities": activity_response}
+    return activity_response
@@ -0,0 +1,20 @@
+from typing import Optional
+from fastapi import Header, Request
+from generation.clients import ClientRegistry
+from generation.deadline import Deadline
+from generation.generation import Generator
+
+
+def get_clients(request: Request) -> ClientRegistry:
+    """Outbound clients created by the application lifespan in main.py"""
+    return request.app.state.clients
+
+
+def get_generator(request: Request) -> Generator:
+    """Generator sharing the application's outbound clients"""
+    return request.app.state.generator
+
+
+def get_deadline(x_request_deadline: Optional[str] = Header(None)) -> Deadline:
+    """Time budget in seconds from the X-Request-Deadline header or REQUEST_DEADLINE_SECONDS"""
+    return Deadline.from_header(x_request_deadline)
@@ -1,14 +1,32 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from generation.catalog import CityCatalog, get_catalog
+from generation.deadline import Deadline
+from generation.fact_pool import FACTS_PER_CALL, FactPool, get_fact_pool
 from generation.generation import Generator
+from .dependencies import get_deadline, get_generator
 
 
 router = APIRouter()
-generator = Generator()
 
 
 @router.get("/facts")
-async def get_facts(location: str, num: int):
-    # Get facts for the location
-    facts = await generator.generate_facts(location, num)
+async def get_facts(
+    location: str,
+    num: int,
+    generator: Generator = Depends(get_generator),
+    deadline: Deadline = Depends(get_deadline),
+    catalog: CityCatalog = Depends(get_catalog),
+    fact_pool: FactPool = Depends(get_fact_pool),
+):
+    # Get facts for the location, from memory unless its pool is cold
+    facts = fact_pool.sample(generator, location, num)
+    if facts is not None:
+        return {"facts": facts}
 
-    return {"facts": facts}
+    # seed the pool from the catalog for popular cities, else generate live
+    seed = await catalog.sample_facts(generator, location, fact_pool.size)
+    if seed is None:
+        # a full call's worth of facts costs the same round trip and seeds the pool
+        seed = await generator.generate_facts(location, FACTS_PER_CALL, deadline=deadline)
+    fact_pool.add(location, seed)
+    return {"facts": fact_pool.sample(generator, location, num) or seed}
@@ -1,66 +1,436 @@
-from fastapi import APIRouter, Cookie
+from fastapi import APIRouter, Cookie, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from .dependencies import get_deadline, get_generator
 from .request_models import ItineraryRequest
+from generation.deadline import Deadline, DeadlineExceeded
 from generation.generation import Generator
+from generation.generation_models import FullItinerary, ItinerarySummary
 from generation.image_searcher import get_n_random_places
+from generation.route_planner import plan_route
+from generation.schedule import solve_schedule
+from generation.scheduler import SchedulerBusy
+from generation.swap_pool import SwapPool, get_swap_pool
 from generation.activity_links import get_activity_links
 from generation.utils import weather_to_str
+from datetime import date as Date, timedelta
 import asyncio
 import json
 
 router = APIRouter()
-generator = Generator()
 
 
-@router.post("/itinerary")
-async def get_itinerary(request: ItineraryRequest, searchConfig: str = Cookie(None)):
-    # Unpack request parameters
-    city = request.city
-    preferences = request.preferences
-    itinerary = request.itinerary
-    feedback = request.feedback
-
+def load_search_config(searchConfig: str) -> dict:
     # Look for cookie data on search parameters
     try:
-        cookie_data = json.loads(searchConfig)
+        return json.loads(searchConfig)
     except Exception:
         print("No cookie data found")
-        cookie_data = {}
+        return {}
+
+
+async def iter_summary(
+    generator: Generator,
+    request: ItineraryRequest,
+    cookie_data: dict,
+    weather: str,
+    deadline: Deadline = None,
+):
+    """Yield the itinerary skeleton items, streamed from the LLM when streaming is enabled"""
+    kwargs = dict(
+        timeOfDay=cookie_data.get("timeOfDay", None),
+        group=cookie_data.get("group", None),
+        preferences=request.preferences,
+        uniqueness=cookie_data.get("uniqueness", None),
+        prior_itinerary=request.itinerary,
+        feedback=request.feedback,
+        weather=weather,
+        deadline=deadline,
+    )
+
+    if generator.streaming:
+        async for item in generator.stream_itinerary(request.city, **kwargs):
+            yield item
+    else:
+        itinerary_response = await generator.generate_itinerary(request.city, **kwargs)
+        for item in itinerary_response.itinerary:
+            yield item
 
-    timeOfDay = cookie_data.get("timeOfDay", None)
+
+async def itinerary_events(
+    generator: Generator,
+    request: ItineraryRequest,
+    cookie_data: dict,
+    deadline: Deadline = None,
+):
+    """
+    Run the itinerary pipeline and yield (event, data) pairs as each stage produces output.
+
+    Detail generation and image search for an item start as soon as the item
+    appears in the skeleton, while the rest of the skeleton is still generating.
+
+    Events, in the order they become available:
+        summary: {"itinerary": [SimpleItineraryItem, ...]} skeleton of the day
+        item: a detailed ItineraryItem, sent as soon as its own generation finishes
+        patch: {"id", "image_link"} or {"id", "booking_url"} to merge into an item
+        error: {"stage", "detail"} when the details, images or links stage failed,
+            with "status": 503 when the stage was shed by the outbound scheduler
+            or 504 when it ran out of time
+        skipped: {"stages"} optional stages cut off by the deadline, sent last
+
+    Weather, images and booking links are optional and are cut off when the
+    deadline runs out, the skeleton and details must finish within it.
+    """
+    city = request.city
     group = cookie_data.get("group", None)
-    uni = cookie_data.get("uniqueness", None)
-    date = cookie_data.get("date", None)
+    if deadline is None:
+        deadline = Deadline()
 
     # Get weather before generating itinerary
-    weather = weather_to_str(generator.get_weather(city, date))
+    weather = weather_to_str(
+        await generator.get_weather(city, cookie_data.get("date", None), deadline)
+    )
+
+    queue = asyncio.Queue()
+    item_feed = asyncio.Queue()
+    tasks = []
+
+    async def feed_items():
+        while True:
+            item = await item_feed.get()
+            if item is None:
+                return
+            yield item
+
+    async def stream_items():
+        async for item in generator.iter_itinerary_details(
+            feed_items(), city, group, weather, deadline=deadline
+        ):
+            await queue.put(("item", item))
+
+    async def stream_image(item_id, image_tag):
+        image_dict = await get_n_random_places({item_id: image_tag}, deadline)
+        await queue.put(
+            ("patch", {"id": item_id, "image_link": image_dict.get(item_id, [])})
+        )
+
+    async def stream_links(titles_dict):
+        activity_links = (
+            await get_activity_links(
+                titles_dict,
+                city,
+                perplexity_chain=generator.clients.perplexity,
+                deadline=deadline,
+            )
+            or {}
+        )
+        for item_id in titles_dict:
+            await queue.put(
+                ("patch", {"id": item_id, "booking_url": activity_links.get(item_id)})
+            )
+
+    async def run(stage, fn, *args):
+        try:
+            await fn(*args)
+        except Exception as e:
+            error = {"stage": stage, "detail": str(e)}
+            if isinstance(e, SchedulerBusy):
+                error["status"] = 503
+            elif isinstance(e, DeadlineExceeded):
+                error["status"] = 504
+            await queue.put(("error", error))
+        finally:
+            await queue.put(None)
+
+    def start(stage, fn, *args):
+        tasks.append(asyncio.ensure_future(run(stage, fn, *args)))
+
+    try:
+        start("details", stream_items)
+
+        summary_items = []
+        async for item in iter_summary(
+            generator, request, cookie_data, weather, deadline
+        ):
+            summary_items.append(item)
+            item_feed.put_nowait(item)
+            start("images", stream_image, item.id, item.imageTag)
+        item_feed.put_nowait(None)
+
+        yield "summary", ItinerarySummary(itinerary=summary_items).model_dump()
+
+        # transport steps have nothing to book
+        start(
+            "links",
+            stream_links,
+            {item.id: item.imageTag for item in summary_items if not item.transport},
+        )
+
+        remaining = len(tasks)
+        while remaining:
+            message = await queue.get()
+            if message is None:
+                remaining -= 1
+                continue
+            yield message
+
+        if deadline.skipped:
+            yield "skipped", {"stages": deadline.skipped}
+    finally:
+        # stop outstanding work if the consumer went away
+        for task in tasks:
+            task.cancel()
+
+
+def trip_dates(start: str, days: int) -> list:
+    """Consecutive YYYY-MM-DD dates from start, or today when start is None"""
+    first = Date.fromisoformat(start) if start else Date.today()
+    return [(first + timedelta(days=i)).isoformat() for i in range(days)]
+
+
+async def build_trip(
+    generator: Generator,
+    request: ItineraryRequest,
+    cookie_data: dict,
+    deadline: Deadline = None,
+    on_event=None,
+) -> dict:
+    """
+    Build a multi-day itinerary and return {"days": [{"date", "itinerary"}], "skipped"}.
 
-    # Get itinerary response and titles
-    itinerary_response = await generator.generate_itinerary(
+    The weather of every day comes from one forecast lookup and the day
+    skeletons are generated concurrently without repeating venues. Details,
+    images and booking links of all days then run as one fan-out, so the
+    trip takes about as long as a single day. Item ids are unique across days.
+    """
+    if deadline is None:
+        deadline = Deadline()
+    city = request.city
+    group = cookie_data.get("group", None)
+    time_of_day = cookie_data.get("timeOfDay", None)
+
+    try:
+        dates = trip_dates(cookie_data.get("date", None), request.days)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid date in searchConfig")
+    forecast = await generator.get_weather_days(city, dates, deadline)
+    weather = [weather_to_str(forecast.get(date)) for date in dates]
+
+    summaries = await generator.generate_trip(
         city,
-        timeOfDay,
-        group,
-        preferences=preferences,
-        uniqueness=uni,
-        prior_itinerary=itinerary,
-        feedback=feedback,
-        weather=weather,
+        request.days,
+        weather,
+        deadline=deadline,
+        timeOfDay=time_of_day,
+        group=group,
+        preferences=request.preferences,
+        uniqueness=cookie_data.get("uniqueness", None),
     )
-    titles_dict = {item.id: item.imageTag for item in itinerary_response.itinerary}
+    items = [item for summary in summaries for item in summary.itinerary]
+    for item_id, item in enumerate(items, start=1):
+        item.id = item_id
+    if on_event is not None:
+        for date, summary in zip(dates, summaries):
+            on_event("summary", {"date": date, **summary.model_dump()})
 
-    # Get itinerary details and images
-    detailed_itinerary, image_dict, activity_links = await asyncio.gather(
-        generator.generate_itinerary_details(itinerary_response, city, group, weather),
-        get_n_random_places(titles_dict),  # This will run concurrently
-        get_activity_links(titles_dict, city),
+    details, images, links = await asyncio.gather(
+        asyncio.gather(
+            *(
+                generator.generate_itinerary_details(
+                    summary, city, group, day_weather, deadline=deadline
+                )
+                for summary, day_weather in zip(summaries, weather)
+            )
+        ),
+        get_n_random_places({item.id: item.imageTag for item in items}, deadline),
+        # transport steps have nothing to book
+        get_activity_links(
+            {item.id: item.imageTag for item in items if not item.transport},
+            city,
+            perplexity_chain=generator.clients.perplexity,
+            deadline=deadline,
+        ),
+        return_exceptions=True,
     )
+    if isinstance(details, (SchedulerBusy, DeadlineExceeded)):
+        raise details
+    if isinstance(details, Exception):
+        raise HTTPException(status_code=502, detail=str(details))
+    images = images if isinstance(images, dict) else {}
+    links = links if isinstance(links, dict) else {}
+
+    days = []
+    next_id = len(items) + 1
+    for date, day_details in zip(dates, details):
+        for item in day_details:
+            item["image_link"] = images.get(item["id"], [])
+            item["booking_url"] = links.get(item["id"], None)
+        if generator.solve_schedules:
+            day_details = solve_schedule(day_details, time_of_day, deadline)
+        if generator.plan_routes:
+            # legs added to one day must not reuse the ids of another
+            day_details = plan_route(day_details, next_id, city)
+            next_id = max([next_id - 1] + [item["id"] for item in day_details]) + 1
+        days.append({"date": date, "itinerary": day_details})
+    return {"days": days, "skipped": deadline.skipped}
+
 
-    # update images in response
+async def build_itinerary(
+    generator: Generator,
+    request: ItineraryRequest,
+    cookie_data: dict,
+    deadline: Deadline = None,
+    on_event=None,
+) -> dict:
+    """
+    Run the itinerary pipeline to completion and return the /itinerary body,
+    or the build_trip body when more than one day is requested.
+
+    on_event(event, data), if given, sees every event of itinerary_events as
+    it happens, which lets a job report progress.
+    """
+    if request.days > 1:
+        if request.itinerary is not None or request.feedback:
+            raise HTTPException(
+                status_code=422,
+                detail="Regenerating from a prior itinerary is only supported for one day",
+            )
+        return await build_trip(generator, request, cookie_data, deadline, on_event)
+
+    if deadline is None:
+        deadline = Deadline()
+
+    order = {}
+    detailed_itinerary = []
+    patches = {}
+    async for event, data in itinerary_events(
+        generator, request, cookie_data, deadline
+    ):
+        if on_event is not None:
+            on_event(event, data)
+        if event == "summary":
+            order = {item["id"]: i for i, item in enumerate(data["itinerary"])}
+        elif event == "item":
+            detailed_itinerary.append(data)
+        elif event == "patch":
+            patch = dict(data)
+            patches.setdefault(patch.pop("id"), {}).update(patch)
+        elif event == "error" and data["stage"] == "details":
+            raise HTTPException(
+                status_code=data.get("status", 502), detail=data["detail"]
+            )
+
+    # update images and booking links in response
     for item in detailed_itinerary:
-        item["image_link"] = image_dict.get(item["id"], [])
-        if activity_links is not None:
-            item["booking_url"] = activity_links.get(item["id"], None)
-        else:
-            item["booking_url"] = None
-
-    # ensure item sorted by start
-    return {"itinerary": detailed_itinerary}
+        patch = patches.get(item["id"], {})
+        item["image_link"] = patch.get("image_link", [])
+        item["booking_url"] = patch.get("booking_url", None)
+
+    # keep the order of the skeleton, items complete out of order
+    detailed_itinerary.sort(key=lambda item: order.get(item["id"], len(order)))
+
+    # with SCHEDULE_SOLVER=true items are sorted by start and their times made
+    # consistent, otherwise they keep the skeleton order and the LLM's times
+    if generator.solve_schedules:
+        detailed_itinerary = solve_schedule(
+            detailed_itinerary, cookie_data.get("timeOfDay", None), deadline
+        )
+        if on_event is not None:
+            on_event("schedule", {"itinerary": detailed_itinerary})
+
+    if generator.plan_routes:
+        detailed_itinerary = plan_route(detailed_itinerary, location=request.city)
+        if on_event is not None:
+            on_event("route", {"itinerary": detailed_itinerary})
+
+    return {"itinerary": detailed_itinerary, "skipped": deadline.skipped}
+
+
+@router.post("/itinerary")
+async def get_itinerary(
+    request: ItineraryRequest,
+    searchConfig: str = Cookie(None),
+    generator: Generator = Depends(get_generator),
+    deadline: Deadline = Depends(get_deadline),
+    swap_pool: SwapPool = Depends(get_swap_pool),
+):
+    cookie_data = load_search_config(searchConfig)
+    response = await build_itinerary(generator, request, cookie_data, deadline)
+
+    # pre-generate swap alternatives in the background, if enabled
+    for day in response.get("days", [response]):
+        schedule_swap_pool(swap_pool, generator, request.city, day["itinerary"], cookie_data)
+    return response
+
+
+def schedule_swap_pool(
+    swap_pool: SwapPool, generator: Generator, city: str, items: list, cookie_data: dict
+):
+    try:
+        itinerary = FullItinerary(itinerary=items)
+    except ValueError as e:
+        print(f"Not pre-generating swaps: {e}")
+        return
+    swap_pool.schedule(generator, city, itinerary, cookie_data)
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@router.post("/itinerary/stream")
+async def stream_itinerary(
+    request: ItineraryRequest,
+    searchConfig: str = Cookie(None),
+    generator: Generator = Depends(get_generator),
+    deadline: Deadline = Depends(get_deadline),
+    swap_pool: SwapPool = Depends(get_swap_pool),
+):
+    """
+    Server-Sent Events version of /itinerary, see itinerary_events for the
+    events. A failure to build the skeleton is sent as an error event with
+    stage "summary", and a final done event closes the stream. With the
+    schedule solver enabled a schedule event with the {"itinerary"} sorted
+    and with consistent times, and the "skipped" stages so far, which
+    include "schedule" when items fit in no part of the day, comes before
+    done, as does a route event with the planned {"itinerary"} with the
+    route planner enabled. Each replaces the items streamed so far.
+    """
+    cookie_data = load_search_config(searchConfig)
+    if request.days > 1:
+        raise HTTPException(
+            status_code=422, detail="Multi-day itineraries are not streamed, use /itinerary"
+        )
+
+    async def event_stream():
+        items, patches = [], {}
+        try:
+            async for event, data in itinerary_events(
+                generator, request, cookie_data, deadline
+            ):
+                if event == "item":
+                    items.append(data)
+                elif event == "patch":
+                    patches.setdefault(data["id"], {}).update(data)
+                yield sse_event(event, data)
+        except Exception as e:
+            yield sse_event("error", {"stage": "summary", "detail": str(e)})
+            return
+
+        items = [{**item, **patches.get(item["id"], {})} for item in items]
+        if generator.solve_schedules:
+            items = solve_schedule(items, cookie_data.get("timeOfDay", None), deadline)
+            yield sse_event(
+                "schedule", {"itinerary": items, "skipped": deadline.skipped}
+            )
+        if generator.plan_routes:
+            items = plan_route(items, location=request.city)
+            yield sse_event("route", {"itinerary": items})
+        yield sse_event("done", {})
+        schedule_swap_pool(swap_pool, generator, request.city, items, cookie_data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
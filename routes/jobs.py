@@ -0,0 +1,77 @@
+from typing import Optional
+from fastapi import APIRouter, Cookie, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from .dependencies import get_generator
+from .itinerary import build_itinerary, load_search_config, schedule_swap_pool, sse_event
+from .request_models import ItineraryRequest
+from generation.cache import cache_key
+from generation.deadline import Deadline
+from generation.generation import Generator
+from generation.jobs import JobQueue, get_job_queue
+from generation.swap_pool import SwapPool, get_swap_pool
+
+router = APIRouter()
+
+
+@router.post("/itinerary/jobs", status_code=202)
+async def create_itinerary_job(
+    request: ItineraryRequest,
+    searchConfig: str = Cookie(None),
+    x_request_deadline: Optional[str] = Header(None),
+    generator: Generator = Depends(get_generator),
+    swap_pool: SwapPool = Depends(get_swap_pool),
+    jobs: JobQueue = Depends(get_job_queue),
+):
+    """
+    Queue an itinerary generation and return its job id at once.
+
+    Poll GET /itinerary/jobs/{id} for the result, or follow
+    GET /itinerary/jobs/{id}/events. An identical request made while its
+    job is retained gets the same job back. Jobs queued here are always
+    interactive, the prefetch and catalog priorities are for background work.
+    """
+    cookie_data = load_search_config(searchConfig)
+
+    async def work(job):
+        # the time budget starts when a worker picks the job up, not while it waits
+        deadline = Deadline.from_header(x_request_deadline)
+        response = await build_itinerary(
+            generator, request, cookie_data, deadline, on_event=job.publish
+        )
+        for day in response.get("days", [response]):
+            schedule_swap_pool(swap_pool, generator, request.city, day["itinerary"], cookie_data)
+        return response
+
+    key = cache_key("itinerary_job", request.model_dump(mode="json"), cookie_data)
+    job = await jobs.submit(work, key=key)
+    return {"id": job.id, "status": job.status}
+
+
+@router.get("/itinerary/jobs/{job_id}")
+async def get_itinerary_job(job_id: str, jobs: JobQueue = Depends(get_job_queue)):
+    """Status of a job, with "result" (the /itinerary body) or "error" once finished"""
+    record = await jobs.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return record
+
+
+@router.get("/itinerary/jobs/{job_id}/events")
+async def itinerary_job_events(job_id: str, jobs: JobQueue = Depends(get_job_queue)):
+    """
+    Server-Sent Events of a job, from its first event on: the /itinerary/stream
+    events as they happen, then "done" with the result or "failed" with the error.
+    """
+    job = jobs.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for event, data in job.follow():
+            yield sse_event(event, data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
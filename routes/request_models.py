@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from generation.generation_models import FullItinerary
 
@@ -21,6 +21,8 @@ class ItineraryRequest(BaseModel):
     preferences: Preferences = None
     itinerary: FullItinerary = None
     feedback: str = None
+    # consecutive days starting at the searchConfig date
+    days: int = Field(1, ge=1, le=7)
 
 
 class SwapRequest(BaseModel):
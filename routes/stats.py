@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends
+from .dependencies import get_generator
+from generation.generation import Generator
+from generation.activity_links import link_cache_stats
+from generation.image_searcher import get_image_cache
+from generation.scheduler import get_scheduler
+
+router = APIRouter()
+
+
+def backend_stats(cache) -> dict:
+    return cache.stats() if cache is not None else {"backend": None}
+
+
+@router.get("/cache/stats")
+async def cache_stats(generator: Generator = Depends(get_generator)):
+    # Hit ratios of the outbound caches
+    return {
+        "llm": backend_stats(generator.cache),
+        "images": backend_stats(get_image_cache()),
+        "links": link_cache_stats(),
+    }
+
+
+@router.get("/scheduler/stats")
+async def scheduler_stats():
+    # Queue depth, in-flight calls and admission wait per outbound provider
+    return get_scheduler().stats()
@@ -1,6 +1,11 @@
-from fastapi import APIRouter, Cookie
+from fastapi import APIRouter, Cookie, Depends
+from .dependencies import get_deadline, get_generator
 from .request_models import SwapRequest
+from generation.deadline import Deadline
 from generation.generation import Generator
+from generation.route_planner import plan_route
+from generation.schedule import solve_schedule
+from generation.swap_pool import SwapPool, get_swap_pool
 from generation.utils import get_activity_from_id, swap_activity
 from generation.image_searcher import get_n_random_places
 from generation.activity_links import get_activity_links
@@ -9,11 +14,29 @@ import json
 import asyncio
 
 router = APIRouter()
-generator = Generator()
+
+
+def swap_response(
+    generator: Generator, itinerary, city: str, cookie_data: dict, deadline: Deadline
+) -> dict:
+    items = itinerary.model_dump()["itinerary"]
+    if generator.solve_schedules:
+        # the new activity keeps its own times, which may clash with its neighbours
+        items = solve_schedule(items, cookie_data.get("timeOfDay", None), deadline)
+    if generator.plan_routes:
+        # re-plan the order and legs around the new activity without the LLM
+        items = plan_route(items, location=city)
+    return {"itinerary": items, "skipped": deadline.skipped}
 
 
 @router.post("/swap")
-async def swap(request: SwapRequest, searchConfig: str = Cookie(None)):
+async def swap(
+    request: SwapRequest,
+    searchConfig: str = Cookie(None),
+    generator: Generator = Depends(get_generator),
+    deadline: Deadline = Depends(get_deadline),
+    swap_pool: SwapPool = Depends(get_swap_pool),
+):
     # Unpack request parameters
     city = request.city
     activityId = request.activityId
@@ -34,8 +57,15 @@ async def swap(request: SwapRequest, searchConfig: str = Cookie(None)):
     # get activity from itinerary
     activity = get_activity_from_id(itinerary, activityId)
 
+    # swaps without feedback can be served from pre-generated alternatives
+    if not feedback:
+        new_activity = await swap_pool.take(city, activity, itinerary, cookie_data)
+        if new_activity is not None:
+            new_itinerary = swap_activity(itinerary, activityId, new_activity)
+            return swap_response(generator, new_itinerary, city, cookie_data, deadline)
+
     # Get weather before generating activity
-    weather = weather_to_str(generator.get_weather(city, date))
+    weather = weather_to_str(await generator.get_weather(city, date, deadline))
 
     # get new activity
     new_activity = await generator.swap_activity(
@@ -46,12 +76,19 @@ async def swap(request: SwapRequest, searchConfig: str = Cookie(None)):
         itinerary=itinerary,
         feedback=feedback,
         weather=weather,
+        deadline=deadline,
     )
 
     # get image for new activity
     title_dict = {new_activity.id: new_activity.title}
     image_link, booking_link = await asyncio.gather(
-        get_n_random_places(title_dict), get_activity_links(title_dict, city)
+        get_n_random_places(title_dict, deadline),
+        get_activity_links(
+            title_dict,
+            city,
+            perplexity_chain=generator.clients.perplexity,
+            deadline=deadline,
+        ),
     )
 
     # update image in response
@@ -64,6 +101,4 @@ async def swap(request: SwapRequest, searchConfig: str = Cookie(None)):
 
     # replace old with new activity
     new_itinerary = swap_activity(itinerary, activityId, new_activity)
-    json_response = new_itinerary.model_dump()["itinerary"]
-
-    return {"itinerary": json_response}
+    return swap_response(generator, new_itinerary, city, cookie_data, deadline)
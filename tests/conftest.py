@@ -0,0 +1,4 @@
+import os
+
+# keep the city catalog in memory instead of writing cache/catalog.sqlite3
+os.environ["CATALOG_CACHE_BACKEND"] = "memory"
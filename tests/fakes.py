@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+
+
+class FakeForecastAPI:
+    """
+    Test double for the WeatherAPI forecast endpoint.
+
+    Serves a deterministic hourly forecast for every requested day and records
+    each call, so tests can assert how often the upstream was hit.
+
+    Args:
+        latency: Seconds to wait before answering each request
+        status_code: HTTP status returned for every request
+        payload: Fixed JSON body to return instead of the generated forecast
+    """
+
+    def __init__(self, latency: float = 0.0, status_code: int = 200, payload=None):
+        self.latency = latency
+        self.status_code = status_code
+        self.payload = payload
+        self.calls = []
+
+    @staticmethod
+    def forecast(days: int, start=None) -> dict:
+        start = start or datetime.now().date()
+        forecast_days = []
+        for offset in range(days):
+            date = (start + timedelta(days=offset)).strftime("%Y-%m-%d")
+            forecast_days.append(
+                {
+                    "date": date,
+                    "hour": [
+                        {
+                            "time": f"{date} {hour:02d}:00",
+                            "condition": {"text": "Sunny " if hour < 12 else "Cloudy"},
+                            "temp_c": 10 + hour / 2,
+                        }
+                        for hour in range(24)
+                    ],
+                }
+            )
+        return {"forecast": {"forecastday": forecast_days}}
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(dict(request.url.params))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.payload is not None:
+            body = self.payload
+        else:
+            body = self.forecast(int(request.url.params.get("days", 1)))
+
+        return httpx.Response(self.status_code, json=body)
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self))
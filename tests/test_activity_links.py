@@ -0,0 +1,85 @@
+import asyncio
+import ast
+import re
+import pytest
+from unittest.mock import patch
+from generation import activity_links
+from generation.activity_links import get_activity_links, link_cache_stats
+from generation.cache import MemoryCache
+
+LINKS = {
+    "british museum": "https://britishmuseum.org",
+    "dishoom": "https://dishoom.com",
+    "hyde park": None,
+}
+
+
+@pytest.fixture
+def perplexity():
+    """Answer Perplexity queries from LINKS and record the titles asked for"""
+    queries = []
+
+    async def query(chain, user_input):
+        titles = ast.literal_eval(re.search(r"\{.*\}", user_input).group(0))
+        queries.append(sorted(titles.values()))
+        return str({k: LINKS[v.lower()] for k, v in titles.items()})
+
+    with patch.object(
+        activity_links, "get_link_cache", return_value=MemoryCache()
+    ), patch.object(
+        activity_links, "run_perplexity_query", side_effect=query
+    ), patch.dict(
+        activity_links._stats,
+        {"queries": 0, "query_seconds": 0.0, "skipped_queries": 0},
+    ):
+        yield queries
+
+
+@pytest.mark.asyncio
+async def test_only_missing_venues_are_queried(perplexity):
+    first = await get_activity_links(
+        {1: "British Museum"}, "London", perplexity_chain=object()
+    )
+    second = await get_activity_links(
+        {1: "british  museum", 2: "Dishoom"}, "london", perplexity_chain=object()
+    )
+
+    assert first == {1: "https://britishmuseum.org"}
+    assert second == {1: "https://britishmuseum.org", 2: "https://dishoom.com"}
+    assert perplexity == [["British Museum"], ["Dishoom"]]
+
+
+@pytest.mark.asyncio
+async def test_fully_cached_titles_skip_perplexity(perplexity):
+    titles = {1: "Dishoom", 2: "Hyde Park"}
+    await get_activity_links(titles, "London", perplexity_chain=object())
+    result = await get_activity_links(titles, "London", perplexity_chain=object())
+
+    # venues without a link are cached as well
+    assert result == {1: "https://dishoom.com", 2: None}
+    assert len(perplexity) == 1
+
+    stats = link_cache_stats()
+    assert stats["perplexity_queries"] == 1
+    assert stats["skipped_queries"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_coalesced_lookups_count_one_query(perplexity):
+    titles = {1: "British Museum"}
+    results = await asyncio.gather(
+        *(get_activity_links(titles, "London", perplexity_chain=object()) for _ in range(3))
+    )
+
+    assert results == [{1: "https://britishmuseum.org"}] * 3
+    assert len(perplexity) == 1
+    assert link_cache_stats()["perplexity_queries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_links_are_cached_per_city(perplexity):
+    await get_activity_links({1: "Dishoom"}, "London", perplexity_chain=object())
+    await get_activity_links({1: "Dishoom"}, "Mumbai", perplexity_chain=object())
+
+    assert len(perplexity) == 2
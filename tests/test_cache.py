@@ -0,0 +1,125 @@
+import pytest
+from unittest.mock import patch
+from langchain_core.messages import HumanMessage, SystemMessage
+from generation.cache import MemoryCache, SQLiteCache, TieredCache, build_cache, cache_key
+from generation.generation import Generator
+from generation.generation_models import Facts
+
+
+class CountingModel:
+    """Stands in for a with_structured_output runnable"""
+
+    def __init__(self, response):
+        self.response = response
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return self.response
+
+
+def test_cache_key_stable():
+    assert cache_key("a", {"x": 1, "y": 2}) == cache_key("a", {"y": 2, "x": 1})
+    assert cache_key("a", [1]) != cache_key("b", [1])
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_lru_eviction():
+    cache = MemoryCache(maxsize=2, ttl=60)
+    await cache.set("a", 1)
+    await cache.set("b", 2)
+    assert await cache.get("a") == 1  # a is now most recently used
+    await cache.set("c", 3)
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == 1
+    assert await cache.get("c") == 3
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_ttl():
+    cache = MemoryCache(maxsize=2, ttl=60)
+    await cache.set("a", 1, ttl=-1)
+    assert await cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_sqlite_cache_persists(tmp_path):
+    path = str(tmp_path / "llm.sqlite3")
+    cache = SQLiteCache(path, table="llm_cache", ttl=60)
+    await cache.set("a", {"facts": ["one"]})
+    await cache.set("old", [1], ttl=-1)
+
+    reopened = SQLiteCache(path, table="llm_cache", ttl=60)
+    assert await reopened.get("a") == {"facts": ["one"]}
+    assert await reopened.get("old") is None
+
+
+def test_build_cache_from_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("TEST_CACHE_BACKEND", "none")
+    assert build_cache("TEST") is None
+
+    monkeypatch.setenv("TEST_CACHE_BACKEND", "sqlite")
+    monkeypatch.setenv("TEST_CACHE_PATH", str(tmp_path / "test.sqlite3"))
+    assert isinstance(build_cache("TEST"), SQLiteCache)
+
+    monkeypatch.delenv("TEST_CACHE_BACKEND")
+    assert isinstance(build_cache("TEST"), MemoryCache)
+
+    monkeypatch.setenv("CACHE_SHARED", "true")
+    assert isinstance(build_cache("TEST"), TieredCache)
+
+
+@pytest.mark.asyncio
+async def test_tiered_cache_shared_between_workers(tmp_path):
+    path = str(tmp_path / "llm.sqlite3")
+    # two workers, each with its own memory tier over the same file
+    first = TieredCache(SQLiteCache(path, table="llm_cache"), local_ttl=60)
+    second = TieredCache(SQLiteCache(path, table="llm_cache"), local_ttl=60)
+    assert first.shared._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    await first.set("a", {"facts": ["one"]})
+    assert await second.get("a") == {"facts": ["one"]}
+
+    # served from memory until the local copy expires
+    await first.set("a", {"facts": ["two"]})
+    assert await second.get("a") == {"facts": ["one"]}
+    second._local.clear()
+    assert await second.get("a") == {"facts": ["two"]}
+
+
+@pytest.mark.asyncio
+async def test_invoke_with_retries_uses_cache():
+    generator = Generator()
+    generator.cache = MemoryCache()
+    model = CountingModel(Facts(facts=["London has over 170 museums."]))
+
+    with patch.object(
+        type(generator.llm), "with_structured_output", return_value=model
+    ):
+        first = await generator.generate_facts("London", 1)
+        second = await generator.generate_facts("London", 1)
+        await generator.generate_facts("Paris", 1)
+
+    assert first == second == ["London has over 170 museums."]
+    assert model.calls == 2
+    assert generator.cache.stats()["hits"] == 1
+    assert generator.cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_invoke_with_retries_opt_out():
+    generator = Generator()
+    generator.cache = MemoryCache()
+    model = CountingModel(Facts(facts=["fact"]))
+    messages = [SystemMessage("system"), HumanMessage("human")]
+
+    for _ in range(2):
+        await generator.invoke_with_retries(model, messages, 1, schema=Facts)
+        await generator.invoke_with_retries(
+            model, messages, 1, schema=Facts, use_cache=False
+        )
+
+    assert model.calls == 3
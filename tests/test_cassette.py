@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+from generation.cassette import Cassette, CassetteMiss
+
+
+def read_entries(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.asyncio
+async def test_records_and_replays_async_exchanges(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+    answers = iter(["first", "second"])
+
+    def handler(request):
+        return httpx.Response(200, json={"answer": next(answers)})
+
+    recorder = Cassette(path, "record")
+    async with httpx.AsyncClient(
+        transport=recorder.async_transport("openai", httpx.MockTransport(handler))
+    ) as client:
+        for _ in range(2):
+            await client.post("https://api.example.com/chat", json={"prompt": "hi"})
+
+    entries = read_entries(path)
+    assert [entry["provider"] for entry in entries] == ["openai", "openai"]
+    assert entries[0]["request"]["body"] == {"prompt": "hi"}
+    assert "elapsed" in entries[0]["timing"]
+
+    player = Cassette(path, "replay")
+    async with httpx.AsyncClient(transport=player.async_transport("openai")) as client:
+        replies = [
+            (await client.post("https://api.example.com/chat", json={"prompt": "hi"})).json()
+            for _ in range(3)
+        ]
+    # repeats replay in order, then the last recording is reused
+    assert [reply["answer"] for reply in replies] == ["first", "second", "second"]
+
+
+@pytest.mark.asyncio
+async def test_async_recording_writes_off_the_event_loop(tmp_path):
+    recorder = Cassette(str(tmp_path / "cassette.jsonl"), "record")
+    record = recorder.record
+    threads = []
+
+    def spy(*args):
+        threads.append(threading.current_thread())
+        record(*args)
+
+    recorder.record = spy
+    handler = httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+    async with httpx.AsyncClient(transport=recorder.async_transport("openai", handler)) as client:
+        await client.get("https://api.example.com/models")
+
+    assert threads and threads[0] is not threading.main_thread()
+    assert len(read_entries(recorder.path)) == 1
+
+
+@pytest.mark.asyncio
+async def test_replay_miss_is_a_transport_error(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    path.write_text("")
+    player = Cassette(str(path), "replay")
+    async with httpx.AsyncClient(transport=player.async_transport("openai")) as client:
+        with pytest.raises(CassetteMiss):
+            await client.post("https://api.example.com/chat", json={"prompt": "new"})
+    assert issubclass(CassetteMiss, httpx.TransportError)
+
+
+@pytest.mark.asyncio
+async def test_api_keys_are_redacted_and_still_match(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+
+    def handler(request):
+        return httpx.Response(200, json={"forecast": {}})
+
+    recorder = Cassette(path, "record")
+    async with httpx.AsyncClient(
+        transport=recorder.async_transport("weatherapi", httpx.MockTransport(handler))
+    ) as client:
+        await client.get(
+            "https://weather.example.com/forecast", params={"key": "secret", "q": "Paris"}
+        )
+
+    assert "secret" not in open(path).read()
+
+    player = Cassette(path, "replay")
+    async with httpx.AsyncClient(transport=player.async_transport("weatherapi")) as client:
+        response = await client.get(
+            "https://weather.example.com/forecast", params={"key": "other", "q": "Paris"}
+        )
+    assert response.json() == {"forecast": {}}
+
+
+@pytest.mark.asyncio
+async def test_replay_restores_scaled_latency(tmp_path):
+    path = tmp_path / "cassette.jsonl"
+    recorder = Cassette(str(path), "record")
+    recorder.record(
+        "openai",
+        {"method": "GET", "url": "https://api.example.com/slow", "body": None},
+        {"status": 200, "headers": {}, "body": "ok"},
+        {"first_byte": 0.5, "elapsed": 1.0},
+    )
+
+    player = Cassette(str(path), "replay", time_scale=0.1)
+    async with httpx.AsyncClient(transport=player.async_transport("openai")) as client:
+        start = time.perf_counter()
+        response = await client.get("https://api.example.com/slow")
+        elapsed = time.perf_counter() - start
+
+    assert response.text == "ok"
+    assert 0.09 <= elapsed < 0.5
+
+
+def test_sync_transport_round_trip(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+
+    def handler(request):
+        return httpx.Response(200, json={"choices": [{"message": {"content": "{}"}}]})
+
+    recorder = Cassette(path, "record")
+    with httpx.Client(
+        transport=recorder.sync_transport("perplexity", httpx.MockTransport(handler))
+    ) as client:
+        recorded = client.post("https://api.example.com/chat", json={"q": 1}).json()
+
+    player = Cassette(path, "replay")
+    with httpx.Client(transport=player.sync_transport("perplexity")) as client:
+        assert client.post("https://api.example.com/chat", json={"q": 1}).json() == recorded
+
+
+def test_ddgs_results_and_errors_replay(tmp_path):
+    path = str(tmp_path / "cassette.jsonl")
+
+    class FakeDDGS:
+        def images(self, query, max_results=None):
+            if query == "broken":
+                raise RuntimeError("rate limited")
+            return [{"image": f"https://img.example.com/{query}.jpg"}]
+
+    recorder = Cassette(path, "record").ddgs(FakeDDGS())
+    results = recorder.images("tower", max_results=2)
+    with pytest.raises(RuntimeError):
+        recorder.images("broken", max_results=2)
+
+    player = Cassette(path, "replay").ddgs()
+    assert player.images("tower", max_results=2) == results
+    with pytest.raises(RuntimeError, match="rate limited"):
+        player.images("broken", max_results=2)
@@ -0,0 +1,140 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from generation.catalog import CityCatalog, get_catalog
+from generation.jobs import get_job_queue
+from main import app
+from routes.dependencies import get_generator
+
+
+class FakeGenerator:
+    def __init__(self):
+        self.calls = []
+
+    async def generate_activities(self, location, titles_only=False, titles=None, **kwargs):
+        self.calls.append("titles" if titles_only else "details")
+        if titles_only:
+            # the second round repeats a title of the first
+            offset = 5 * (self.calls.count("titles") - 1)
+            return [{"id": i, "title": f"Activity {offset + i}"} for i in range(6)]
+        return [{**title, "description": "Fun."} for title in titles]
+
+    async def generate_facts(self, location, num=1, **kwargs):
+        self.calls.append("facts")
+        return [f"Fact {i}" for i in range(5)]
+
+
+async def fake_images(titles, deadline=None):
+    return {key: [f"https://img.example.com/{key}.jpg"] for key in titles}
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    monkeypatch.setenv("CATALOG_CACHE_BACKEND", "memory")
+    with patch("generation.catalog.get_n_random_places", fake_images):
+        yield CityCatalog(cities=["London"], ttl=60)
+
+
+@pytest.mark.asyncio
+async def test_build_fills_every_entry_with_unique_activities(catalog):
+    generator = FakeGenerator()
+    built = await catalog.build(generator)
+    # 4 groups x 5 uniqueness levels, plus the facts
+    assert built == 21
+
+    entry = await catalog.cache.get(catalog.key("london", "friends", 2))
+    titles = [item["title"] for item in entry["activities"]]
+    assert len(titles) == 11 and len(set(titles)) == 11
+    assert len({item["id"] for item in entry["activities"]}) == 11
+    assert all(item["image_link"] for item in entry["activities"])
+
+    # fresh entries are not rebuilt
+    assert await catalog.build(generator) == 0
+
+
+@pytest.mark.asyncio
+async def test_sample_serves_catalog_activities(catalog):
+    generator = FakeGenerator()
+    await catalog.refresh(generator, "London", "solo", 1)
+    generator.calls.clear()
+
+    activities = await catalog.sample_activities(generator, "london ", "solo", 1)
+    assert [item["id"] for item in activities] == list(range(6))
+    assert len({item["title"] for item in activities}) == 6
+    assert generator.calls == []
+
+
+@pytest.mark.asyncio
+async def test_uncovered_requests_fall_back(catalog):
+    generator = FakeGenerator()
+    assert await catalog.sample_activities(generator, "Lisbon", "solo", 1) is None
+    assert await catalog.sample_activities(generator, "London", "pets", 1) is None
+    # entries are built for the whole day
+    assert not catalog.covers("London", "solo", 1, ["evening"])
+    assert catalog.covers("London", "solo", 1, ["evening", "morning", "afternoon"])
+    assert await catalog.sample_facts(generator, "Lisbon", 3) is None
+    assert generator.calls == []
+
+
+@pytest.mark.asyncio
+async def test_missing_entry_is_built_in_background(catalog):
+    generator = FakeGenerator()
+    assert await catalog.sample_activities(generator, "London", "family", 0) is None
+    await asyncio.gather(*catalog.tasks)
+    assert await catalog.sample_activities(generator, "London", "family", 0) is not None
+    # refreshes queue behind interactive and prefetch jobs
+    assert [job.priority for job in get_job_queue().jobs.values()][-1] == "catalog"
+    await get_job_queue().aclose()
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_served_while_revalidating(catalog):
+    generator = FakeGenerator()
+    await catalog.cache.set(
+        catalog.key("London", "couples", 3),
+        {"generated_at": time.time() - 120, "activities": [{"id": 0, "title": "Old"}]},
+    )
+
+    activities = await catalog.sample_activities(generator, "London", "couples", 3)
+    assert activities == [{"id": 0, "title": "Old"}]
+    # a second stale read does not start another refresh
+    await catalog.sample_activities(generator, "London", "couples", 3)
+    assert len(catalog.tasks) == 1
+
+    await asyncio.gather(*catalog.tasks)
+    activities = await catalog.sample_activities(generator, "London", "couples", 3)
+    assert activities[0]["title"].startswith("Activity")
+    await get_job_queue().aclose()
+
+
+@pytest.mark.asyncio
+async def test_facts_sampled_without_repeats(catalog):
+    generator = FakeGenerator()
+    await catalog.refresh(generator, "London")
+    facts = await catalog.sample_facts(generator, "London", 4)
+    assert len(facts) == 4 and len(set(facts)) == 4
+
+
+def test_activities_route_uses_catalog(catalog):
+    generator = FakeGenerator()
+    asyncio.run(catalog.refresh(generator, "London", "friends", 2))
+    generator.calls.clear()
+
+    overrides = {get_generator: lambda: generator, get_catalog: lambda: catalog}
+    with patch.dict(app.dependency_overrides, overrides):
+        body = {
+            "city": "London",
+            "timeOfDay": ["morning", "afternoon", "evening"],
+            "group": "friends",
+            "uniqueness": 2,
+        }
+        response = TestClient(app).post("/activities", json=body)
+
+    assert response.status_code == 200
+    assert len(response.json()["activities"]) == 6
+    assert "searchConfig" in response.headers["set-cookie"]
+    assert generator.calls == []
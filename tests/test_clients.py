@@ -0,0 +1,26 @@
+import pytest
+from generation.clients import ClientRegistry
+from generation.generation import Generator
+from generation.generation_models import Facts, ItinerarySummary
+
+
+@pytest.mark.asyncio
+async def test_structured_runnable_built_once_per_schema():
+    clients = ClientRegistry()
+    try:
+        assert clients.structured(Facts) is clients.structured(Facts)
+        assert clients.structured(Facts) is not clients.structured(ItinerarySummary)
+    finally:
+        await clients.aclose()
+
+
+@pytest.mark.asyncio
+async def test_generator_shares_registry_clients():
+    clients = ClientRegistry()
+    try:
+        generator = Generator(clients)
+        assert generator.llm is clients.llm
+        assert generator.weather is clients.weather
+        assert generator.weather.client is clients.weather_http
+    finally:
+        await clients.aclose()
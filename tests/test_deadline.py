@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+from generation.deadline import Deadline, DeadlineExceeded
+
+
+@pytest.mark.asyncio
+async def test_optional_stage_is_cut_off_and_recorded():
+    deadline = Deadline(0.02)
+
+    assert await deadline.optional("images", asyncio.sleep(1, ["url"]), []) == []
+    assert await deadline.optional("links", asyncio.sleep(1), None) is None
+    assert deadline.skipped == ["images", "links"]
+
+
+@pytest.mark.asyncio
+async def test_optional_stage_within_budget_is_kept():
+    deadline = Deadline(1)
+
+    assert await deadline.optional("images", asyncio.sleep(0, ["url"]), []) == ["url"]
+    assert deadline.skipped == []
+
+
+@pytest.mark.asyncio
+async def test_required_stage_raises_when_time_runs_out():
+    with pytest.raises(DeadlineExceeded, match="details"):
+        await Deadline(0.01).required(asyncio.sleep(1), "details")
+
+
+@pytest.mark.asyncio
+async def test_iterate_limits_each_item():
+    async def items(delay):
+        for i in range(3):
+            await asyncio.sleep(delay)
+            yield i
+
+    assert [i async for i in Deadline(1).iterate(items(0))] == [0, 1, 2]
+    with pytest.raises(DeadlineExceeded):
+        [i async for i in Deadline(0.05).iterate(items(0.03))]
+
+
+def test_from_header(monkeypatch):
+    monkeypatch.delenv("REQUEST_DEADLINE_SECONDS", raising=False)
+    assert Deadline.from_header(None).remaining() is None
+    assert 0 < Deadline.from_header("2.5").remaining() <= 2.5
+    # invalid values fall back to the configured default
+    monkeypatch.setenv("REQUEST_DEADLINE_SECONDS", "10")
+    assert 2.5 < Deadline.from_header("soon").remaining() <= 10
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from generation.catalog import CityCatalog, get_catalog
+from generation.fact_pool import FactPool, get_fact_pool
+from main import app
+from routes.dependencies import get_generator
+
+
+class FakeGenerator:
+    def __init__(self):
+        self.calls = []
+
+    async def generate_facts(self, location, num=1, use_cache=True, deadline=None):
+        self.calls.append(use_cache)
+        start = 5 * (len(self.calls) - 1)
+        return [f"{location} fact {i}" for i in range(start, start + num)]
+
+
+@pytest.mark.asyncio
+async def test_cold_pool_returns_none():
+    pool = FactPool()
+    assert pool.sample(FakeGenerator(), "London", 3) is None
+
+
+@pytest.mark.asyncio
+async def test_sample_without_repeats_and_refill_in_background():
+    pool = FactPool(size=8, refill_below=6)
+    generator = FakeGenerator()
+    pool.add("London", [f"seed {i}" for i in range(5)])
+
+    facts = pool.sample(generator, "london", 5)
+    assert len(set(facts)) == 5
+    await asyncio.gather(*pool.tasks)
+    assert generator.calls == [False]
+
+    # topped up to the pool size, keeping the newest facts
+    assert len(pool.pools["london"]["facts"]) == 8
+    assert pool.pools["london"]["facts"][-1] == "london fact 4"
+
+    # a full pool is served without refilling
+    pool.sample(generator, "London", 2)
+    assert pool.tasks == set()
+
+
+@pytest.mark.asyncio
+async def test_stale_pool_served_then_replaced():
+    pool = FactPool(refill_below=1, ttl=60)
+    generator = FakeGenerator()
+    pool.add("Paris", ["old fact"])
+    pool.pools["paris"]["refilled_at"] = time.time() - 120
+
+    assert pool.sample(generator, "Paris", 1) == ["old fact"]
+    await asyncio.gather(*pool.tasks)
+    assert "old fact" not in pool.pools["paris"]["facts"]
+
+
+@pytest.mark.asyncio
+async def test_refill_yields_to_queued_calls():
+    pool = FactPool(refill_below=10)
+    pool.add("Rome", ["fact"])
+    with patch("generation.fact_pool.get_scheduler") as scheduler:
+        scheduler.return_value.provider.return_value.queued = 1
+        pool.sample(FakeGenerator(), "Rome", 1)
+    assert pool.tasks == set()
+
+
+def test_least_recently_used_locations_dropped():
+    pool = FactPool(max_locations=2)
+    for location in ("A", "B", "C"):
+        pool.add(location, ["fact"])
+    assert list(pool.pools) == ["b", "c"]
+
+
+def test_facts_route_generates_only_when_cold(monkeypatch):
+    monkeypatch.setenv("CATALOG_CACHE_BACKEND", "memory")
+    generator = FakeGenerator()
+    pool = FactPool(refill_below=0)
+    overrides = {
+        get_generator: lambda: generator,
+        get_catalog: lambda: CityCatalog(),
+        get_fact_pool: lambda: pool,
+    }
+    with patch.dict(app.dependency_overrides, overrides):
+        client = TestClient(app)
+        first = client.get("/facts", params={"location": "Lisbon", "num": 2}).json()
+        second = client.get("/facts", params={"location": "Lisbon", "num": 3}).json()
+
+    assert len(first["facts"]) == 2
+    assert len(set(second["facts"])) == 3
+    assert generator.calls == [True]
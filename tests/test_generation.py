@@ -1,9 +1,11 @@
 import pytest
 from unittest.mock import patch
 from generation.generation import Generator
+from generation.scheduler import SchedulerBusy
 from generation.generation_models import (
     ActivityTitles,
     ItineraryItem,
+    ItineraryItemBatch,
     SimpleItineraryItem,
     ItinerarySummary,
     Facts,
@@ -12,6 +14,7 @@ from generation.generation_models import (
     Theme,
     TransportMode,
 )
+from generation.cache import MemoryCache
 from generation.image_searcher import (
     get_n_random_places,
     search_duckduckgo_images,
@@ -198,6 +201,8 @@ async def test_search_duckduckgo_images():
     }
 
     with patch(
+        "generation.image_searcher.get_image_cache", return_value=MemoryCache()
+    ), patch(
         "generation.image_searcher.search_single_image",
         side_effect=lambda q, k: (k, mock_results[k]),
     ):
@@ -210,6 +215,35 @@ async def test_search_duckduckgo_images():
         assert "https://example.com/colosseum1.jpg" in result["rome"]
 
 
+@pytest.mark.asyncio
+async def test_search_duckduckgo_images_dedupes_and_caches():
+    calls = []
+
+    def search(query, key):
+        calls.append(query)
+        if query == "Nowhere":
+            return (key, None)
+        return (key, ["https://example.com/tower.jpg"])
+
+    cache = MemoryCache()
+    with patch("generation.image_searcher.get_image_cache", return_value=cache), patch(
+        "generation.image_searcher.search_single_image", side_effect=search
+    ):
+        first = await search_duckduckgo_images(
+            ["Tower of London", "tower of london", "Nowhere"], [1, 2, 3]
+        )
+        second = await search_duckduckgo_images(["Tower  of London", "Nowhere"], [4, 5])
+
+    assert first == {
+        1: ["https://example.com/tower.jpg"],
+        2: ["https://example.com/tower.jpg"],
+    }
+    assert second == {4: ["https://example.com/tower.jpg"]}
+    # one search per distinct query, the empty result is cached too
+    assert calls == ["Tower of London", "Nowhere"]
+    assert await cache.get("nowhere") == []
+
+
 @pytest.mark.asyncio
 async def test_get_n_random_places():
     titles = {"1": "Eiffel Tower", "2": "Statue of Liberty"}
@@ -435,5 +469,130 @@ async def test_generate_activities_with_various_params():
                     assert hasattr(result[0], "description")
 
 
+def make_item_details(item_id):
+    return ItineraryItem(
+        title=f"Item {item_id}",
+        transport=False,
+        start="10:00",
+        end="11:00",
+        description="An activity.",
+        price=0,
+        theme="Culture",
+        transportMode="N/A",
+        requires_booking=False,
+        booking_url=None,
+        weather=None,
+        temperature=None,
+        image_link=[],
+        duration=60,
+        id=item_id,
+        latitude=None,
+        longitude=None,
+    )
+
+
+def make_summary(n):
+    return ItinerarySummary(
+        itinerary=[
+            SimpleItineraryItem(
+                title=f"Item {i}", imageTag="tag", start="10:00", end="11:00", id=i
+            )
+            for i in range(n)
+        ]
+    )
+
+
+@pytest.mark.asyncio
+async def test_generate_itinerary_details_batched():
+    """Batches keep the id mapping and fall back per item for missing ids"""
+    generator = Generator()
+    generator.cache = None
+    batch_prompts = []
+
+    class BatchModel:
+        async def ainvoke(self, messages):
+            batch_prompts.append(messages[-1].content)
+            # the model drops item 2
+            return ItineraryItemBatch(
+                items=[
+                    make_item_details(i)
+                    for i in (1, 0)
+                    if f"id: {i}," in messages[-1].content
+                ]
+            )
+
+    async def single_details(
+        item, location, group, weather=None, use_cache=True, deadline=None
+    ):
+        return make_item_details(item.id).model_dump() | {"title": "fallback"}
+
+    with patch.object(
+        type(generator.llm), "with_structured_output", return_value=BatchModel()
+    ), patch.object(generator, "generate_item_details", side_effect=single_details):
+        result = await generator.generate_itinerary_details(
+            make_summary(4), "London", "solo", None, batch_size=3
+        )
+
+    assert [item["id"] for item in result] == [0, 1, 2, 3]
+    assert [item["title"] for item in result] == [
+        "Item 0",
+        "Item 1",
+        "fallback",
+        "fallback",
+    ]
+    assert len(batch_prompts) == 1
+
+
+@pytest.mark.asyncio
+async def test_generate_batch_details_falls_back_on_error():
+    generator = Generator()
+    generator.cache = None
+
+    class FailingModel:
+        async def ainvoke(self, messages):
+            raise ValueError("invalid schema output")
+
+    async def single_details(
+        item, location, group, weather=None, use_cache=True, deadline=None
+    ):
+        return make_item_details(item.id).model_dump()
+
+    generator.num_retries = 1
+    with patch.object(
+        type(generator.llm), "with_structured_output", return_value=FailingModel()
+    ), patch.object(generator, "generate_item_details", side_effect=single_details):
+        result = await generator.generate_batch_details(
+            make_summary(2).itinerary, "London", "solo"
+        )
+
+    assert [item["id"] for item in result] == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_generate_batch_details_does_not_fan_out_when_shed():
+    generator = Generator()
+    generator.cache = None
+    calls = []
+
+    async def shed(*args, **kwargs):
+        raise SchedulerBusy("openai", "queue full")
+
+    async def single_details(
+        item, location, group, weather=None, use_cache=True, deadline=None
+    ):
+        calls.append(item.id)
+        return make_item_details(item.id).model_dump()
+
+    with patch.object(generator, "invoke_with_retries", side_effect=shed), patch.object(
+        generator, "generate_item_details", side_effect=single_details
+    ):
+        with pytest.raises(SchedulerBusy):
+            await generator.generate_batch_details(
+                make_summary(3).itinerary, "London", "solo"
+            )
+
+    assert calls == []
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,245 @@
+import asyncio
+import json
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from generation.generation import Generator
+from generation.generation_models import ItinerarySummary, SimpleItineraryItem
+from main import app
+from routes import itinerary
+from routes.dependencies import get_generator
+
+generator = Generator()
+app.dependency_overrides[get_generator] = lambda: generator
+client = TestClient(app)
+
+summary = ItinerarySummary(
+    itinerary=[
+        SimpleItineraryItem(
+            title="Visit the British Museum",
+            imageTag="British Museum",
+            start="10:00",
+            end="12:00",
+            id=1,
+        ),
+        SimpleItineraryItem(
+            title="Lunch at Dishoom",
+            imageTag="Dishoom restaurant",
+            start="12:30",
+            end="13:30",
+            id=2,
+        ),
+    ]
+)
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def fake_generate_itinerary(location, **kwargs):
+    return summary
+
+
+async def fake_get_weather(location, date=None, deadline=None):
+    return None
+
+
+async def fake_item_details(
+    item, location, group, weather=None, use_cache=True, deadline=None
+):
+    # the first item is the slowest, so it must arrive last
+    await asyncio.sleep(0.05 if item.id == 1 else 0)
+    return {"id": item.id, "title": item.title}
+
+
+async def fake_images(titles, deadline=None):
+    return {k: [f"https://example.com/{k}.jpg"] for k in titles}
+
+
+async def fake_links(titles, location, **kwargs):
+    return {1: "https://britishmuseum.org"}
+
+
+def test_stream_itinerary_events():
+    with patch.object(
+        generator, "generate_itinerary", side_effect=fake_generate_itinerary
+    ), patch.object(
+        generator, "get_weather", side_effect=fake_get_weather
+    ), patch.object(
+        generator, "generate_item_details", side_effect=fake_item_details
+    ), patch.object(
+        itinerary, "get_n_random_places", side_effect=fake_images
+    ), patch.object(
+        itinerary, "get_activity_links", side_effect=fake_links
+    ):
+        response = client.post("/itinerary/stream", json={"city": "London"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+
+    assert events[0] == ("summary", summary.model_dump())
+    assert events[-1] == ("done", {})
+
+    items = [data["id"] for event, data in events if event == "item"]
+    assert items == [2, 1]
+
+    patches = [data for event, data in events if event == "patch"]
+    assert {"id": 1, "image_link": ["https://example.com/1.jpg"]} in patches
+    assert {"id": 1, "booking_url": "https://britishmuseum.org"} in patches
+    assert {"id": 2, "booking_url": None} in patches
+
+
+def test_stream_itinerary_reports_failed_stage():
+    async def failing_links(titles, location, **kwargs):
+        raise RuntimeError("perplexity down")
+
+    with patch.object(
+        generator, "generate_itinerary", side_effect=fake_generate_itinerary
+    ), patch.object(
+        generator, "get_weather", side_effect=fake_get_weather
+    ), patch.object(
+        generator, "generate_item_details", side_effect=fake_item_details
+    ), patch.object(
+        itinerary, "get_n_random_places", side_effect=fake_images
+    ), patch.object(
+        itinerary, "get_activity_links", side_effect=failing_links
+    ):
+        response = client.post("/itinerary/stream", json={"city": "London"})
+
+    events = parse_events(response.text)
+    assert ("error", {"stage": "links", "detail": "perplexity down"}) in events
+    assert len([event for event, _ in events if event == "item"]) == 2
+    assert events[-1] == ("done", {})
+
+
+def test_itinerary_collects_pipeline():
+    with patch.object(
+        generator, "generate_itinerary", side_effect=fake_generate_itinerary
+    ), patch.object(
+        generator, "get_weather", side_effect=fake_get_weather
+    ), patch.object(
+        generator, "generate_item_details", side_effect=fake_item_details
+    ), patch.object(
+        itinerary, "get_n_random_places", side_effect=fake_images
+    ), patch.object(
+        itinerary, "get_activity_links", side_effect=fake_links
+    ):
+        response = client.post("/itinerary", json={"city": "London"})
+
+    assert response.json() == {
+        "itinerary": [
+            {
+                "id": 1,
+                "title": "Visit the British Museum",
+                "image_link": ["https://example.com/1.jpg"],
+                "booking_url": "https://britishmuseum.org",
+            },
+            {
+                "id": 2,
+                "title": "Lunch at Dishoom",
+                "image_link": ["https://example.com/2.jpg"],
+                "booking_url": None,
+            },
+        ],
+        "skipped": [],
+    }
+
+
+def test_stream_itinerary_summary_failure():
+    async def failing_itinerary(location, **kwargs):
+        raise RuntimeError("openai down")
+
+    with patch.object(
+        generator, "generate_itinerary", side_effect=failing_itinerary
+    ), patch.object(generator, "get_weather", side_effect=fake_get_weather):
+        response = client.post("/itinerary/stream", json={"city": "London"})
+
+    assert parse_events(response.text) == [
+        ("error", {"stage": "summary", "detail": "openai down"})
+    ]
+
+
+def test_itinerary_deadline_skips_slow_optional_stages():
+    async def slow_links(titles, location, deadline=None, **kwargs):
+        return await deadline.optional("links", asyncio.sleep(5, {1: "late"}))
+
+    with patch.object(
+        generator, "generate_itinerary", side_effect=fake_generate_itinerary
+    ), patch.object(
+        generator, "get_weather", side_effect=fake_get_weather
+    ), patch.object(
+        generator, "generate_item_details", side_effect=fake_item_details
+    ), patch.object(
+        itinerary, "get_n_random_places", side_effect=fake_images
+    ), patch.object(
+        itinerary, "get_activity_links", side_effect=slow_links
+    ):
+        response = client.post(
+            "/itinerary",
+            json={"city": "London"},
+            headers={"X-Request-Deadline": "0.3"},
+        )
+        events = parse_events(
+            client.post(
+                "/itinerary/stream",
+                json={"city": "London"},
+                headers={"X-Request-Deadline": "0.3"},
+            ).text
+        )
+
+    body = response.json()
+    assert body["skipped"] == ["links"]
+    assert [item["booking_url"] for item in body["itinerary"]] == [None, None]
+    assert events[-2:] == [("skipped", {"stages": ["links"]}), ("done", {})]
+
+
+def test_itinerary_deadline_exceeded_by_required_stage():
+    async def slow_itinerary(location, deadline=None, **kwargs):
+        return await deadline.required(asyncio.sleep(5, summary), "ItinerarySummary")
+
+    with patch.object(
+        generator, "generate_itinerary", side_effect=slow_itinerary
+    ), patch.object(generator, "get_weather", side_effect=fake_get_weather):
+        response = client.post(
+            "/itinerary",
+            json={"city": "London"},
+            headers={"X-Request-Deadline": "0.1"},
+        )
+
+    assert response.status_code == 504
+
+
+def test_itinerary_schedule_stage_sorts_items():
+    async def overlapping_details(
+        item, location, group, weather=None, use_cache=True, deadline=None
+    ):
+        # the LLM moved lunch before the museum visit and overlapped them
+        start, end = {1: ("11:00", "13:00"), 2: ("10:30", "11:30")}[item.id]
+        return {"id": item.id, "start": start, "end": end, "transport": False}
+
+    with patch.object(generator, "solve_schedules", True), patch.object(
+        generator, "generate_itinerary", side_effect=fake_generate_itinerary
+    ), patch.object(
+        generator, "get_weather", side_effect=fake_get_weather
+    ), patch.object(
+        generator, "generate_item_details", side_effect=overlapping_details
+    ), patch.object(
+        itinerary, "get_n_random_places", side_effect=fake_images
+    ), patch.object(
+        itinerary, "get_activity_links", side_effect=fake_links
+    ):
+        body = client.post("/itinerary", json={"city": "London"}).json()
+        events = parse_events(client.post("/itinerary/stream", json={"city": "London"}).text)
+
+    expected = [(2, "10:30", "11:30", 60), (1, "11:30", "13:30", 120)]
+    assert [
+        (item["id"], item["start"], item["end"], item["duration"])
+        for item in body["itinerary"]
+    ] == expected
+    assert events[-2][0] == "schedule"
+    assert [item["id"] for item in events[-2][1]["itinerary"]] == [2, 1]
+    assert events[-1] == ("done", {})
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from generation.generation import Generator
+from generation.generation_models import ItinerarySummary, SimpleItineraryItem
+from generation.jobs import JobQueue, get_job_queue
+from generation.scheduler import SchedulerBusy
+from main import app
+from routes import itinerary
+from routes.dependencies import get_generator
+
+
+def recorder(order, name, release=None):
+    async def work(job):
+        if release is not None:
+            await release.wait()
+        order.append(name)
+        job.publish("progress", {"name": name})
+        return name
+
+    return work
+
+
+async def until(condition, timeout=2):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_interactive_jobs_run_before_background_jobs():
+    queue = JobQueue(workers=1, reserved=0)
+    order = []
+    release = asyncio.Event()
+    await queue.submit(recorder(order, "blocker", release))
+    await until(lambda: queue.running == 1)
+
+    for priority in ("catalog", "prefetch", "interactive"):
+        await queue.submit(recorder(order, priority), priority=priority)
+    release.set()
+    await until(lambda: len(order) == 4)
+
+    assert order == ["blocker", "interactive", "prefetch", "catalog"]
+    await queue.aclose()
+
+
+@pytest.mark.asyncio
+async def test_reserved_worker_kept_for_interactive_jobs():
+    queue = JobQueue(workers=2, reserved=1)
+    order = []
+    release = asyncio.Event()
+    await queue.submit(recorder(order, "catalog 1", release), priority="catalog")
+    await queue.submit(recorder(order, "catalog 2", release), priority="catalog")
+    await until(lambda: queue.running == 1)
+
+    job = await queue.submit(recorder(order, "interactive"))
+    await until(lambda: job.finished)
+    assert order == ["interactive"]
+
+    release.set()
+    await until(lambda: len(order) == 3)
+    await queue.aclose()
+
+
+@pytest.mark.asyncio
+async def test_same_key_reuses_job_unless_failed():
+    queue = JobQueue()
+    first = await queue.submit(recorder([], "a"), key="k")
+    assert await queue.submit(recorder([], "b"), key="k") is first
+    await until(lambda: first.finished)
+    assert (await queue.get(first.id))["result"] == "a"
+
+    async def failing(job):
+        raise RuntimeError("openai down")
+
+    failed = await queue.submit(failing, key="f")
+    await until(lambda: failed.finished)
+    assert failed.error == {"status": 500, "detail": "openai down"}
+    assert await queue.submit(recorder([], "c"), key="f") is not failed
+    await queue.aclose()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_jobs():
+    queue = JobQueue(workers=1, reserved=0, max_queued=1)
+    release = asyncio.Event()
+    await queue.submit(recorder([], "running", release))
+    await until(lambda: queue.running == 1)
+    await queue.submit(recorder([], "queued"))
+    with pytest.raises(SchedulerBusy):
+        await queue.submit(recorder([], "rejected"))
+    release.set()
+    await queue.aclose()
+
+
+@pytest.mark.asyncio
+async def test_follow_replays_then_streams_events():
+    queue = JobQueue()
+    release = asyncio.Event()
+    job = await queue.submit(recorder([], "a", release))
+
+    async def collect():
+        return [event async for event in job.follow()]
+
+    follower = asyncio.ensure_future(collect())
+    await asyncio.sleep(0.01)
+    release.set()
+    assert await follower == [("progress", {"name": "a"}), ("done", "a")]
+    # a late follower sees the same events
+    assert await collect() == [("progress", {"name": "a"}), ("done", "a")]
+    await queue.aclose()
+
+
+summary = ItinerarySummary(
+    itinerary=[
+        SimpleItineraryItem(
+            title="Visit the British Museum", imageTag="Museum", start="10:00", end="12:00", id=1
+        ),
+        SimpleItineraryItem(
+            title="Lunch at Dishoom", imageTag="Dishoom", start="12:30", end="13:30", id=2
+        ),
+    ]
+)
+
+
+def test_itinerary_job_api():
+    generator = Generator()
+
+    async def fake_itinerary(location, **kwargs):
+        return summary
+
+    async def fake_weather(location, date=None, deadline=None):
+        return None
+
+    async def fake_details(item, location, group, weather=None, **kwargs):
+        return {"id": item.id, "title": item.title}
+
+    async def fake_images(titles, deadline=None):
+        return {k: [f"https://example.com/{k}.jpg"] for k in titles}
+
+    async def fake_links(titles, location, **kwargs):
+        return {}
+
+    queue = JobQueue()
+    overrides = {get_generator: lambda: generator, get_job_queue: lambda: queue}
+    with patch.dict(app.dependency_overrides, overrides), patch.object(
+        generator, "generate_itinerary", side_effect=fake_itinerary
+    ), patch.object(generator, "get_weather", side_effect=fake_weather), patch.object(
+        generator, "generate_item_details", side_effect=fake_details
+    ), patch.object(
+        itinerary, "get_n_random_places", side_effect=fake_images
+    ), patch.object(
+        itinerary, "get_activity_links", side_effect=fake_links
+    ), TestClient(app) as client:
+        created = client.post("/itinerary/jobs", json={"city": "London"})
+        assert created.status_code == 202
+        job_id = created.json()["id"]
+
+        for _ in range(100):
+            status = client.get(f"/itinerary/jobs/{job_id}").json()
+            if status["status"] == "done":
+                break
+            time.sleep(0.01)
+        assert status["status"] == "done", status
+        assert [item["id"] for item in status["result"]["itinerary"]] == [1, 2]
+        assert status["result"]["itinerary"][0]["image_link"] == ["https://example.com/1.jpg"]
+
+        events = client.get(f"/itinerary/jobs/{job_id}/events").text
+        assert events.startswith("event: summary")
+        assert f"event: done\ndata: {json.dumps(status['result'])}" in events
+
+        # the same request reuses the finished job
+        again = client.post("/itinerary/jobs", json={"city": "London"}).json()
+        assert again == {"id": job_id, "status": "done"}
+
+        assert client.get("/itinerary/jobs/unknown").status_code == 404
+        # clients cannot queue behind background work, or ahead of it
+        other = client.post("/itinerary/jobs?priority=catalog", json={"city": "Paris"})
+        assert queue.jobs[other.json()["id"]].priority == "interactive"
@@ -0,0 +1,97 @@
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from generation.fact_pool import FactPool, get_fact_pool
+from generation.generation import Generator
+from generation.generation_models import Facts
+from generation.metrics import (
+    CACHE_REQUESTS,
+    LLM_TOKENS,
+    REQUEST_LATENCY,
+    STAGE_LATENCY,
+    Counter,
+    Histogram,
+)
+from main import app
+from routes.dependencies import get_generator
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test.", ("stage",), buckets=(0.1, 1))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    histogram.observe(5, stage="a")
+
+    assert histogram.render().splitlines() == [
+        "# HELP test_seconds Test.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="a",le="0.1"} 1',
+        'test_seconds_bucket{stage="a",le="1"} 2',
+        'test_seconds_bucket{stage="a",le="+Inf"} 3',
+        'test_seconds_sum{stage="a"} 5.55',
+        'test_seconds_count{stage="a"} 3',
+    ]
+
+
+def test_counter_escapes_labels_and_rejects_unknown():
+    counter = Counter("test_total", "Test.", ("name",))
+    counter.inc(name='say "hi"')
+    assert 'test_total{name="say \\"hi\\""} 1' in counter.render()
+
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+
+
+@pytest.mark.asyncio
+async def test_llm_call_records_stage_tokens_and_cache():
+    generator = Generator()
+    model_name = generator.llm.model_name
+
+    class RawModel:
+        async def ainvoke(self, messages):
+            raw = type(
+                "Raw", (), {"usage_metadata": {"input_tokens": 40, "output_tokens": 7}}
+            )
+            return {"raw": raw, "parsed": Facts(facts=["fact"]), "parsing_error": None}
+
+    labels = dict(model=model_name, method="facts")
+    prompt_before = LLM_TOKENS.value(kind="prompt", **labels)
+    completion_before = LLM_TOKENS.value(kind="completion", **labels)
+    stage_before = STAGE_LATENCY.count(stage="facts")
+    hits_before = CACHE_REQUESTS.value(cache="llm", result="hit")
+
+    with patch.object(
+        type(generator.llm), "with_structured_output", return_value=RawModel()
+    ):
+        assert await generator.generate_facts("Metricsville", 1) == ["fact"]
+        assert await generator.generate_facts("Metricsville", 1) == ["fact"]
+
+    # the second call is a cache hit and uses no tokens
+    assert LLM_TOKENS.value(kind="prompt", **labels) - prompt_before == 40
+    assert LLM_TOKENS.value(kind="completion", **labels) - completion_before == 7
+    assert STAGE_LATENCY.count(stage="facts") - stage_before == 2
+    assert CACHE_REQUESTS.value(cache="llm", result="hit") - hits_before == 1
+
+
+def test_metrics_endpoint_reports_route_latency():
+    generator = Generator()
+
+    async def facts(location, num, **kwargs):
+        return ["fact"]
+
+    # a cold fact pool, so the facts are generated live
+    overrides = {get_generator: lambda: generator, get_fact_pool: lambda: FactPool()}
+    with patch.dict(app.dependency_overrides, overrides):
+        with patch.object(generator, "generate_facts", side_effect=facts):
+            client = TestClient(app)
+            client.get("/facts?location=London&num=1")
+            response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert REQUEST_LATENCY.count(method="GET", route="/facts", status=200) >= 1
+    assert "# TYPE stage_duration_seconds histogram" in response.text
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/facts",status="200"}'
+        in response.text
+    )
@@ -0,0 +1,132 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from generation.generation import Generator
+from generation.generation_models import ItinerarySummary, SimpleItineraryItem
+from main import app
+from routes import itinerary
+from routes.dependencies import get_generator
+
+DELAY = 0.1
+
+
+def day_summary(*venues):
+    return ItinerarySummary(
+        itinerary=[
+            SimpleItineraryItem(
+                title=f"Visit {venue}",
+                imageTag=venue,
+                start=f"{10 + 2 * i}:00",
+                end=f"{11 + 2 * i}:00",
+                id=i + 1,
+            )
+            for i, venue in enumerate(venues)
+        ]
+    )
+
+
+@pytest.mark.asyncio
+async def test_generate_trip_regenerates_repeated_venues():
+    generator = Generator()
+    calls = []
+
+    async def fake_itinerary(location, day=None, days=None, exclude=None, **kwargs):
+        calls.append((day, exclude))
+        if day == 2 and exclude is None:
+            return day_summary("Tate Modern", "Borough Market")
+        if day == 3:
+            # still repeats a venue after regenerating
+            return day_summary("Hyde Park", "tate modern")
+        return {
+            1: day_summary("British Museum", "Tate Modern"),
+            2: day_summary("Camden Market", "Kew Gardens"),
+        }[day]
+
+    with patch.object(generator, "generate_itinerary", side_effect=fake_itinerary):
+        summaries = await generator.generate_trip("London", 3)
+
+    # every day once, then the repeating days again with the other days' venues excluded
+    assert sorted(call for call in calls if call[1] is None) == [(1, None), (2, None), (3, None)]
+    retries = {day: exclude for day, exclude in calls if exclude is not None}
+    assert set(retries) == {2, 3}
+    assert "Tate Modern" in retries[2] and "Hyde Park" in retries[2]
+    assert [[item.imageTag for item in summary.itinerary] for summary in summaries] == [
+        ["British Museum", "Tate Modern"],
+        ["Camden Market", "Kew Gardens"],
+        ["Hyde Park"],
+    ]
+
+
+def test_multi_day_itinerary_takes_about_one_day():
+    generator = Generator()
+    weather_calls, image_calls, link_calls = [], [], []
+    venues = iter(f"Venue {i}" for i in range(100))
+
+    async def fake_weather_days(location, dates, deadline=None):
+        weather_calls.append(dates)
+        return {date: None for date in dates}
+
+    async def fake_itinerary(location, **kwargs):
+        await asyncio.sleep(DELAY)
+        return day_summary(next(venues), next(venues))
+
+    async def fake_details(item, location, group, weather=None, **kwargs):
+        await asyncio.sleep(DELAY)
+        return {"id": item.id, "title": item.title}
+
+    async def fake_images(titles, deadline=None):
+        image_calls.append(titles)
+        await asyncio.sleep(DELAY)
+        return {k: [f"https://example.com/{k}.jpg"] for k in titles}
+
+    async def fake_links(titles, location, **kwargs):
+        link_calls.append(titles)
+        raise RuntimeError("perplexity down")
+
+    with patch.dict(app.dependency_overrides, {get_generator: lambda: generator}), patch.object(
+        generator, "get_weather_days", side_effect=fake_weather_days
+    ), patch.object(
+        generator, "generate_itinerary", side_effect=fake_itinerary
+    ), patch.object(
+        generator, "generate_item_details", side_effect=fake_details
+    ), patch.object(
+        itinerary, "get_n_random_places", side_effect=fake_images
+    ), patch.object(
+        itinerary, "get_activity_links", side_effect=fake_links
+    ):
+        client = TestClient(app)
+        client.cookies.set("searchConfig", '{"date": "2030-05-01"}')
+        start = time.perf_counter()
+        response = client.post("/itinerary", json={"city": "London", "days": 4})
+        elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200, response.text
+    days = response.json()["days"]
+    assert [day["date"] for day in days] == [
+        "2030-05-01",
+        "2030-05-02",
+        "2030-05-03",
+        "2030-05-04",
+    ]
+    assert weather_calls == [["2030-05-01", "2030-05-02", "2030-05-03", "2030-05-04"]]
+    # ids are unique across days and every stage ran once for the whole trip
+    ids = [item["id"] for day in days for item in day["itinerary"]]
+    assert ids == list(range(1, 9))
+    assert len(image_calls) == 1 and len(link_calls) == 1
+    assert days[3]["itinerary"][1]["image_link"] == ["https://example.com/8.jpg"]
+    assert days[0]["itinerary"][0]["booking_url"] is None
+    # skeletons, then details and images, each concurrent across the days
+    assert elapsed < 4 * DELAY
+
+
+def test_multi_day_rejects_regeneration_and_streaming():
+    client = TestClient(app)
+    feedback = client.post("/itinerary", json={"city": "London", "days": 2, "feedback": "more"})
+    assert feedback.status_code == 422
+    stream = client.post("/itinerary/stream", json={"city": "London", "days": 2})
+    assert stream.status_code == 422
+    assert client.post("/itinerary", json={"city": "London", "days": 8}).status_code == 422
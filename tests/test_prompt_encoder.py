@@ -0,0 +1,106 @@
+from unittest.mock import patch
+from generation.generation_models import FullItinerary, ItineraryItem
+from generation.metrics import PROMPT_TOKENS_SAVED
+from generation.prompt_encoder import (
+    FEEDBACK_TIERS,
+    SWAP_TARGET_TIERS,
+    encode_item,
+    encode_items,
+)
+from generation.prompts import Prompts
+from generation.utils import weather_to_str
+
+
+def make_item(item_id, transport=False):
+    return ItineraryItem(
+        title=f"Visit venue {item_id}",
+        transport=transport,
+        start="2025-03-04 10:00",
+        end="11:30 AM",
+        description="A long and lovely description of the venue and its gardens.",
+        price=12.0,
+        theme="Culture",
+        transportMode="Tube" if transport else "N/A",
+        requires_booking=True,
+        booking_url="https://tickets.example.com/venue",
+        weather="Sunny",
+        temperature=18,
+        image_link=["https://images.example.com/a.jpg", "https://images.example.com/b.jpg"],
+        duration=90,
+        id=item_id,
+        latitude=51.50731,
+        longitude=-0.12758,
+    )
+
+
+def test_encode_item_keeps_only_needed_fields():
+    line = encode_item(make_item(3), SWAP_TARGET_TIERS[0])
+    assert line.startswith("id: 3; time: 10:00-11:30; title: Visit venue 3")
+    assert "price: 12;" in line
+    assert "location: 51.507,-0.128" in line
+    for dropped in ("images.example.com", "tickets.example.com", "requires_booking", "N/A"):
+        assert dropped not in line
+
+
+def test_transport_mode_only_for_transport_steps():
+    assert "transport: Tube" in encode_item(make_item(1, transport=True), FEEDBACK_TIERS[0])
+    assert "transport" not in encode_item(make_item(1), FEEDBACK_TIERS[0])
+
+
+def test_leaner_tier_used_when_over_budget():
+    items = [make_item(i) for i in range(10)]
+    rich = encode_items(items, FEEDBACK_TIERS, budget=10_000)
+    lean = encode_items(items, FEEDBACK_TIERS, budget=250)
+    assert "description" in rich
+    assert "description" not in lean
+    assert lean.count("\n") == 9
+
+
+def test_items_dropped_when_leanest_tier_is_over_budget():
+    items = [make_item(i) for i in range(10)]
+    encoded = encode_items(items, FEEDBACK_TIERS, budget=40)
+    assert encoded.startswith("id: 0")
+    assert "more items not shown" in encoded
+
+
+def test_full_encoding_restores_original(monkeypatch):
+    itinerary = FullItinerary(itinerary=[make_item(1)])
+    monkeypatch.setenv("PROMPT_ENCODING", "full")
+    full = Prompts.itinerary_to_string(itinerary)
+    assert "<Itinerary Item>" in full
+    assert "image_link: " in full
+
+
+def test_savings_recorded_per_endpoint():
+    itinerary = FullItinerary(itinerary=[make_item(i) for i in range(4)])
+    before = PROMPT_TOKENS_SAVED.value(endpoint="test")
+    Prompts.itinerary_to_string(itinerary, endpoint="test")
+    assert PROMPT_TOKENS_SAVED.value(endpoint="test") > before
+
+
+def test_budget_and_savings_use_the_given_model():
+    itinerary = FullItinerary(itinerary=[make_item(i) for i in range(2)])
+    models = []
+
+    def fake_count(text, model="gpt-4o-mini"):
+        models.append(model)
+        return len(text) // 4
+
+    with patch("generation.prompt_encoder.count_tokens", side_effect=fake_count):
+        Prompts.itinerary_to_string(itinerary, endpoint="test", model="gpt-4.1")
+
+    assert models and set(models) == {"gpt-4.1"}
+
+
+def test_weather_runs_collapse_into_ranges():
+    weather = [
+        {"time": "07:00", "weather": "Sunny ", "temperature": 12},
+        {"time": "08:00", "weather": "Sunny", "temperature": 14},
+        {"time": "09:00", "weather": "Cloudy", "temperature": 15},
+        {"time": "10:00", "weather": "Sunny", "temperature": 15},
+    ]
+    assert weather_to_str(weather) == (
+        "07:00-08:00: Sunny 12-14°C, 09:00: Cloudy 15°C, 10:00: Sunny 15°C"
+    )
+    assert weather_to_str(weather, collapse=False).startswith("07:00: Sunny 12°C 08:00")
+    assert weather_to_str(None) is None
@@ -0,0 +1,49 @@
+import asyncio
+import time
+import pytest
+from generation.ratelimit import TokenBucket
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_allows_burst_then_throttles():
+    bucket = TokenBucket(rate=20, capacity=2)
+
+    start = time.monotonic()
+    await bucket.acquire()
+    await bucket.acquire()
+    assert time.monotonic() - start < 0.02
+
+    # the third token has to be refilled at 20 per second
+    await bucket.acquire()
+    assert time.monotonic() - start >= 0.04
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_serves_waiters_in_order():
+    bucket = TokenBucket(rate=50, capacity=1)
+    order = []
+
+    async def take(i):
+        await bucket.acquire()
+        order.append(i)
+
+    await asyncio.gather(*(take(i) for i in range(4)))
+    assert order == [0, 1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_charges_large_requests_in_full():
+    bucket = TokenBucket(rate=100, capacity=2)
+
+    # waits for a full bucket only, but the whole request is owed
+    await bucket.acquire(5)
+    assert bucket.tokens == pytest.approx(-3, abs=0.1)
+
+    start = time.monotonic()
+    await bucket.acquire()
+    assert time.monotonic() - start >= 0.035
+
+
+def test_token_bucket_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
@@ -0,0 +1,133 @@
+import asyncio
+import httpx
+import openai
+import pytest
+from unittest.mock import patch
+from generation.generation import Generator
+from generation.generation_models import Facts
+from generation.retry import (
+    LatencyTracker,
+    RetryPolicy,
+    call_with_retries,
+    hedged_call,
+    is_retryable,
+)
+from generation.scheduler import SchedulerBusy
+
+NO_BACKOFF = RetryPolicy(base_delay=0)
+
+
+def status_error(status):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status, request=request)
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+def test_error_classification():
+    assert is_retryable(status_error(429))
+    assert is_retryable(status_error(503))
+    assert is_retryable(asyncio.TimeoutError())
+    assert not is_retryable(status_error(400))
+    assert not is_retryable(status_error(401))
+    assert not is_retryable(SchedulerBusy("openai", "queue full"))
+    assert not is_retryable(ValueError("bug"))
+
+
+def test_backoff_is_bounded_and_grows():
+    policy = RetryPolicy(base_delay=1, max_delay=4)
+    assert all(0 <= policy.backoff(0) <= 1 for _ in range(50))
+    assert all(0 <= policy.backoff(5) <= 4 for _ in range(50))
+    assert max(policy.backoff(2) for _ in range(200)) > 1
+
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) < 3:
+            raise status_error(500)
+        return "ok"
+
+    assert await call_with_retries(call, 3, NO_BACKOFF) == "ok"
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_error_fails_immediately():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise status_error(400)
+
+    with pytest.raises(openai.APIStatusError):
+        await call_with_retries(call, 3, NO_BACKOFF)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_returns_faster_duplicate():
+    delays = [1.0, 0.01]
+    started = []
+
+    async def call():
+        delay = delays[len(started)]
+        started.append(delay)
+        await asyncio.sleep(delay)
+        return delay
+
+    assert await hedged_call(call, delay=0.02) == 0.01
+    assert started == [1.0, 0.01]
+
+
+@pytest.mark.asyncio
+async def test_hedge_waits_for_first_if_duplicate_fails():
+    started = []
+
+    async def call():
+        started.append(1)
+        if len(started) == 2:
+            raise status_error(500)
+        await asyncio.sleep(0.05)
+        return "first"
+
+    assert await hedged_call(call, delay=0.01) == "first"
+
+
+def test_hedging_needs_enough_samples():
+    policy = RetryPolicy(hedge_percentile=90, hedge_min_samples=5)
+    latencies = policy.tracker()
+    for seconds in range(4):
+        latencies.record(seconds)
+    assert policy.hedge_delay(latencies) is None
+
+    latencies.record(4)
+    assert policy.hedge_delay(latencies) == 4
+    assert RetryPolicy().hedge_delay(LatencyTracker(min_samples=0)) is None
+
+
+@pytest.mark.asyncio
+async def test_generator_retries_with_same_model():
+    generator = Generator()
+    generator.cache = None
+    generator.retry_policy = NO_BACKOFF
+
+    class FlakyModel:
+        calls = 0
+
+        async def ainvoke(self, messages):
+            self.calls += 1
+            if self.calls == 1:
+                raise status_error(503)
+            return Facts(facts=["fact"])
+
+    model = FlakyModel()
+    with patch.object(
+        type(generator.llm), "with_structured_output", return_value=model
+    ):
+        result = await generator.generate_facts("London", 1)
+
+    assert result == ["fact"]
+    assert model.calls == 2
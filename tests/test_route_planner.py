@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+
+from generation.generation_models import TransportMode
+from generation.route_planner import estimate_leg, haversine_matrix, plan_route
+from generation.utils import format_time, time_of_day
+
+# (latitude, longitude) of a few London venues
+BRITISH_MUSEUM = (51.5194, -0.1270)
+COVENT_GARDEN = (51.5117, -0.1240)
+TOWER_OF_LONDON = (51.5081, -0.0759)
+NATIONAL_GALLERY = (51.5089, -0.1283)
+
+
+def venue(id, title, start, end, position=None):
+    latitude, longitude = position or (None, None)
+    return {
+        "id": id,
+        "title": title,
+        "transport": False,
+        "start": start,
+        "end": end,
+        "duration": 0,
+        "latitude": latitude,
+        "longitude": longitude,
+    }
+
+
+def test_haversine_matrix():
+    matrix = haversine_matrix(
+        [BRITISH_MUSEUM[0], TOWER_OF_LONDON[0]], [BRITISH_MUSEUM[1], TOWER_OF_LONDON[1]]
+    )
+    assert matrix.shape == (2, 2)
+    assert np.allclose(np.diag(matrix), 0)
+    assert matrix[0, 1] == pytest.approx(matrix[1, 0])
+    assert matrix[0, 1] == pytest.approx(3.8, abs=0.2)
+
+
+def test_estimate_leg_walks_short_distances():
+    assert estimate_leg(0.8) == (TransportMode.WALKING, 13)
+    mode, minutes = estimate_leg(8.0)
+    assert mode in (TransportMode.TUBE, TransportMode.TRAIN)
+    assert minutes < 60
+
+
+def test_time_helpers():
+    assert format_time(25 * 60 + 5) == "01:05"
+    assert time_of_day(9 * 60) == "morning"
+    assert time_of_day(13 * 60) == "afternoon"
+    assert time_of_day(23 * 60) == "evening"
+    # the small hours end the evening before
+    assert time_of_day(30) == "evening"
+    assert time_of_day(5 * 60) == "morning"
+    assert time_of_day(None) is None
+
+
+def test_plan_route_orders_within_part_of_day():
+    items = [
+        venue(1, "British Museum", "09:00", "10:30", BRITISH_MUSEUM),
+        {"id": 2, "title": "Take the Tube east", "transport": True, "start": "10:30", "end": "10:45"},
+        venue(3, "Tower of London", "10:30", "11:15", TOWER_OF_LONDON),
+        venue(4, "Covent Garden", "10:30", "10:45", COVENT_GARDEN),
+        venue(5, "National Gallery", "14:00", "15:00", NATIONAL_GALLERY),
+    ]
+
+    planned = plan_route(items)
+
+    venues = [item for item in planned if not item["transport"]]
+    # the zig-zag to the Tower and back is straightened out, the afternoon stays last
+    assert [item["id"] for item in venues] == [1, 4, 3, 5]
+    assert [item["transport"] for item in planned] == [False, True, False, True, False, True, False]
+    # the dropped step's id is reused before new ones are handed out
+    assert [item["id"] for item in planned if item["transport"]] == [2, 6, 7]
+
+    assert planned[0]["start"] == "09:00" and planned[0]["duration"] == 90
+    assert planned[1]["transportMode"] == "Walking"
+    assert planned[1]["title"] == "Walk to Covent Garden"
+    assert planned[1]["start"] == planned[0]["end"]
+    # no venue starts before its own start time
+    assert venues[-1]["start"] == "14:00"
+    for before, after in zip(planned, planned[1:]):
+        assert before["end"] <= after["start"]
+
+
+def test_plan_route_puts_small_hours_after_the_evening():
+    items = [
+        venue(1, "British Museum", "10:00", "12:00", BRITISH_MUSEUM),
+        venue(2, "Dinner", "19:00", "21:00", COVENT_GARDEN),
+        venue(3, "Late bar", "00:30", "02:00", NATIONAL_GALLERY),
+    ]
+
+    venues = [item for item in plan_route(items) if not item["transport"]]
+
+    assert [(item["id"], item["start"], item["end"]) for item in venues] == [
+        (1, "10:00", "12:00"),
+        (2, "19:00", "21:00"),
+        (3, "00:30", "02:00"),
+    ]
+
+
+def test_plan_route_never_starts_a_venue_early():
+    items = [
+        venue(1, "Dinner", "19:00", "21:00", COVENT_GARDEN),
+        venue(2, "Club", "23:30", "01:00", NATIONAL_GALLERY),
+    ]
+
+    planned = plan_route(items)
+
+    assert [(item["id"], item["start"]) for item in planned] == [
+        (1, "19:00"),
+        (3, "23:23"),
+        (2, "23:30"),
+    ]
+
+
+def test_plan_route_orders_venues_without_coordinates_by_time():
+    items = [
+        venue(1, "Mystery tour", "10:00", "11:00"),
+        venue(2, "British Museum", "11:00", "11:30", BRITISH_MUSEUM),
+    ]
+
+    planned = plan_route(items, next_id=10)
+
+    assert [item["id"] for item in planned] == [1, 10, 2]
+    assert planned[1]["transportMode"] == TransportMode.DEFAULT.value
+    assert planned[1]["title"] == "Travel to British Museum"
+    assert planned[1]["duration"] == 20
+    assert planned[2]["start"] == "11:20"
+
+
+def test_plan_route_leaves_transport_only_days():
+    items = [{"id": 1, "title": "Walk", "transport": True, "start": "10:00", "end": "10:10"}]
+    assert plan_route(items) == items
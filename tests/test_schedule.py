@@ -0,0 +1,117 @@
+from generation.deadline import Deadline
+from generation.schedule import allowed_windows, solve_schedule
+from generation.utils import night_minutes, parse_time
+
+
+def item(id, start, end, transport=False, duration=0):
+    return {"id": id, "start": start, "end": end, "transport": transport, "duration": duration}
+
+
+def times(items):
+    return [(item["id"], item["start"], item["end"], item["duration"]) for item in items]
+
+
+def test_solve_schedule_sorts_and_resolves_overlaps():
+    items = [
+        item(1, "2:00 PM", "3:30 PM"),
+        item(2, "2025-03-04T10:00:00", "2025-03-04T12:00:00"),
+        item(3, "11:30", "11:45", transport=True),
+    ]
+
+    assert times(solve_schedule(items)) == [
+        (2, "10:00", "12:00", 120),
+        # overlapped the visit before it, so it starts when that ends
+        (3, "12:00", "12:15", 15),
+        (1, "14:00", "15:30", 90),
+    ]
+
+
+def test_solve_schedule_keeps_travel_before_its_destination():
+    items = [
+        item(1, "10:00", "12:30"),
+        item(2, "12:30", "12:50", transport=True),
+        item(3, "12:00", "13:30"),
+    ]
+
+    assert times(solve_schedule(items)) == [
+        (1, "10:00", "12:30", 150),
+        (2, "12:30", "12:50", 20),
+        (3, "12:50", "14:20", 90),
+    ]
+
+
+def test_solve_schedule_fills_missing_times():
+    items = [
+        item(1, "09:00", "10:00"),
+        item(2, "soon", "later", duration=45),
+        item(3, "", "13:00", duration=30),
+    ]
+
+    assert times(solve_schedule(items)) == [
+        (1, "09:00", "10:00", 60),
+        (2, "10:00", "10:45", 45),
+        (3, "12:30", "13:00", 30),
+    ]
+
+
+def test_solve_schedule_enforces_time_of_day():
+    items = [
+        item(1, "08:00", "09:00"),
+        item(2, "16:00", "18:00"),
+        item(3, "00:30", "02:00"),
+    ]
+
+    solved = solve_schedule(items, ["morning", "evening"])
+
+    assert times(solved) == [
+        (1, "08:00", "09:00", 60),
+        # the afternoon was not picked, so the visit moves to the evening
+        (2, "17:00", "19:00", 120),
+        # after midnight still belongs to the evening before
+        (3, "00:30", "02:00", 90),
+    ]
+    # trimmed to the end of the morning
+    assert times(solve_schedule([item(1, "11:00", "13:00")], ["morning"])) == [
+        (1, "11:00", "12:00", 60)
+    ]
+
+
+def test_solve_schedule_keeps_items_inside_picked_windows():
+    timeOfDay = ["morning", "evening"]
+    # the overlapping morning pushes its last visits past noon
+    items = [item(i, "10:00", "11:10") for i in range(1, 5)]
+    items += [item(5, "19:00", "22:00"), item(6, "22:00", "03:30"), item(7, "23:00", "02:30")]
+    deadline = Deadline()
+
+    solved = solve_schedule(items, timeOfDay, deadline)
+
+    windows = allowed_windows(timeOfDay)
+    for entry in solved:
+        start = night_minutes(parse_time(entry["start"]))
+        end = start + entry["duration"]
+        assert any(low <= start and end <= high for low, high in windows), entry
+    assert times(solved)[1:4] == [
+        # trimmed to the end of the morning
+        (2, "11:10", "12:00", 50),
+        # moved to the start of the evening
+        (3, "17:00", "18:10", 70),
+        (4, "18:10", "19:20", 70),
+    ]
+    # the last visit fits in no window anymore
+    assert 7 not in [entry["id"] for entry in solved]
+    assert deadline.skipped == ["schedule"]
+
+
+def test_allowed_windows_ignores_unknown_parts():
+    assert allowed_windows(["night"]) == allowed_windows() == [(7 * 60, 28 * 60)]
+    assert allowed_windows(["morning", "evening"]) == [(7 * 60, 12 * 60), (17 * 60, 28 * 60)]
+
+
+def test_solve_schedule_keeps_other_fields():
+    items = [{"id": 1, "title": "Tate Modern", "start": "10:00", "end": "11:00"}]
+
+    assert solve_schedule(items) == [
+        {"id": 1, "title": "Tate Modern", "start": "10:00", "end": "11:00", "duration": 60}
+    ]
+    assert "duration" not in items[0]
+    assert solve_schedule([]) == []
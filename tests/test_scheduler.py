@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from generation.fact_pool import FactPool, get_fact_pool
+from generation.generation import Generator
+from generation.scheduler import ProviderLimiter, Scheduler, SchedulerBusy
+from main import app
+from routes.dependencies import get_generator
+
+
+@pytest.mark.asyncio
+async def test_limiter_caps_concurrency():
+    limiter = ProviderLimiter("test", concurrency=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(call() for _ in range(6)))
+
+    assert peak == 2
+    assert limiter.stats()["admitted"] == 6
+    assert limiter.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_when_queue_full():
+    limiter = ProviderLimiter("test", concurrency=1, queue_size=1)
+    release = asyncio.Event()
+
+    async def hold():
+        async with limiter.slot():
+            await release.wait()
+
+    holder = asyncio.ensure_future(hold())
+    await asyncio.sleep(0.01)
+    waiter = asyncio.ensure_future(hold())
+    await asyncio.sleep(0.01)
+    assert limiter.stats()["queue_depth"] == 1
+
+    with pytest.raises(SchedulerBusy, match="queue full"):
+        async with limiter.slot():
+            pass
+
+    release.set()
+    await asyncio.gather(holder, waiter)
+    assert limiter.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_after_queue_timeout():
+    limiter = ProviderLimiter("test", concurrency=1, queue_timeout=0.02)
+
+    async with limiter.slot():
+        with pytest.raises(SchedulerBusy, match="queue timeout"):
+            async with limiter.slot():
+                pass
+
+    # the slot is free again once the holder leaves
+    async with limiter.slot():
+        assert limiter.in_flight == 1
+    assert limiter.stats()["queue_depth"] == 0
+
+
+def test_scheduler_reads_limits_from_env(monkeypatch):
+    monkeypatch.setenv("OPENAI_CONCURRENCY", "3")
+    monkeypatch.setenv("OPENAI_TPM", "0")
+    limiter = Scheduler().provider("openai")
+
+    assert limiter.concurrency == 3
+    assert limiter.tokens is None
+    assert limiter.requests is not None
+
+
+def test_limits_split_between_workers(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("OPENAI_CONCURRENCY", "32")
+    monkeypatch.setenv("OPENAI_RPM", "500")
+    limiter = Scheduler().provider("openai")
+
+    assert limiter.concurrency == 8
+    assert limiter.requests.rate == pytest.approx(500 / 4 / 60)
+
+
+def test_budgets_hold_a_burst_of_their_rate(monkeypatch):
+    monkeypatch.setenv("OPENAI_RPM", "600")
+    monkeypatch.setenv("OPENAI_TPM", "60000")
+    monkeypatch.setenv("OPENAI_BURST", "5")
+    limiter = Scheduler().provider("openai")
+
+    assert limiter.requests.capacity == pytest.approx(50)
+    assert limiter.tokens.capacity == pytest.approx(5000)
+
+
+def test_busy_provider_returns_503():
+    generator = Generator()
+
+    async def busy(location, num, **kwargs):
+        raise SchedulerBusy("openai", "queue full")
+
+    # a cold fact pool, so the facts are generated live
+    overrides = {get_generator: lambda: generator, get_fact_pool: lambda: FactPool()}
+    with patch.dict(app.dependency_overrides, overrides):
+        with patch.object(generator, "generate_facts", side_effect=busy):
+            response = TestClient(app).get("/facts?location=London&num=1")
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
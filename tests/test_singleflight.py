@@ -0,0 +1,133 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from generation.generation import Generator
+from generation.generation_models import Facts
+from generation.image_searcher import get_n_random_places
+from generation.singleflight import SingleFlight
+
+
+class SlowCounter:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = False
+
+    async def __call__(self, value):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return value
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_upstream():
+    flights = SingleFlight()
+    upstream = SlowCounter()
+
+    results = await asyncio.gather(*(flights.do("k", upstream, 42) for _ in range(5)))
+
+    assert results == [42] * 5
+    assert upstream.calls == 1
+    assert len(flights) == 0
+
+
+@pytest.mark.asyncio
+async def test_exceptions_fan_out():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(
+        flights.do("k", fail), flights.do("k", fail), return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_leader_cancellation_keeps_followers():
+    flights = SingleFlight()
+    upstream = SlowCounter()
+
+    leader = asyncio.create_task(flights.do("k", upstream, "done"))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flights.do("k", upstream, "done"))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    assert await follower == "done"
+    assert leader.cancelled()
+    assert upstream.calls == 1
+    assert not upstream.cancelled
+
+
+@pytest.mark.asyncio
+async def test_all_callers_cancelled_cancels_upstream():
+    flights = SingleFlight()
+    upstream = SlowCounter()
+
+    callers = [asyncio.create_task(flights.do("k", upstream, 1)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert upstream.cancelled
+    assert len(flights) == 0
+
+    # a new caller starts a fresh upstream call
+    assert await flights.do("k", upstream, 2) == 2
+    assert upstream.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_generator_coalesces_identical_generations():
+    generator = Generator()
+    generator.cache = None
+
+    class SlowModel:
+        calls = 0
+
+        async def ainvoke(self, messages):
+            SlowModel.calls += 1
+            await asyncio.sleep(0.02)
+            return Facts(facts=["fact"])
+
+    with patch.object(
+        type(generator.llm), "with_structured_output", return_value=SlowModel()
+    ):
+        results = await asyncio.gather(
+            *(generator.generate_facts("London", 2) for _ in range(4))
+        )
+
+    assert SlowModel.calls == 1
+    assert all(result == ["fact"] for result in results)
+    # each caller gets its own copy
+    assert results[0] is not results[1]
+
+
+@pytest.mark.asyncio
+async def test_get_n_random_places_coalesces_normalized_titles():
+    calls = []
+
+    async def search(values, keys):
+        calls.append(values)
+        await asyncio.sleep(0.01)
+        return {k: [f"https://example.com/{k}.jpg"] for k in keys}
+
+    with patch(
+        "generation.image_searcher.search_duckduckgo_images", side_effect=search
+    ):
+        first, second = await asyncio.gather(
+            get_n_random_places({1: "Tower of London"}),
+            get_n_random_places({1: "tower of  london"}),
+        )
+
+    assert len(calls) == 1
+    assert first == second
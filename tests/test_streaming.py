@@ -0,0 +1,187 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import patch
+from langchain_core.messages import AIMessageChunk
+from generation.cache import MemoryCache
+from generation.generation import Generator
+from generation.generation_models import (
+    ActivityTitles,
+    ActivityTitleStruct,
+    ItinerarySummary,
+    SimpleItineraryItem,
+)
+from generation.streaming import IncrementalListParser
+
+titles = ActivityTitles(
+    activities=[
+        ActivityTitleStruct(id=1, title='The "Shard" {view}'),
+        ActivityTitleStruct(id=2, title="Borough Market [food]"),
+        ActivityTitleStruct(id=3, title="Tate Modern\\n"),
+    ]
+)
+
+
+def chunks(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_parser_emits_each_element_once_complete(size):
+    text = json.dumps({"note": "activities", **titles.model_dump()})
+    parser = IncrementalListParser("activities")
+
+    emitted = []
+    for chunk in chunks(text, size):
+        emitted.extend(parser.feed(chunk))
+
+    assert emitted == titles.model_dump()["activities"]
+
+
+def test_parser_emits_before_list_is_closed():
+    parser = IncrementalListParser("activities")
+    assert parser.feed('{"activities": [{"id": 1, "title": "A"}, {"id": 2') == [
+        {"id": 1, "title": "A"}
+    ]
+    assert parser.feed(', "title": "B"}]}') == [{"id": 2, "title": "B"}]
+
+
+def test_parser_ignores_other_lists_and_supports_strings():
+    parser = IncrementalListParser("facts")
+    text = '{"sources": ["a", "b"], "facts": ["one", "t\\"wo"]}'
+    assert parser.feed(text) == ["one", 't"wo']
+
+
+class FakeStreamingModel:
+    def __init__(self, response, size=5):
+        self.text = json.dumps(response.model_dump())
+        self.size = size
+        self.calls = 0
+
+    async def astream(self, messages):
+        self.calls += 1
+        for i, chunk in enumerate(chunks(self.text, self.size)):
+            yield AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"name": None, "args": chunk, "id": None, "index": 0}
+                ],
+            )
+
+
+@pytest.mark.asyncio
+async def test_stream_activity_titles_and_cache():
+    generator = Generator()
+    generator.cache = MemoryCache()
+    model = FakeStreamingModel(titles)
+
+    with patch.object(type(generator.llm), "bind_tools", return_value=model):
+        first = [title async for title in generator.stream_activity_titles("London")]
+        second = [title async for title in generator.stream_activity_titles("London")]
+
+    assert first == second == titles.activities
+    assert model.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_itinerary_details_start_while_summary_streams():
+    generator = Generator()
+    started = []
+
+    async def fake_details(
+        item, location, group, weather=None, use_cache=True, deadline=None
+    ):
+        started.append(item.id)
+        return {"id": item.id}
+
+    async def summary_stream():
+        for i in range(3):
+            yield SimpleItineraryItem(
+                title=f"Item {i}", imageTag="tag", start="10:00", end="11:00", id=i
+            )
+            # the previous item's detail call is already running
+            await __import__("asyncio").sleep(0)
+            assert i in started
+
+    with patch.object(generator, "generate_item_details", side_effect=fake_details):
+        details = [
+            item
+            async for item in generator.iter_itinerary_details(
+                summary_stream(), "London", None, None
+            )
+        ]
+
+    assert sorted(item["id"] for item in details) == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_stream_itinerary_skips_cache_with_feedback():
+    generator = Generator()
+    generator.cache = MemoryCache()
+    summary = ItinerarySummary(
+        itinerary=[
+            SimpleItineraryItem(
+                title="Tate", imageTag="tate", start="10:00", end="11:00", id=1
+            )
+        ]
+    )
+    model = FakeStreamingModel(summary)
+
+    with patch.object(type(generator.llm), "bind_tools", return_value=model):
+        for _ in range(2):
+            items = [
+                item
+                async for item in generator.stream_itinerary(
+                    "London", feedback="more art"
+                )
+            ]
+
+    assert items == summary.itinerary
+    assert model.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_streamed_activities_cancel_image_searches_on_failure():
+    from fastapi import Response
+    from generation.catalog import CityCatalog
+    from generation.deadline import Deadline, DeadlineExceeded
+    from routes import activities
+    from routes.request_models import ActivityRequest
+
+    generator = Generator()
+    generator.streaming = True
+    cancelled = []
+
+    async def fake_titles(location, **kwargs):
+        for title in titles.activities:
+            yield title
+
+    async def failing_details(location, **kwargs):
+        raise DeadlineExceeded("details")
+
+    async def slow_images(titles, deadline=None):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.extend(titles)
+            raise
+
+    request = ActivityRequest(
+        city="London", timeOfDay=["morning"], group="solo", uniqueness=1
+    )
+    with patch.object(
+        generator, "stream_activity_titles", side_effect=fake_titles
+    ), patch.object(
+        generator, "generate_activities", side_effect=failing_details
+    ), patch.object(activities, "get_n_random_places", side_effect=slow_images):
+        with pytest.raises(DeadlineExceeded):
+            await activities.get_activities(
+                request,
+                Response(),
+                generator=generator,
+                deadline=Deadline(),
+                catalog=CityCatalog(),
+            )
+        await asyncio.sleep(0)
+
+    assert sorted(cancelled) == [1, 2, 3]
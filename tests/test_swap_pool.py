@@ -0,0 +1,192 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from generation.generation_models import FullItinerary, ItineraryItem
+from generation.jobs import get_job_queue
+from generation.swap_pool import SwapPool, get_swap_pool
+from main import app
+from routes.dependencies import get_generator
+
+
+def make_item(item_id, title, transport=False):
+    return ItineraryItem(
+        title=title,
+        transport=transport,
+        start="10:00",
+        end="11:00",
+        description="A lovely place.",
+        price=0,
+        theme="Culture",
+        transportMode="Tube" if transport else "N/A",
+        requires_booking=False,
+        booking_url=None,
+        weather="Sunny",
+        temperature=18,
+        image_link=[],
+        duration=60,
+        id=item_id,
+        latitude=51.5,
+        longitude=-0.12,
+    )
+
+
+ITINERARY = FullItinerary(
+    itinerary=[
+        make_item(1, "Visit the British Museum"),
+        make_item(2, "Tube to Covent Garden", transport=True),
+    ]
+)
+
+
+class FakeClients:
+    perplexity = None
+
+
+class FakeGenerator:
+    clients = FakeClients()
+    plan_routes = False
+    solve_schedules = False
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_weather(self, location, date=None, deadline=None):
+        return None
+
+    async def swap_activity(self, activity, **kwargs):
+        self.calls.append(kwargs)
+        return make_item(99, f"Alternative {len(self.calls)}")
+
+
+async def fake_images(titles, deadline=None):
+    return {key: [f"https://img.example.com/{title}.jpg"] for key, title in titles.items()}
+
+
+async def fake_links(titles, location, perplexity_chain=None, deadline=None):
+    return {key: f"https://book.example.com/{key}" for key in titles}
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setenv("SWAP_POOL_ENABLED", "true")
+    monkeypatch.setenv("SWAP_POOL_CACHE_BACKEND", "memory")
+    with patch("generation.swap_pool.get_n_random_places", fake_images), patch(
+        "generation.swap_pool.get_activity_links", fake_links
+    ):
+        yield SwapPool(size=2, rpm=600)
+
+
+@pytest.mark.asyncio
+async def test_fill_then_take_alternatives_in_order(pool):
+    generator = FakeGenerator()
+    await pool.schedule(generator, "London", ITINERARY, {"group": "friends"})
+
+    # one activity, transport steps are skipped
+    assert len(generator.calls) == 2
+    assert generator.calls[1]["exclude"] == ["Alternative 1"]
+    assert all(call["feedback"] is None for call in generator.calls)
+
+    activity = ITINERARY.itinerary[0]
+    first = await pool.take("London", activity, ITINERARY, {"group": "friends"})
+    assert first.title == "Alternative 1"
+    assert first.id == activity.id
+    assert first.image_link == ["https://img.example.com/Alternative 1.jpg"]
+    assert first.booking_url == "https://book.example.com/0"
+
+    second = await pool.take("London", activity, ITINERARY, {"group": "friends"})
+    assert second.title == "Alternative 2"
+    assert await pool.take("London", activity, ITINERARY, {"group": "friends"}) is None
+    # filling queues behind interactive jobs
+    assert [job.priority for job in get_job_queue().jobs.values()][-1] == "prefetch"
+    await get_job_queue().aclose()
+
+
+@pytest.mark.asyncio
+async def test_take_skips_alternatives_already_shown(pool):
+    activity = ITINERARY.itinerary[0]
+    key = pool.key("London", activity)
+    await pool.store(key, [make_item(5, "Visit the British Museum").model_dump()])
+    assert await pool.take("London", activity, ITINERARY, {}) is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_takes_get_different_alternatives(pool):
+    activity = ITINERARY.itinerary[0]
+    await pool.store(
+        pool.key("London", activity),
+        [make_item(5, "First").model_dump(), make_item(6, "Second").model_dump()],
+    )
+    get = pool.cache.get
+
+    async def slow_get(key):
+        # a shared backend yields between reading and writing back
+        await asyncio.sleep(0.01)
+        return await get(key)
+
+    with patch.object(pool.cache, "get", side_effect=slow_get):
+        taken = await asyncio.gather(
+            pool.take("London", activity, ITINERARY, {}),
+            pool.take("London", activity, ITINERARY, {}),
+        )
+
+    assert sorted(item.title for item in taken) == ["First", "Second"]
+    assert pool.locks == {}
+
+
+@pytest.mark.asyncio
+async def test_stale_alternatives_are_not_served(pool):
+    activity = ITINERARY.itinerary[0]
+    pool.ttl = -1
+    await pool.store(pool.key("London", activity), [make_item(5, "Old").model_dump()])
+    assert await pool.take("London", activity, ITINERARY, {}) is None
+
+
+@pytest.mark.asyncio
+async def test_fill_yields_to_queued_interactive_calls(pool):
+    generator = FakeGenerator()
+    with patch.object(SwapPool, "_has_headroom", return_value=False):
+        await pool.schedule(generator, "London", ITINERARY, {})
+    assert generator.calls == []
+    await get_job_queue().aclose()
+
+
+@pytest.mark.asyncio
+async def test_fill_stops_when_budget_is_spent(pool):
+    pool.budget.tokens = 1
+    pool.budget.rate = 1e-6
+    generator = FakeGenerator()
+    await pool.schedule(generator, "London", ITINERARY, {})
+    assert len(generator.calls) == 1
+    await get_job_queue().aclose()
+
+
+def test_disabled_pool_does_nothing(monkeypatch):
+    monkeypatch.setenv("SWAP_POOL_ENABLED", "false")
+    pool = SwapPool()
+    assert pool.schedule(FakeGenerator(), "London", ITINERARY, {}) is None
+    assert asyncio.run(pool.take("London", ITINERARY.itinerary[0], ITINERARY, {})) is None
+
+
+def test_swap_without_feedback_served_from_pool(pool):
+    generator = FakeGenerator()
+    key = pool.key("Paris", ITINERARY.itinerary[0])
+    asyncio.run(pool.store(key, [make_item(7, "Pooled alternative").model_dump()]))
+
+    overrides = {get_generator: lambda: generator, get_swap_pool: lambda: pool}
+    with patch.dict(app.dependency_overrides, overrides):
+        body = {
+            "city": "Paris",
+            "activityId": 1,
+            "itinerary": json.loads(ITINERARY.model_dump_json()),
+        }
+        response = TestClient(app).post("/swap", json=body)
+
+    assert response.status_code == 200
+    items = response.json()["itinerary"]
+    assert items[0]["title"] == "Pooled alternative"
+    assert items[0]["id"] == 1
+    assert generator.calls == []
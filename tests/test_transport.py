@@ -0,0 +1,134 @@
+import pytest
+from unittest.mock import patch
+from generation.generation import Generator
+from generation.generation_models import (
+    ItineraryItem,
+    ItinerarySummary,
+    SimpleItineraryItem,
+    TransportMode,
+)
+from generation.transport import build_transport_item, infer_transport_mode
+from generation.utils import minutes_between, parse_time
+
+
+@pytest.mark.parametrize(
+    "value, minutes",
+    [
+        ("10:00", 600),
+        ("9:30 AM", 570),
+        ("7pm", 1140),
+        ("12:15 am", 15),
+        ("2025-03-04 14:45", 885),
+        ("2025-03-04T08:05:00", 485),
+        ("", None),
+        ("late", None),
+    ],
+)
+def test_parse_time(value, minutes):
+    assert parse_time(value) == minutes
+
+
+def test_minutes_between_wraps_midnight():
+    assert minutes_between("23:30", "00:15") == 45
+    assert minutes_between("10:00", "soon") is None
+
+
+def test_build_transport_item():
+    item = SimpleItineraryItem(
+        title="Take the tube from Waterloo to Oxford Circus",
+        imageTag="London Underground",
+        start="2025-03-04 10:00",
+        end="2025-03-04 10:20",
+        id=3,
+        transport=True,
+    )
+
+    details = ItineraryItem.model_validate(build_transport_item(item, "London"))
+
+    assert details.transport is True
+    assert details.transportMode == TransportMode.TUBE
+    assert details.duration == 20
+    assert details.price == 2.80
+    assert details.id == 3
+    assert "20 minute" in details.description
+
+
+def test_infer_transport_mode_prefers_given_mode():
+    item = SimpleItineraryItem(
+        title="Head to the South Bank",
+        imageTag="South Bank",
+        start="10:00",
+        end="10:30",
+        id=1,
+        transport=True,
+        transportMode=TransportMode.TAXI,
+    )
+    assert infer_transport_mode(item) == TransportMode.TAXI
+    assert build_transport_item(item, "London")["price"] == 30.80
+
+
+def test_transport_price_unset_outside_known_cities():
+    item = SimpleItineraryItem(
+        title="Take the metro to the Louvre",
+        imageTag="Louvre",
+        start="10:00",
+        end="10:20",
+        id=1,
+        transport=True,
+    )
+    details = build_transport_item(item, "Paris")
+
+    assert details["transportMode"] == "Tube"
+    assert details["price"] is None
+    assert "Tube" not in details["description"]
+    # walking is free anywhere
+    walk = item.model_copy(update={"title": "Walk to the Louvre"})
+    assert build_transport_item(walk, "Paris")["price"] == 0
+
+
+@pytest.mark.asyncio
+async def test_itinerary_details_skip_llm_for_transport():
+    generator = Generator()
+    summary = ItinerarySummary(
+        itinerary=[
+            SimpleItineraryItem(
+                title="British Museum",
+                imageTag="museum",
+                start="10:00",
+                end="12:00",
+                id=1,
+            ),
+            SimpleItineraryItem(
+                title="Walk to Covent Garden",
+                imageTag="Covent Garden",
+                start="12:00",
+                end="12:15",
+                id=2,
+                transport=True,
+            ),
+        ]
+    )
+    calls = []
+
+    async def fake_details(
+        item, location, group, weather=None, use_cache=True, deadline=None
+    ):
+        calls.append(item.id)
+        return {"id": item.id, "transport": False}
+
+    with patch.object(generator, "generate_item_details", side_effect=fake_details):
+        details = await generator.generate_itinerary_details(
+            summary, "London", "solo", None
+        )
+        streamed = [
+            item
+            async for item in generator.iter_itinerary_details(
+                summary, "London", "solo", None
+            )
+        ]
+
+    assert calls == [1, 1]
+    assert [item["id"] for item in details] == [1, 2]
+    assert details[1]["transportMode"] == "Walking"
+    assert details[1]["price"] == 0
+    assert sorted(item["id"] for item in streamed) == [1, 2]
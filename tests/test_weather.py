@@ -1,8 +1,10 @@
 import pytest
-from unittest.mock import patch, MagicMock
 from datetime import datetime, timedelta
 import os
+from generation.cache import MemoryCache
 from generation.generation import Generator
+from generation.weather import WeatherService
+from tests.fakes import FakeForecastAPI
 
 
 # Set up the mock API key in environment variables
@@ -18,87 +20,111 @@ def get_future_date(days_ahead):
     return (datetime.now() + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
 
 
+def make_service(api, api_key="mock_api_key"):
+    return WeatherService(api_key=api_key, client=api.client(), cache=MemoryCache())
+
+
 # Test when no weather data is returned (invalid API response)
-@patch("requests.get")
-def test_get_weather_no_data(mock_get):
-    mock_get.return_value.status_code = 200
-    mock_get.return_value.json.return_value = {}
+@pytest.mark.asyncio
+async def test_get_weather_no_data():
+    api = FakeForecastAPI(payload={})
 
-    generator = Generator()
-    result = generator.get_weather("London", get_future_date(1))  # 1 day from now
+    result = await make_service(api).get_weather("London", get_future_date(1))
     assert result is None, "Expected None when no forecast data is returned"
 
 
-# Test for invalid weather API key
-@patch("requests.get")
-def test_get_weather_invalid_api_key(mock_get):
-    os.environ["WEATHER_API_KEY"] = "abc"  # No API key
+# Test for missing weather API key
+@pytest.mark.asyncio
+async def test_get_weather_missing_api_key():
+    api = FakeForecastAPI()
 
-    generator = Generator()
-    result = generator.get_weather("London", get_future_date(1))
+    result = await make_service(api, api_key=None).get_weather(
+        "London", get_future_date(1)
+    )
     assert result is None, "Expected None when no API key is provided"
+    assert api.calls == []
+
+
+# Test for an error status from the Weather API
+@pytest.mark.asyncio
+async def test_get_weather_error_status():
+    api = FakeForecastAPI(status_code=401, payload={"error": {"code": 2006}})
+
+    result = await make_service(api).get_weather("London", get_future_date(1))
+    assert result is None
 
 
 # Test for successful weather data retrieval
-@patch("requests.get")
-def test_get_weather_success(mock_get):
-    # Mocking a valid response from the Weather API
-    mock_response = MagicMock()
-    mock_response.status_code = 200
-    mock_response.json.return_value = {
-        "forecast": {
-            "forecastday": [
-                {
-                    "date": get_future_date(1),  # 1 day from now
-                    "hour": [
-                        {
-                            "time": f"{get_future_date(1)} 07:00",
-                            "condition": {"text": "Clear"},
-                            "temp_c": 22,
-                        },
-                        {
-                            "time": f"{get_future_date(1)} 08:00",
-                            "condition": {"text": "Sunny"},
-                            "temp_c": 24,
-                        },
-                        # More hourly data can be added here...
-                    ],
-                }
-            ]
-        }
-    }
-    mock_get.return_value = mock_response
+@pytest.mark.asyncio
+async def test_get_weather_success():
+    api = FakeForecastAPI()
 
-    generator = Generator()
-    result = generator.get_weather("London", get_future_date(1))  # 1 day from now
+    result = await make_service(api).get_weather("London", get_future_date(1))
 
     # Check the expected structure of the result
     assert isinstance(result, list)
-    assert len(result) > 0
+    assert len(result) == 17
     assert result[0]["time"] == "07:00"
-    assert result[0]["weather"] == "Clear"
-    assert result[0]["temperature"] == 22
+    assert result[0]["weather"] == "Sunny "
+    assert result[0]["temperature"] == 14
+
+
+# One forecast fetch fills the cache for every date and location spelling
+@pytest.mark.asyncio
+async def test_get_weather_cached_per_location():
+    api = FakeForecastAPI()
+    service = make_service(api)
+
+    await service.get_weather("London", get_future_date(0))
+    await service.get_weather(" london ", get_future_date(5))
+    await service.get_weather("LONDON", get_future_date(13))
+    assert len(api.calls) == 1
+    assert api.calls[0]["days"] == "14"
+
+    await service.get_weather("Paris", get_future_date(1))
+    assert len(api.calls) == 2
 
 
 # Test for weather data beyond 14 days (should return None)
-@patch("requests.get")
-def test_get_weather_out_of_range(mock_get):
-    mock_get.return_value.status_code = 200
-    mock_get.return_value.json.return_value = {}
+@pytest.mark.asyncio
+async def test_get_weather_out_of_range():
+    api = FakeForecastAPI()
 
-    generator = Generator()
-    result = generator.get_weather("London", get_future_date(15))  # 15 days from now
+    result = await make_service(api).get_weather("London", get_future_date(15))
     assert result is None, "Expected None when requesting weather data beyond 14 days"
+    assert api.calls == []
 
 
 # Test for weather data in the past (should return None)
-@patch("requests.get")
-def test_get_weather_past_date(mock_get):
-    mock_get.return_value.status_code = 200
-    mock_get.return_value.json.return_value = {}
+@pytest.mark.asyncio
+async def test_get_weather_past_date():
+    api = FakeForecastAPI()
 
-    generator = Generator()
-    result = generator.get_weather("London", get_future_date(-1))  # 1 day in the past
+    result = await make_service(api).get_weather("London", get_future_date(-1))
     assert (
         result is None
     ), "Expected None when trying to fetch weather data for past dates"
+
+
+# Generator delegates to its weather service
+@pytest.mark.asyncio
+async def test_generator_get_weather():
+    api = FakeForecastAPI()
+    generator = Generator()
+    generator.weather = make_service(api)
+
+    result = await generator.get_weather("London", get_future_date(2))
+    assert result[-1]["time"] == "23:00"
+    assert await generator.get_weather("London") is None
+
+
+# Every day of a trip comes from a single forecast fetch
+@pytest.mark.asyncio
+async def test_get_weather_days_single_fetch():
+    api = FakeForecastAPI()
+    dates = [get_future_date(day) for day in (1, 2, 3, 20)]
+
+    result = await make_service(api).get_weather_days("London", dates)
+    assert len(api.calls) == 1
+    assert [len(result[date]) for date in dates[:3]] == [17, 17, 17]
+    assert result[dates[3]] is None